@@ -0,0 +1,13 @@
+from core.query_plans import hot_query
+from .models import OTP
+
+
+@hot_query('otp.user_lookup')
+def user_otp_lookup():
+    return OTP.objects.filter(user_id=1, otp_code='123456', otp_type='phone', is_used=False)
+
+
+@hot_query('otp.reset_password_lookup')
+def reset_password_otp_lookup():
+    # ResetPasswordView looks the code up without knowing the user
+    return OTP.objects.filter(otp_code='123456', otp_type='email', is_used=False)
@@ -71,6 +71,11 @@ class OTP(models.Model):
         db_table = 'otps'
         verbose_name = 'OTP'
         verbose_name_plural = 'OTPs'
+        indexes = [
+            models.Index(fields=['user', 'otp_type', 'is_used'], name='otps_user_type_used_idx'),
+            models.Index(fields=['otp_code', 'otp_type'], name='otps_unused_code_idx',
+                         condition=models.Q(is_used=False)),
+        ]
     
     def __str__(self):
         return f"{self.user.email} - {self.otp_type} - {self.otp_code}"
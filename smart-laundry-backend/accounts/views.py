@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import login
+from django.db.models import Sum
 from django.utils import timezone
 from .models import User, OTP
 from .serializers import (
@@ -235,7 +236,7 @@ def user_dashboard(request):
             for order in recent_orders
         ],
         'cart_items_count': cart_items.count(),
-        'total_spent': sum(order.total_amount for order in Order.objects.filter(user=user, status='delivered'))
+        'total_spent': Order.objects.filter(user=user, status='delivered').aggregate(total=Sum('total_amount'))['total'] or 0
     }
     
     return Response(dashboard_data, status=status.HTTP_200_OK)
\ No newline at end of file
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ContactMessage, FAQ, SiteConfiguration, Banner, Notification
+from .models import ContactMessage, FAQ, SiteConfiguration, Banner, Notification, IdempotencyKey
 
 
 @admin.register(ContactMessage)
@@ -40,4 +40,13 @@ class NotificationAdmin(admin.ModelAdmin):
     list_display = ('title', 'user', 'notification_type', 'is_read', 'is_active', 'created_at')
     list_filter = ('notification_type', 'is_read', 'is_active', 'created_at')
     search_fields = ('title', 'message', 'user__email')
+    ordering = ('-created_at',)
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ('key', 'endpoint', 'user', 'status_code', 'created_at', 'started_at', 'expires_at')
+    list_filter = ('endpoint', 'status_code', 'created_at')
+    search_fields = ('key', 'user__email', 'endpoint')
+    readonly_fields = ('created_at', 'started_at')
     ordering = ('-created_at',)
\ No newline at end of file
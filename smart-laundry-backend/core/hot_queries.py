@@ -0,0 +1,19 @@
+from django.db.models import Q
+from .models import Notification
+from .query_plans import hot_query
+
+
+@hot_query('notifications.user_active')
+def user_active_notifications():
+    return Notification.objects.filter(user_id=1, is_active=True).order_by('-created_at')[:20]
+
+
+@hot_query('notifications.user_unread')
+def user_unread_notifications():
+    return Notification.objects.filter(user_id=1, is_active=True, is_read=False).order_by('-created_at')
+
+
+@hot_query('notifications.feed')
+def notification_feed():
+    # NotificationViewSet: the user's own notifications plus broadcasts
+    return Notification.objects.filter(Q(user_id=1) | Q(user__isnull=True), is_active=True)
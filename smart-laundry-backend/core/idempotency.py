@@ -0,0 +1,137 @@
+"""
+Idempotency-Key support for unsafe API endpoints.
+
+A client that may retry a POST sends a unique ``Idempotency-Key`` header.
+The first request with that key runs normally and its successful response is
+stored; retries with the same key and body get the stored response back
+without running the view again. Keys expire after ``IDEMPOTENCY_KEY_TTL``
+and are swept by the ``purge_idempotency_keys`` command.
+
+While the first request runs, retries get 409. If it never finishes (the
+worker crashed or was killed), a retry after ``IDEMPOTENCY_IN_FLIGHT_TIMEOUT``
+takes the key over and runs the view itself; the stale attempt can no
+longer record or release the key.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+def get_key_ttl():
+    return getattr(settings, 'IDEMPOTENCY_KEY_TTL', timedelta(hours=24))
+
+
+def get_in_flight_timeout():
+    return getattr(settings, 'IDEMPOTENCY_IN_FLIGHT_TIMEOUT', timedelta(seconds=60))
+
+
+def hash_request_body(data):
+    encoded = json.dumps(data, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def _claim_key(user, endpoint, key, request_hash):
+    """Insert a pending record, or return the existing one for this key
+    
+    A pending record whose attempt started more than the in-flight timeout
+    ago is taken over and returned as if it had just been created.
+    """
+    lookup = {'user': user, 'endpoint': endpoint, 'key': key}
+    while True:
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    request_hash=request_hash,
+                    started_at=now,
+                    expires_at=now + get_key_ttl(),
+                    **lookup
+                ), True
+        except IntegrityError:
+            existing = IdempotencyKey.objects.filter(**lookup).first()
+            if existing is None:
+                continue
+            if existing.is_expired():
+                IdempotencyKey.objects.filter(pk=existing.pk).delete()
+                continue
+            if existing.status_code is None and existing.started_at <= now - get_in_flight_timeout():
+                # Only one retry wins the conditional update
+                taken = IdempotencyKey.objects.filter(
+                    pk=existing.pk, status_code__isnull=True, started_at=existing.started_at,
+                ).update(request_hash=request_hash, started_at=now)
+                if not taken:
+                    continue
+                existing.request_hash, existing.started_at = request_hash, now
+                return existing, True
+            return existing, False
+
+
+def _attempt(record):
+    """The record, as long as this attempt still holds it"""
+    return IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True, started_at=record.started_at)
+
+
+def idempotent(view_method):
+    """Make a viewset handler replay its response for repeated Idempotency-Keys"""
+    
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        
+        if len(key) > 255:
+            return Response(
+                {'error': f'{IDEMPOTENCY_HEADER} must be at most 255 characters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        user = request.user if request.user.is_authenticated else None
+        endpoint = f'{request.method} {request.path}'
+        request_hash = hash_request_body(request.data)
+        record, created = _claim_key(user, endpoint, key, request_hash)
+        
+        if not created:
+            if record.request_hash != request_hash:
+                return Response(
+                    {'error': f'{IDEMPOTENCY_HEADER} was already used with a different request body'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            if record.status_code is None:
+                return Response(
+                    {'error': 'A request with this Idempotency-Key is still being processed'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            response = Response(record.response_body, status=record.status_code)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+        
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            _attempt(record).delete()
+            raise
+        
+        if status.is_success(response.status_code):
+            _attempt(record).update(
+                status_code=response.status_code,
+                response_body=json.loads(json.dumps(response.data, default=str)),
+            )
+        else:
+            # Failed attempts may be retried with the same key
+            _attempt(record).delete()
+        return response
+    
+    return wrapper
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from core.query_plans import explain, find_full_scans, get_hot_queries
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN QUERY PLAN for every registered hot query and flag full table scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Only check these hot queries')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print the full plan of every query')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('check_query_plans understands SQLite query plans only')
+        
+        queries = get_hot_queries()
+        if options['names']:
+            unknown = set(options['names']) - set(queries)
+            if unknown:
+                raise CommandError(f'Unknown hot query(ies): {", ".join(sorted(unknown))}')
+            queries = {name: queries[name] for name in options['names']}
+        
+        failures = []
+        for name, build in sorted(queries.items()):
+            plan = explain(build())
+            scans = find_full_scans(plan)
+            
+            if scans:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f'SCAN  {name}'))
+                for line in scans:
+                    self.stdout.write(f'        {line}')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'OK    {name}'))
+            
+            if options['verbose_plans']:
+                for line in plan:
+                    self.stdout.write(f'        {line}')
+        
+        if failures:
+            raise CommandError(f'{len(failures)} hot query(ies) fall back to a table scan: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS(f'All {len(queries)} hot queries use an index'))
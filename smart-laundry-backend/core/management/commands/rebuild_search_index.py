@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from core.search import get_backend, get_indexes
+
+
+class Command(BaseCommand):
+    help = 'Rebuild full-text search indexes from the current database contents'
+
+    def add_arguments(self, parser):
+        parser.add_argument('indexes', nargs='*',
+                            help='Index names to rebuild, e.g. services_service (default: all)')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        indexes = get_indexes()
+        if options['indexes']:
+            by_name = {index.name: index for index in indexes}
+            unknown = set(options['indexes']) - set(by_name)
+            if unknown:
+                raise CommandError(f'Unknown search index(es): {", ".join(sorted(unknown))}')
+            indexes = [by_name[name] for name in options['indexes']]
+        
+        backend = get_backend()
+        for index in indexes:
+            with transaction.atomic():
+                count = backend.rebuild(index, chunk_size=options['chunk_size'])
+            self.stdout.write(f'Indexed {count} rows into {index.name}')
+        
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(indexes)} search index(es)'))
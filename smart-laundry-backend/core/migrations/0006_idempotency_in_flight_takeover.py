@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:43
+
+from django.db import migrations, models
+from django.db.models import F, Min
+import django.utils.timezone
+
+
+def prepare_keys(apps, schema_editor):
+    IdempotencyKey = apps.get_model('core', 'IdempotencyKey')
+    IdempotencyKey.objects.update(started_at=F('created_at'))
+    # Anonymous keys were never deduplicated; keep the first of each
+    duplicates = (
+        IdempotencyKey.objects.filter(user__isnull=True).order_by()
+        .values('endpoint', 'key').annotate(first_id=Min('id'), count=models.Count('id')).filter(count__gt=1)
+    )
+    for row in duplicates:
+        IdempotencyKey.objects.filter(
+            user__isnull=True, endpoint=row['endpoint'], key=row['key'],
+        ).exclude(pk=row['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_search_tables'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='started_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(prepare_keys, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='idempotencykey',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('endpoint', 'key'), name='idempotency_anonymous_key_uniq'),
+        ),
+    ]
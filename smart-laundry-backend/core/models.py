@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class ContactMessage(models.Model):
@@ -116,6 +117,49 @@ class Notification(models.Model):
         verbose_name = 'Notification'
         verbose_name_plural = 'Notifications'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='notif_created_id_idx'),
+            models.Index(fields=['user', 'is_active', '-created_at'], name='notif_user_active_created_idx'),
+            models.Index(fields=['user', '-created_at'], name='notif_unread_idx',
+                         condition=models.Q(is_read=False, is_active=True)),
+        ]
     
     def __str__(self):
-        return f"{self.title} - {self.user.email if self.user else 'All Users'}"
\ No newline at end of file
+        return f"{self.title} - {self.user.email if self.user else 'All Users'}"
+
+class IdempotencyKey(models.Model):
+    """Stored outcome of a request sent with an Idempotency-Key header"""
+    
+    user = models.ForeignKey('accounts.User', on_delete=models.CASCADE, related_name='idempotency_keys', null=True, blank=True)
+    key = models.CharField(max_length=255)
+    endpoint = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    # Empty until the original request finishes
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # When the attempt holding the key started; a retry may take over a
+    # pending key once this is older than IDEMPOTENCY_IN_FLIGHT_TIMEOUT
+    started_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        db_table = 'idempotency_keys'
+        verbose_name = 'Idempotency Key'
+        verbose_name_plural = 'Idempotency Keys'
+        ordering = ['-created_at']
+        unique_together = ['user', 'endpoint', 'key']
+        constraints = [
+            # NULLs are distinct in unique_together, so anonymous keys need their own
+            models.UniqueConstraint(
+                fields=['endpoint', 'key'],
+                condition=models.Q(user__isnull=True),
+                name='idempotency_anonymous_key_uniq',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.endpoint} - {self.key}"
+    
+    def is_expired(self):
+        return timezone.now() > self.expires_at
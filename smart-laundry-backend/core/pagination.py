@@ -0,0 +1,65 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class OrderedPageNumberPagination(PageNumberPagination):
+    """Page numbers over a client-chosen ordering, with ``id`` as tiebreak"""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = list(queryset.query.order_by)
+        if not {'id', '-id', 'pk', '-pk'} & set(ordering):
+            queryset = queryset.order_by(*ordering, '-id')
+        return super().paginate_queryset(queryset, request, view)
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """Keyset pagination over ``(created_at, id)``, newest first.
+    
+    Pages are fetched with ``WHERE created_at < <cursor>`` on a composite
+    index instead of ``COUNT(*)`` + ``OFFSET``, so deep pages cost the same
+    as the first one. Responses carry ``next``/``previous`` links but no
+    total ``count``.
+    
+    A cursor needs a position that does not move, so ``?ordering=`` on any
+    field but ``created_at`` (``status``, ``total_amount``) is served with
+    page numbers instead (``OrderedPageNumberPagination``, with ``count``).
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    fallback_class = OrderedPageNumberPagination
+    
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if len(ordering) == 1:
+            # created_at alone ties; break ties on id in the same direction
+            ordering = (ordering[0], '-id' if ordering[0].startswith('-') else 'id')
+        return ordering
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        self.fallback = None
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering[0].lstrip('-') != 'created_at':
+            self.fallback = self.fallback_class()
+            page = self.fallback.paginate_queryset(queryset, request, view)
+            self.display_page_controls = self.fallback.display_page_controls
+            return page
+        return super().paginate_queryset(queryset, request, view)
+    
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return super().get_paginated_response(data)
+    
+    def get_html_context(self):
+        if self.fallback is not None:
+            return self.fallback.get_html_context()
+        return super().get_html_context()
+    
+    def to_html(self):
+        if self.fallback is not None:
+            return self.fallback.to_html()
+        return super().to_html()
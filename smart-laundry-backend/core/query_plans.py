@@ -0,0 +1,34 @@
+"""
+Registry of hot queries whose plans must stay on an index.
+
+Apps list their latency-sensitive queries in a ``hot_queries`` module
+(autodiscovered by CoreConfig.ready) and ``check_query_plans`` runs
+``EXPLAIN QUERY PLAN`` for each one, flagging any full table scan.
+"""
+import re
+
+
+_hot_queries = {}
+
+# "SCAN orders" is a full scan; "SCAN orders USING INDEX ..." is not.
+FULL_SCAN_RE = re.compile(r'\bSCAN (?!CONSTANT ROW)(\S+)(?!.*\bUSING\b.*\bINDEX\b)')
+
+
+def hot_query(name):
+    """Register a zero-argument function returning a representative queryset"""
+    def decorator(func):
+        _hot_queries[name] = func
+        return func
+    return decorator
+
+
+def get_hot_queries():
+    return dict(_hot_queries)
+
+
+def explain(queryset):
+    return queryset.explain().splitlines()
+
+
+def find_full_scans(plan_lines):
+    return [line.strip() for line in plan_lines if FULL_SCAN_RE.search(line)]
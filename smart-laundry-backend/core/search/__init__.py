@@ -0,0 +1,16 @@
+"""
+Full-text search for API listings.
+
+Apps declare what is searchable in a ``search_indexes`` module (autodiscovered
+by CoreConfig.ready), the configured backend keeps its index in sync through
+model signals, and ``FullTextSearchFilter`` answers ``?search=`` queries from
+the index instead of ``icontains`` scans.
+"""
+from .backends import get_backend
+from .filters import FullTextSearchFilter
+from .registry import SearchIndex, get_index, get_indexes, register
+
+__all__ = [
+    'FullTextSearchFilter', 'SearchIndex', 'get_backend', 'get_index',
+    'get_indexes', 'register',
+]
@@ -0,0 +1,153 @@
+import re
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q, Value, FloatField
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    return TERM_RE.findall(query.lower())
+
+
+class BaseSearchBackend:
+    """Interface every search backend implements.
+    
+    ``filter_queryset`` must restrict the queryset to matching rows and
+    annotate ``search_rank`` (lower is better).
+    """
+    
+    def update(self, index, pks):
+        raise NotImplementedError
+    
+    def remove(self, index, pks):
+        raise NotImplementedError
+    
+    def rebuild(self, index, chunk_size=2000):
+        raise NotImplementedError
+    
+    def filter_queryset(self, index, queryset, query):
+        raise NotImplementedError
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """Index-less fallback that matches term prefixes with ``icontains``"""
+    
+    def update(self, index, pks):
+        pass
+    
+    def remove(self, index, pks):
+        pass
+    
+    def rebuild(self, index, chunk_size=2000):
+        return 0
+    
+    def filter_queryset(self, index, queryset, query):
+        for term in tokenize(query):
+            queryset = queryset.filter(reduce(or_, (Q(**{f'{field}__icontains': term}) for field in index.fields)))
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    """One FTS5 virtual table per index, keyed by the object's primary key.
+    
+    The tables live in the main database, so index writes commit or roll
+    back together with the rows they describe. Each app creates and fills
+    its tables in a migration (see services/migrations/0003_search_tables);
+    an index added later needs one too, or a run of ``rebuild_search_index``.
+    """
+    
+    def table_name(self, index):
+        return f'search_{index.name}'
+    
+    def create_table(self, index):
+        columns = ', '.join(f'"{column}"' for column in index.columns)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE "{self.table_name(index)}" '
+                f'USING fts5({columns}, tokenize="unicode61 remove_diacritics 2")'
+            )
+    
+    def _write(self, index, rows):
+        table = self.table_name(index)
+        placeholders = ', '.join(['%s'] * (len(index.columns) + 1))
+        columns = ', '.join(f'"{column}"' for column in index.columns)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO "{table}" (rowid, {columns}) VALUES ({placeholders})',
+                [(pk, *values) for pk, values in rows],
+            )
+    
+    def update(self, index, pks):
+        if not pks:
+            return
+        self.remove(index, pks)
+        self._write(index, list(index.documents(pks)))
+    
+    def remove(self, index, pks):
+        if not pks:
+            return
+        placeholders = ', '.join(['%s'] * len(pks))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM "{self.table_name(index)}" WHERE rowid IN ({placeholders})', list(pks))
+    
+    def rebuild(self, index, chunk_size=2000):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS "{self.table_name(index)}"')
+        self.create_table(index)
+        
+        count = 0
+        chunk = []
+        for row in index.documents():
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                self._write(index, chunk)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            self._write(index, chunk)
+            count += len(chunk)
+        return count
+    
+    def match_expression(self, query):
+        # Every term must match, each as a prefix: "dry" "clea"*
+        return ' '.join(f'"{term}"*' for term in tokenize(query))
+    
+    def filter_queryset(self, index, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset
+        
+        table = self.table_name(index)
+        weights = ', '.join(str(weight) for weight in index.column_weights)
+        pk_column = f'"{queryset.model._meta.db_table}"."{queryset.model._meta.pk.column}"'
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM "{table}" WHERE "{table}" MATCH %s', [match])
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT bm25("{table}", {weights}) FROM "{table}" '
+                f'WHERE "{table}" MATCH %s AND rowid = {pk_column}',
+                [match],
+                output_field=FloatField(),
+            )
+        )
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'SEARCH_BACKEND', None)
+        if path is None:
+            path = ('core.search.backends.SQLiteFTS5Backend' if connection.vendor == 'sqlite'
+                    else 'core.search.backends.SimpleSearchBackend')
+        _backend = import_string(path)()
+    return _backend
@@ -0,0 +1,25 @@
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+from .backends import get_backend
+from .registry import get_index
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """``SearchFilter`` that answers from the full-text index.
+    
+    Place it after ``OrderingFilter`` in ``filter_backends``: when the client
+    does not ask for an explicit ordering, results are ranked by relevance.
+    Models without a registered index fall back to ``search_fields``.
+    """
+    
+    def filter_queryset(self, request, queryset, view):
+        query = ' '.join(self.get_search_terms(request))
+        index = get_index(queryset.model)
+        if not query or index is None:
+            return super().filter_queryset(request, queryset, view)
+        
+        queryset = get_backend().filter_queryset(index, queryset, query)
+        if 'search_rank' in queryset.query.annotations and not request.query_params.get(api_settings.ORDERING_PARAM):
+            queryset = queryset.order_by('search_rank', 'pk')
+        return queryset
@@ -0,0 +1,55 @@
+
+_indexes = {}
+
+
+class SearchIndex:
+    """Declares which fields of a model are searchable.
+    
+    ``fields`` are ORM lookups (``category__name`` is fine) and become index
+    columns; ``weights`` boosts columns in ranking; ``related`` maps another
+    model to the lookup from this model to it, so that editing e.g. a
+    category re-indexes the services that embed its name.
+    """
+    
+    def __init__(self, model, fields, weights=None, related=None):
+        self.model = model
+        self.fields = list(fields)
+        self.weights = weights or {}
+        self.related = related or {}
+        self.name = f'{model._meta.app_label}_{model._meta.model_name}'
+    
+    @property
+    def columns(self):
+        return [field.replace('__', '_') for field in self.fields]
+    
+    @property
+    def column_weights(self):
+        return [float(self.weights.get(field, 1.0)) for field in self.fields]
+    
+    def get_queryset(self):
+        return self.model._default_manager.order_by()
+    
+    def documents(self, pks=None):
+        """Yield ``(pk, [column values])`` rows straight from the database"""
+        queryset = self.get_queryset()
+        if pks is not None:
+            queryset = queryset.filter(pk__in=pks)
+        for row in queryset.values_list('pk', *self.fields).iterator(chunk_size=2000):
+            yield row[0], ['' if value is None else str(value) for value in row[1:]]
+
+
+def register(model, fields, **kwargs):
+    index = SearchIndex(model, fields, **kwargs)
+    _indexes[model] = index
+    
+    from .signals import connect_index
+    connect_index(index)
+    return index
+
+
+def get_index(model):
+    return _indexes.get(model)
+
+
+def get_indexes():
+    return list(_indexes.values())
@@ -0,0 +1,59 @@
+from django.db.models.signals import post_init, post_save, post_delete
+
+from .backends import get_backend
+
+
+_MISSING = object()
+
+
+def copied_fields(index, related_model, lookup):
+    """Attributes of ``related_model`` whose values ``index`` copies through ``lookup``"""
+    prefix = f'{lookup}__'
+    return sorted({
+        related_model._meta.get_field(field[len(prefix):].split('__')[0]).attname
+        for field in index.fields if field.startswith(prefix)
+    })
+
+
+def _state(instance, attnames):
+    # Deferred fields count as unknown, so loading one later looks like a change
+    return tuple(instance.__dict__.get(attname, _MISSING) for attname in attnames)
+
+
+def connect_index(index):
+    """Keep ``index`` in sync with writes to its model and related models"""
+    
+    def update_object(sender, instance, **kwargs):
+        get_backend().update(index, [instance.pk])
+    
+    def remove_object(sender, instance, **kwargs):
+        get_backend().remove(index, [instance.pk])
+    
+    post_save.connect(update_object, sender=index.model, weak=False,
+                      dispatch_uid=f'search-update-{index.name}')
+    post_delete.connect(remove_object, sender=index.model, weak=False,
+                        dispatch_uid=f'search-remove-{index.name}')
+    
+    for related_model, lookup in index.related.items():
+        # Only saves that change a copied field (not e.g. a login stamping
+        # last_login on the user) re-index the dependents
+        attnames = copied_fields(index, related_model, lookup)
+        state_attr = f'_search_state_{index.name}'
+        
+        def remember_state(sender, instance, attnames=attnames, state_attr=state_attr, **kwargs):
+            setattr(instance, state_attr, _state(instance, attnames))
+        
+        def update_dependents(sender, instance, created=False, lookup=lookup, attnames=attnames,
+                              state_attr=state_attr, **kwargs):
+            state = _state(instance, attnames)
+            changed = not created and state != getattr(instance, state_attr, None)
+            setattr(instance, state_attr, state)
+            if not changed:
+                return
+            pks = list(index.get_queryset().filter(**{lookup: instance.pk}).values_list('pk', flat=True))
+            if pks:
+                get_backend().update(index, pks)
+        
+        uid = f'{index.name}-{related_model._meta.label_lower}'
+        post_init.connect(remember_state, sender=related_model, weak=False, dispatch_uid=f'search-state-{uid}')
+        post_save.connect(update_dependents, sender=related_model, weak=False, dispatch_uid=f'search-related-{uid}')
@@ -0,0 +1,15 @@
+from core import search
+from .models import ContactMessage, FAQ
+
+
+search.register(
+    FAQ,
+    fields=['question', 'answer', 'category'],
+    weights={'question': 5, 'category': 2},
+)
+
+search.register(
+    ContactMessage,
+    fields=['name', 'email', 'subject', 'message'],
+    weights={'subject': 3},
+)
@@ -1,3 +1,98 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, transaction
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework import status, viewsets
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from .idempotency import get_in_flight_timeout, hash_request_body, idempotent
+from .models import IdempotencyKey
+from .query_plans import find_full_scans, get_hot_queries
+
+
+class CountingViewSet(viewsets.ViewSet):
+    permission_classes = []
+    calls = 0
+    
+    @idempotent
+    def create(self, request):
+        CountingViewSet.calls += 1
+        if request.data.get('fail'):
+            return Response({'error': 'bad'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'call': CountingViewSet.calls}, status=status.HTTP_201_CREATED)
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        CountingViewSet.calls = 0
+        self.view = CountingViewSet.as_view({'post': 'create'})
+        self.user = get_user_model().objects.create_user(
+            username='client', email='client@example.com', phone='+919999900002', password='x'
+        )
+    
+    def post(self, data, key='key-1', user=None):
+        request = APIRequestFactory().post('/things/', data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        force_authenticate(request, user=user or self.user)
+        return self.view(request)
+    
+    def test_retry_replays_the_stored_response(self):
+        first = self.post({'a': 1})
+        retry = self.post({'a': 1})
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(CountingViewSet.calls, 1)
+    
+    def test_reused_key_with_another_body_is_rejected(self):
+        self.post({'a': 1})
+        self.assertEqual(self.post({'a': 2}).status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+    
+    def test_failed_attempt_releases_the_key(self):
+        self.assertEqual(self.post({'fail': True}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.exists())
+    
+    def test_pending_key_conflicts_until_the_in_flight_timeout(self):
+        record = IdempotencyKey.objects.create(
+            user=self.user, endpoint='POST /things/', key='key-1', request_hash=hash_request_body({'a': 1}),
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+        self.assertEqual(self.post({'a': 1}).status_code, status.HTTP_409_CONFLICT)
+        
+        IdempotencyKey.objects.filter(pk=record.pk).update(
+            started_at=timezone.now() - get_in_flight_timeout() - timedelta(seconds=1)
+        )
+        self.assertEqual(self.post({'a': 1}).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.post({'a': 1})['Idempotent-Replayed'], 'true')
+        self.assertEqual(CountingViewSet.calls, 1)
+    
+    def test_anonymous_keys_are_unique(self):
+        lookup = {'endpoint': 'POST /things/', 'key': 'key-1', 'request_hash': 'x'}
+        IdempotencyKey.objects.create(expires_at=timezone.now() + timedelta(hours=1), **lookup)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            IdempotencyKey.objects.create(expires_at=timezone.now() + timedelta(hours=1), **lookup)
+
 
-# Create your tests here.
+class QueryPlanTests(TestCase):
+    def test_full_scans_are_told_apart_from_index_scans(self):
+        plan = [
+            '3 0 0 SCAN orders_order USING INDEX orders_created_idx',
+            '5 0 0 SCAN orders_cart',
+            '7 0 0 SEARCH orders_payment USING INDEX payments_txn_idx (transaction_id=?)',
+            '9 0 0 SCAN CONSTANT ROW',
+        ]
+        self.assertEqual(find_full_scans(plan), ['5 0 0 SCAN orders_cart'])
+    
+    def test_every_hot_query_uses_an_index(self):
+        self.assertIn('orders.user_recent', get_hot_queries())
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn(f'All {len(get_hot_queries())} hot queries use an index', out.getvalue())
+    
+    def test_unknown_names_are_rejected(self):
+        with self.assertRaisesMessage(CommandError, 'Unknown hot query(ies): nope'):
+            call_command('check_query_plans', 'nope', stdout=StringIO())
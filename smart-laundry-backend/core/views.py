@@ -4,6 +4,8 @@ from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db import models
 from .models import ContactMessage, FAQ, SiteConfiguration, Banner, Notification
+from .pagination import CreatedAtCursorPagination
+from .search import FullTextSearchFilter
 from .serializers import (
     ContactMessageSerializer, FAQSerializer, SiteConfigurationSerializer,
     BannerSerializer, NotificationSerializer
@@ -15,7 +17,7 @@ class ContactMessageViewSet(viewsets.ModelViewSet):
     queryset = ContactMessage.objects.all()
     serializer_class = ContactMessageSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, FullTextSearchFilter]
     filterset_fields = ['status']
     search_fields = ['name', 'email', 'subject', 'message']
     ordering_fields = ['created_at']
@@ -37,7 +39,7 @@ class FAQViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = FAQ.objects.filter(is_active=True)
     serializer_class = FAQSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, FullTextSearchFilter]
     filterset_fields = ['category']
     search_fields = ['question', 'answer', 'category']
     ordering_fields = ['order', 'created_at']
@@ -95,11 +97,12 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['notification_type', 'is_read', 'is_active']
     search_fields = ['title', 'message']
     ordering_fields = ['created_at']
-    ordering = ['-created_at']
+    ordering = ['-created_at', '-id']
     
     def get_queryset(self):
         user = self.request.user
@@ -1,5 +1,48 @@
-from django.contrib import admin
-from .models import Order, OrderItem, Cart, OrderTracking, Payment
+from django.contrib import admin, messages
+from .models import (
+    Order, OrderItem, Cart, OrderTracking, Payment, ArchivedOrder, DailyRevenueRollup, PricingRuleSet, CategoryLoad,
+    PayloadBlob, PickupSlot, PincodeLocation, WebhookEvent,
+)
+from .dispatch import assign_routes, plan_routes, ready_orders
+from .transitions import STATUS_LABELS, transition_orders
+from .webhooks import reprocess_events
+
+
+def make_status_action(new_status):
+    def action(modeladmin, request, queryset):
+        order_ids = list(queryset.values_list('id', flat=True))
+        updated, failures = transition_orders(
+            order_ids, new_status, f'Status updated to {new_status} by {request.user.email}'
+        )
+        if updated:
+            modeladmin.message_user(request, f'{len(updated)} order(s) moved to {STATUS_LABELS[new_status]}.')
+        if failures:
+            numbers = dict(queryset.filter(id__in=failures).values_list('id', 'order_number'))
+            details = '; '.join(f'{numbers.get(order_id, order_id)}: {error}' for order_id, error in failures.items())
+            modeladmin.message_user(request, f'{len(failures)} order(s) not updated - {details}', messages.WARNING)
+    
+    action.__name__ = f'mark_{new_status}'
+    action.short_description = f'Mark selected orders as {STATUS_LABELS[new_status]}'
+    return action
+
+
+@admin.action(description='Plan delivery routes for selected ready orders and send them out')
+def dispatch_ready_orders(modeladmin, request, queryset):
+    routes, unlocated = plan_routes(ready_orders(queryset))
+    updated, failures = assign_routes(routes, assigned_by=request.user.email)
+    if updated:
+        modeladmin.message_user(
+            request, f'{len(updated)} order(s) sent out for delivery on {len(routes)} route(s); '
+                     'each order\'s tracking names its route and stop.'
+        )
+    skipped = len(unlocated) + len(failures)
+    if skipped:
+        modeladmin.message_user(
+            request, f'{skipped} order(s) not dispatched: {len(unlocated)} with a pincode missing from '
+                     f'the geocode table, {len(failures)} no longer ready.', messages.WARNING
+        )
+    if not routes and not unlocated:
+        modeladmin.message_user(request, 'None of the selected orders are ready.', messages.WARNING)
 
 
 class OrderItemInline(admin.TabularInline):
@@ -19,9 +62,13 @@ class OrderAdmin(admin.ModelAdmin):
     list_display = ('order_number', 'user', 'status', 'payment_status', 'total_amount', 'created_at')
     list_filter = ('status', 'payment_status', 'payment_method', 'created_at')
     search_fields = ('order_number', 'user__email', 'user__phone')
-    readonly_fields = ('order_number', 'created_at', 'updated_at')
+    # Status changes go through the mark_* actions (transition_orders) and
+    # payment fields follow the payments
+    readonly_fields = ('order_number', 'status', 'payment_status', 'payment_method', 'pickup_slot',
+                       'created_at', 'updated_at')
     ordering = ('-created_at',)
     inlines = [OrderItemInline, OrderTrackingInline]
+    actions = [dispatch_ready_orders] + [make_status_action(value) for value, _ in Order.STATUS_CHOICES if value != 'pending']
     
     fieldsets = (
         ('Order Information', {
@@ -31,13 +78,13 @@ class OrderAdmin(admin.ModelAdmin):
             'fields': ('payment_status', 'payment_method')
         }),
         ('Address', {
-            'fields': ('pickup_address', 'delivery_address')
+            'fields': ('pickup_address', 'delivery_address', 'delivery_pincode')
         }),
         ('Pricing', {
-            'fields': ('subtotal', 'tax_amount', 'delivery_charge', 'total_amount')
+            'fields': ('subtotal', 'tax_amount', 'delivery_charge', 'small_order_fee', 'total_amount')
         }),
         ('Schedule', {
-            'fields': ('pickup_date', 'delivery_date')
+            'fields': ('pickup_slot', 'pickup_date', 'delivery_date')
         }),
         ('Additional Info', {
             'fields': ('special_instructions', 'notes')
@@ -72,8 +119,116 @@ class OrderTrackingAdmin(admin.ModelAdmin):
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
-    list_display = ('order', 'payment_method', 'amount', 'status', 'transaction_id', 'created_at')
+    list_display = ('order', 'archived_order', 'payment_method', 'amount', 'status', 'transaction_id', 'created_at')
     list_filter = ('payment_method', 'status', 'created_at')
-    search_fields = ('order__order_number', 'transaction_id')
+    search_fields = ('order__order_number', 'archived_order__order_number', 'transaction_id')
+    readonly_fields = ('archived_order', 'gateway_payload', 'created_at', 'updated_at')
+    ordering = ('-created_at',)
+
+
+@admin.register(DailyRevenueRollup)
+class DailyRevenueRollupAdmin(admin.ModelAdmin):
+    list_display = ('day', 'status', 'payment_method', 'category', 'order_count', 'item_count', 'quantity', 'revenue')
+    list_filter = ('status', 'payment_method', 'category', 'day')
+    date_hierarchy = 'day'
+    ordering = ('-day', 'status', 'payment_method')
+    
+    # Maintained by orders.rollups; rebuild with rebuild_order_rollups
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ('order_number', 'user', 'status', 'total_amount', 'created_at', 'closed_at', 'archived_at')
+    list_filter = ('status', 'payment_method', 'archived_at')
+    search_fields = ('order_number', 'user__email')
+    ordering = ('-created_at',)
+    
+    # Written only by orders.archive
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PricingRuleSet)
+class PricingRuleSetAdmin(admin.ModelAdmin):
+    # Rules are checked by compiling them (PricingRuleSet.clean); saving
+    # one makes every worker recompile its pricing engine
+    list_display = ('name', 'is_active', 'updated_at')
+    list_filter = ('is_active',)
+    search_fields = ('name',)
     readonly_fields = ('created_at', 'updated_at')
-    ordering = ('-created_at',)
\ No newline at end of file
+
+
+@admin.register(PickupSlot)
+class PickupSlotAdmin(admin.ModelAdmin):
+    # booked is only changed by bookings and cancellations (orders.slots)
+    list_display = ('area', 'starts_at', 'ends_at', 'capacity', 'booked', 'is_active')
+    list_filter = ('is_active', 'area', 'starts_at')
+    search_fields = ('area',)
+    readonly_fields = ('booked', 'created_at', 'updated_at')
+    ordering = ('starts_at', 'area')
+
+
+@admin.register(CategoryLoad)
+class CategoryLoadAdmin(admin.ModelAdmin):
+    # Counters are kept by orders.eta (rebuild_category_load recomputes
+    # them); only the capacity is set here
+    list_display = ('category', 'order_count', 'quantity', 'work', 'capacity', 'updated_at')
+    list_editable = ('capacity',)
+    readonly_fields = ('category', 'order_count', 'quantity', 'work', 'updated_at')
+    
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(PincodeLocation)
+class PincodeLocationAdmin(admin.ModelAdmin):
+    # Loaded in bulk with load_pincode_locations; read by orders.dispatch
+    list_display = ('pincode', 'name', 'latitude', 'longitude')
+    search_fields = ('pincode', 'name')
+    ordering = ('pincode',)
+
+
+@admin.action(description='Reprocess selected events')
+def reprocess_webhook_events(modeladmin, request, queryset):
+    count = reprocess_events(queryset)
+    modeladmin.message_user(request, f'{count} event(s) queued for processing.')
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'gateway', 'event_type', 'received_at', 'processed_at', 'attempts', 'error')
+    list_filter = ('gateway', 'event_type', 'processed_at')
+    search_fields = ('event_id',)
+    ordering = ('-received_at',)
+    actions = [reprocess_webhook_events]
+    
+    # Append-only inbox written by orders.webhooks
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PayloadBlob)
+class PayloadBlobAdmin(admin.ModelAdmin):
+    list_display = ('digest', 'codec', 'size', 'created_at')
+    list_filter = ('codec',)
+    search_fields = ('digest',)
+    exclude = ('data',)
+    ordering = ('-created_at',)
+    
+    # Content-addressed, written by orders.blobs
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,97 @@
+"""
+Archival of closed orders.
+
+Delivered and cancelled orders that have not changed for
+``ORDER_ARCHIVE_AFTER`` are moved, with their items and tracking, into
+``ArchivedOrder`` rows so the live order tables and their indexes only hold
+recent orders. Their payments stay where they are, moved from the order to
+the archived order, so settlements and late webhooks still find them by
+transaction id and their stored gateway payloads stay referenced. Each chunk is copied and deleted in its own transaction,
+so an interrupted run loses nothing and the next run carries on with the
+orders that are still live.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Order, ArchivedOrder, Payment
+from .rollups import rollups_paused
+from .serializers import ArchivedOrderSerializer, with_archive_plan
+
+
+# Statuses with no way out
+CLOSED_STATUSES = [status for status, targets in Order.STATUS_TRANSITIONS.items() if not targets]
+
+
+def archivable_orders(before=None):
+    """Closed orders last updated before ``before`` (default: now - ORDER_ARCHIVE_AFTER)"""
+    if before is None:
+        before = timezone.now() - settings.ORDER_ARCHIVE_AFTER
+    return Order.objects.filter(status__in=CLOSED_STATUSES, updated_at__lt=before)
+
+
+def _category_lines(order):
+    totals = defaultdict(lambda: [0, 0, Decimal('0.00')])
+    for item in order.items.all():
+        line = totals[item.service.category_id]
+        line[0] += 1
+        line[1] += item.quantity
+        line[2] += item.total_price
+    return [[category_id, *line] for category_id, line in totals.items()]
+
+
+def archive_order_chunk(pks, before=None):
+    """Move the archivable orders among ``pks`` to the archive; returns how many moved"""
+    with transaction.atomic():
+        locked = list(
+            archivable_orders(before).select_for_update().filter(pk__in=pks).values_list('pk', flat=True)
+        )
+        if not locked:
+            return 0
+        
+        orders = list(with_archive_plan(Order.objects.filter(pk__in=locked)))
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(
+                id=order.id,
+                order_number=order.order_number,
+                user_id=order.user_id,
+                status=order.status,
+                payment_method=order.payment_method,
+                total_amount=order.total_amount,
+                created_at=order.created_at,
+                closed_at=order.updated_at,
+                lines=_category_lines(order),
+                document=ArchivedOrderSerializer(order).data,
+            )
+            for order in orders
+        ])
+        Payment.objects.filter(order_id__in=locked).update(archived_order=F('order'), order=None)
+        
+        # Archived orders keep counting towards the revenue rollups
+        with rollups_paused():
+            Order.objects.filter(pk__in=locked).delete()
+    
+    return len(orders)
+
+
+def archive_orders(before=None, chunk_size=500, limit=None):
+    """Archive closed orders chunk by chunk, yielding the number moved per chunk"""
+    if before is None:
+        before = timezone.now() - settings.ORDER_ARCHIVE_AFTER
+    candidates = archivable_orders(before).order_by('pk').values_list('pk', flat=True)
+    last_pk = 0
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        pks = list(candidates.filter(pk__gt=last_pk)[:size])
+        if not pks:
+            break
+        last_pk = pks[-1]
+        moved = archive_order_chunk(pks, before)
+        if remaining is not None:
+            remaining -= moved
+        yield moved
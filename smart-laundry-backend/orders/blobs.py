@@ -0,0 +1,122 @@
+"""
+Compressed storage for bulky payment gateway payloads.
+
+A payload whose JSON is larger than ``PAYMENT_PAYLOAD_INLINE_LIMIT`` bytes
+is stored once, compressed, in ``PayloadBlob`` under the SHA-256 of its
+canonical JSON (so retries that resend the same payload share a row). The
+payment keeps a summary of the payload's top-level scalar fields plus
+``payload_digest`` in ``payment_gateway_response`` and a reference in
+``gateway_payload``; the raw payload is served by the payment ``payload``
+endpoint.
+
+Blobs are compressed with zstd when the ``zstandard`` package is installed
+and with zlib otherwise; each blob records its codec.
+"""
+import hashlib
+import json
+import zlib
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Exists, OuterRef
+
+from .models import Payment, PayloadBlob
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+SUMMARY_MAX_FIELDS = 20
+SUMMARY_MAX_LENGTH = 200
+
+
+def inline_limit():
+    return getattr(settings, 'PAYMENT_PAYLOAD_INLINE_LIMIT', 1024)
+
+
+def canonical_json(payload):
+    return json.dumps(payload, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':')).encode()
+
+
+def compress(raw):
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=10).compress(raw)
+    return 'zlib', zlib.compress(raw, 9)
+
+
+def decompress(codec, data):
+    data = bytes(data)
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('This payload is zstd-compressed; install the zstandard package to read it')
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f'Unknown payload codec {codec!r}')
+
+
+def summarize(payload):
+    """The top-level scalar fields of a payload, long strings cut short"""
+    if not isinstance(payload, dict):
+        return {}
+    summary = {}
+    for key, value in payload.items():
+        if len(summary) >= SUMMARY_MAX_FIELDS:
+            break
+        if isinstance(value, str):
+            summary[key] = value[:SUMMARY_MAX_LENGTH]
+        elif value is None or isinstance(value, (bool, int, float)):
+            summary[key] = value
+    return summary
+
+
+def prepare_payload(payload):
+    """``(summary, blob)`` for a payload: the payload itself and None when it is small,
+    else its summary and an unsaved ``PayloadBlob``
+    """
+    raw = canonical_json(payload)
+    if len(raw) <= inline_limit():
+        return payload, None
+    codec, data = compress(raw)
+    blob = PayloadBlob(digest=hashlib.sha256(raw).hexdigest(), codec=codec, size=len(raw), data=data)
+    return dict(summarize(payload), payload_digest=blob.digest), blob
+
+
+def save_blobs(blobs):
+    """Store ``blobs``, skipping digests already stored"""
+    if blobs:
+        PayloadBlob.objects.bulk_create(blobs, ignore_conflicts=True)
+
+
+def is_summary(payment):
+    response = payment.payment_gateway_response
+    return (
+        payment.gateway_payload_id is not None
+        and isinstance(response, dict)
+        and response.get('payload_digest') == payment.gateway_payload_id
+    )
+
+
+def offload_payload(payment):
+    """Before saving: move a large ``payment_gateway_response`` into a blob"""
+    if 'payment_gateway_response' in payment.get_deferred_fields() or is_summary(payment):
+        return
+    summary, blob = prepare_payload(payment.payment_gateway_response)
+    if blob is not None:
+        save_blobs([blob])
+    payment.payment_gateway_response = summary
+    payment.gateway_payload_id = blob.digest if blob is not None else None
+
+
+def raw_payload(payment):
+    """The full gateway payload of a payment"""
+    if payment.gateway_payload_id is None:
+        return payment.payment_gateway_response
+    blob = PayloadBlob.objects.get(pk=payment.gateway_payload_id)
+    return json.loads(decompress(blob.codec, blob.data))
+
+
+def unreferenced_blobs():
+    return PayloadBlob.objects.filter(~Exists(Payment.objects.filter(gateway_payload=OuterRef('pk'))))
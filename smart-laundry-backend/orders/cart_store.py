@@ -0,0 +1,366 @@
+"""
+Cart storage backends.
+
+``CartViewSet`` reads and writes carts through the store named by the
+``CART_STORE`` setting:
+
+``DatabaseCartStore`` (default)
+    Every change is written to the ``cart`` table.
+
+``CachedCartStore``
+    The live cart is kept in the Django cache, one entry per user, and
+    written back to the ``cart`` table (write-behind): on checkout, once a
+    cart has been dirty for ``CART_FLUSH_INTERVAL`` and it changes again,
+    and by the ``flush_carts`` command, which should run at least that often.
+    On a cache miss the cart is loaded from the table, so a cart evicted
+    before its last flush loses at most the changes made since. The cache
+    must be shared by all workers (Redis, Memcached) for this store.
+
+Stores hand out ``Cart`` instances. Those from ``CachedCartStore`` carry
+the line id the cache assigned and must not be saved directly.
+"""
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.db.models import prefetch_related_objects
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Cart
+from .placement import checkout_cart
+
+
+# What CartSerializer renders for each line
+CART_LINE_PREFETCHES = (
+    'service__options',
+    'service__images',
+    'service__reviews__user',
+)
+
+
+def with_cart_prices(queryset):
+    """Annotate cart rows with ``unit_price`` and ``line_total``"""
+    return queryset.annotate(
+        unit_price=Coalesce('service_option__price', 'service__price'),
+        line_total=ExpressionWrapper(
+            F('unit_price') * F('quantity'), output_field=DecimalField(max_digits=10, decimal_places=2)
+        ),
+    )
+
+
+class BaseCartStore:
+    """Interface shared by the cart stores"""
+    
+    def lines(self, user):
+        """The user's cart lines, newest first, ready for CartSerializer"""
+        raise NotImplementedError
+    
+    def get_line(self, user, line_id):
+        """One line of the user's cart; raises ``Cart.DoesNotExist``"""
+        raise NotImplementedError
+    
+    def add_line(self, user, service_id, service_option_id=None, quantity=1):
+        """Add an item; an item already in the cart gets ``quantity`` more instead of a second line"""
+        raise NotImplementedError
+    
+    def set_quantity(self, user, line_id, quantity):
+        raise NotImplementedError
+    
+    def remove_line(self, user, line_id):
+        raise NotImplementedError
+    
+    def clear(self, user):
+        raise NotImplementedError
+    
+    def summary(self, user):
+        """``(price_lines, lines)`` for pricing and display
+        
+        ``price_lines`` are ``(category_id, unit_price, quantity)`` as taken by
+        ``PricingEngine.quote``; lines carry ``unit_price`` and ``line_total``.
+        """
+        raise NotImplementedError
+    
+    def flush(self, user):
+        """Write the user's cart to the ``cart`` table; returns True if anything was written"""
+        return False
+    
+    def flush_dirty(self):
+        """Flush every cart with unwritten changes; returns how many were flushed"""
+        return 0
+    
+    def checkout(self, user, order_data):
+        """Place an order for the whole cart and empty it (see placement.checkout_cart)"""
+        return checkout_cart(user, order_data)
+
+
+class DatabaseCartStore(BaseCartStore):
+    """Carts live in the ``cart`` table"""
+    
+    def lines(self, user):
+        return (
+            Cart.objects.filter(user=user)
+            .select_related('service', 'service_option')
+            .prefetch_related(*CART_LINE_PREFETCHES)
+            .order_by('-created_at', '-id')
+        )
+    
+    def get_line(self, user, line_id):
+        return self.lines(user).get(pk=line_id)
+    
+    def add_line(self, user, service_id, service_option_id=None, quantity=1):
+        with transaction.atomic():
+            line = Cart.objects.select_for_update().filter(
+                user=user, service_id=service_id, service_option_id=service_option_id
+            ).first()
+            if line is None:
+                return Cart.objects.create(
+                    user=user, service_id=service_id, service_option_id=service_option_id, quantity=quantity
+                )
+            line.quantity += quantity
+            line.save()
+        return line
+    
+    def set_quantity(self, user, line_id, quantity):
+        line = Cart.objects.get(user=user, pk=line_id)
+        line.quantity = quantity
+        line.save()
+        return line
+    
+    def remove_line(self, user, line_id):
+        Cart.objects.filter(user=user, pk=line_id).delete()
+    
+    def clear(self, user):
+        Cart.objects.filter(user=user).delete()
+    
+    def summary(self, user):
+        cart_items = with_cart_prices(Cart.objects.filter(user=user))
+        # Quantities summed per category and price in SQL
+        price_lines = (
+            cart_items.order_by()
+            .values_list('service__category_id', 'unit_price')
+            .annotate(total_quantity=Sum('quantity'))
+        )
+        lines = cart_items.select_related('service', 'service_option').order_by('-created_at', '-id')
+        return list(price_lines), lines
+
+
+class CachedCartStore(BaseCartStore):
+    """Carts live in the cache and are written behind to the ``cart`` table
+    
+    A cache entry holds ``lines`` (line id -> dict), ``next_id`` and
+    ``dirty_since`` (None once everything is written). Carts becoming dirty
+    are appended to a log of user ids that ``flush_dirty`` works through.
+    """
+    
+    key_prefix = 'carts'
+    lock_timeout = 10
+    lock_wait = 2.0
+    
+    def get_ttl(self):
+        return getattr(settings, 'CART_CACHE_TTL', timedelta(days=7)).total_seconds()
+    
+    def get_flush_interval(self):
+        return getattr(settings, 'CART_FLUSH_INTERVAL', timedelta(minutes=5))
+    
+    def _key(self, user_id, suffix=''):
+        return f'{self.key_prefix}:{user_id}{suffix}'
+    
+    @contextmanager
+    def _locked(self, user_id):
+        """Serialize changes to one user's cart across workers (best effort)"""
+        key = self._key(user_id, ':lock')
+        deadline = time.monotonic() + self.lock_wait
+        acquired = cache.add(key, 1, self.lock_timeout)
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(0.01)
+            acquired = cache.add(key, 1, self.lock_timeout)
+        try:
+            yield
+        finally:
+            if acquired:
+                cache.delete(key)
+    
+    def _load(self, user_id):
+        entry = cache.get(self._key(user_id))
+        if entry is None:
+            rows = Cart.objects.filter(user_id=user_id).values(
+                'id', 'service_id', 'service_option_id', 'quantity', 'created_at', 'updated_at'
+            )
+            lines = {row['id']: dict(row, db_id=row['id']) for row in rows}
+            entry = {'lines': lines, 'next_id': max(lines, default=0) + 1, 'dirty_since': None}
+            cache.set(self._key(user_id), entry, self.get_ttl())
+        return entry
+    
+    def _save(self, user_id, entry):
+        """Store a changed entry, logging the cart as dirty or flushing it when overdue"""
+        now = timezone.now()
+        if entry['dirty_since'] is None:
+            entry['dirty_since'] = now
+            self._log_dirty(user_id)
+        elif now - entry['dirty_since'] >= self.get_flush_interval():
+            self._write(user_id, entry)
+        cache.set(self._key(user_id), entry, self.get_ttl())
+    
+    def _log_dirty(self, user_id):
+        seq_key = f'{self.key_prefix}:dirty:seq'
+        cache.add(seq_key, 0, None)
+        seq = cache.incr(seq_key)
+        cache.set(f'{self.key_prefix}:dirty:{seq}', user_id, self.get_ttl())
+    
+    def _to_cart(self, user, line_id, line):
+        return Cart(
+            id=line_id, user=user, service_id=line['service_id'], service_option_id=line['service_option_id'],
+            quantity=line['quantity'], created_at=line['created_at'], updated_at=line['updated_at'],
+        )
+    
+    def lines(self, user):
+        entry = self._load(user.id)
+        carts = [self._to_cart(user, line_id, line) for line_id, line in entry['lines'].items()]
+        carts.sort(key=lambda cart: (cart.created_at, cart.id), reverse=True)
+        prefetch_related_objects(carts, 'service', 'service_option', *CART_LINE_PREFETCHES)
+        return carts
+    
+    def get_line(self, user, line_id):
+        line = self._load(user.id)['lines'].get(int(line_id))
+        if line is None:
+            raise Cart.DoesNotExist
+        cart = self._to_cart(user, int(line_id), line)
+        prefetch_related_objects([cart], 'service', 'service_option', *CART_LINE_PREFETCHES)
+        return cart
+    
+    def add_line(self, user, service_id, service_option_id=None, quantity=1):
+        with self._locked(user.id):
+            entry = self._load(user.id)
+            now = timezone.now()
+            line_id = next((
+                line_id for line_id, line in entry['lines'].items()
+                if (line['service_id'], line['service_option_id']) == (service_id, service_option_id)
+            ), None)
+            if line_id is not None:
+                line = entry['lines'][line_id]
+                line['quantity'] += quantity
+                line['updated_at'] = now
+            else:
+                line_id = entry['next_id']
+                entry['lines'][line_id] = {
+                    'service_id': service_id, 'service_option_id': service_option_id, 'quantity': quantity,
+                    'created_at': now, 'updated_at': now, 'db_id': None,
+                }
+                entry['next_id'] += 1
+            self._save(user.id, entry)
+        return self._to_cart(user, line_id, entry['lines'][line_id])
+    
+    def set_quantity(self, user, line_id, quantity):
+        with self._locked(user.id):
+            entry = self._load(user.id)
+            line = entry['lines'].get(int(line_id))
+            if line is None:
+                raise Cart.DoesNotExist
+            line['quantity'] = quantity
+            line['updated_at'] = timezone.now()
+            self._save(user.id, entry)
+        return self._to_cart(user, int(line_id), line)
+    
+    def remove_line(self, user, line_id):
+        with self._locked(user.id):
+            entry = self._load(user.id)
+            if entry['lines'].pop(int(line_id), None) is not None:
+                self._save(user.id, entry)
+    
+    def clear(self, user):
+        with self._locked(user.id):
+            entry = self._load(user.id)
+            if entry['lines']:
+                entry['lines'] = {}
+                self._save(user.id, entry)
+    
+    def summary(self, user):
+        carts = self.lines(user)
+        for cart in carts:
+            cart.unit_price = cart.service_option.price if cart.service_option_id else cart.service.price
+            cart.line_total = cart.unit_price * cart.quantity
+        return [(cart.service.category_id, cart.unit_price, cart.quantity) for cart in carts], carts
+    
+    def _write(self, user_id, entry):
+        """Make the ``cart`` table match ``entry`` and mark it clean"""
+        with transaction.atomic():
+            rows = Cart.objects.select_for_update().filter(user_id=user_id).in_bulk()
+            changed, created = [], []
+            for line in entry['lines'].values():
+                row = rows.pop(line['db_id'], None) if line['db_id'] else None
+                if row is None:
+                    created.append((line, Cart(
+                        user_id=user_id, service_id=line['service_id'],
+                        service_option_id=line['service_option_id'], quantity=line['quantity'],
+                    )))
+                elif row.quantity != line['quantity']:
+                    row.quantity = line['quantity']
+                    row.updated_at = line['updated_at']
+                    changed.append(row)
+            
+            if rows:
+                Cart.objects.filter(pk__in=list(rows)).delete()
+            if changed:
+                Cart.objects.bulk_update(changed, ['quantity', 'updated_at'])
+            if created:
+                Cart.objects.bulk_create([cart for _, cart in created])
+                for line, cart in created:
+                    line['db_id'] = cart.pk
+        entry['dirty_since'] = None
+    
+    def _flush(self, user_id):
+        entry = cache.get(self._key(user_id))
+        if entry is None or entry['dirty_since'] is None:
+            return False
+        self._write(user_id, entry)
+        cache.set(self._key(user_id), entry, self.get_ttl())
+        return True
+    
+    def flush(self, user):
+        with self._locked(user.id):
+            return self._flush(user.id)
+    
+    def flush_dirty(self):
+        seq = cache.get(f'{self.key_prefix}:dirty:seq') or 0
+        done_key = f'{self.key_prefix}:dirty:flushed'
+        done = cache.get(done_key) or 0
+        if done > seq:
+            # The sequence was evicted and restarted
+            done = 0
+        
+        flushed = 0
+        while done < seq:
+            slots = [f'{self.key_prefix}:dirty:{n}' for n in range(done + 1, min(done + 500, seq) + 1)]
+            user_ids = set(cache.get_many(slots).values())
+            for user_id in user_ids:
+                with self._locked(user_id):
+                    flushed += self._flush(user_id)
+            cache.delete_many(slots)
+            done += len(slots)
+            cache.set(done_key, done, None)
+        return flushed
+    
+    def checkout(self, user, order_data):
+        with self._locked(user.id):
+            self._flush(user.id)
+            order = super().checkout(user, order_data)
+            # The table now holds the (empty) cart; reload it from there
+            cache.delete(self._key(user.id))
+        return order
+
+
+_store = None
+
+
+def get_cart_store():
+    global _store
+    if _store is None:
+        path = getattr(settings, 'CART_STORE', 'orders.cart_store.DatabaseCartStore')
+        _store = import_string(path)()
+    return _store
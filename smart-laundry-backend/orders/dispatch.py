@@ -0,0 +1,283 @@
+"""
+Delivery route planning for orders that are ready.
+
+Ready orders are located by their ``delivery_pincode`` in the local
+``PincodeLocation`` table and grouped into areas by pincode prefix
+(``DISPATCH_AREA_PREFIX_LENGTH``). Each area's pincodes are stops on one
+closed tour from the depot, built by nearest neighbour and improved by
+2-opt; both use a grid of the stops (a plane projection, fine at city
+scale) so neither compares every pair. The tour is then cut into rider
+routes of at most ``capacity`` orders, in tour order.
+
+``assign_routes`` moves the orders of the routes it is given to
+``out_for_delivery`` through ``transition_orders``, with a tracking entry
+naming the rider and the stop. Used by the ``plan_delivery_routes`` command
+and the order admin.
+"""
+import math
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+
+from .models import Order, PincodeLocation
+from .transitions import transition_orders
+
+
+EARTH_RADIUS_KM = 6371.0
+
+# Nearest stops considered for each stop by 2-opt
+NEIGHBOURS = 8
+
+# ``stops``: list of ``(pincode, [order ids])`` in visiting order
+Route = namedtuple('Route', 'area stops distance_km')
+
+
+def area_prefix_length():
+    return getattr(settings, 'DISPATCH_AREA_PREFIX_LENGTH', 3)
+
+
+def default_capacity():
+    return getattr(settings, 'DISPATCH_ROUTE_CAPACITY', 25)
+
+
+def depot_location():
+    """``(latitude, longitude)`` from ``DISPATCH_DEPOT`` (``"lat,lng"``), or None"""
+    depot = getattr(settings, 'DISPATCH_DEPOT', '')
+    if not depot:
+        return None
+    latitude, longitude = (float(part) for part in depot.split(','))
+    return latitude, longitude
+
+
+def project(locations):
+    """``(x, y)`` in km for ``(latitude, longitude)`` pairs, on a plane through their mean latitude"""
+    scale = math.cos(math.radians(sum(latitude for latitude, _ in locations) / len(locations)))
+    return [
+        (EARTH_RADIUS_KM * math.radians(longitude) * scale, EARTH_RADIUS_KM * math.radians(latitude))
+        for latitude, longitude in locations
+    ]
+
+
+class _Grid:
+    """Points bucketed into square cells, for nearest-point searches"""
+    
+    def __init__(self, points):
+        self.points = points
+        self.min_x = min(x for x, _ in points)
+        self.min_y = min(y for _, y in points)
+        span = max(max(x for x, _ in points) - self.min_x, max(y for _, y in points) - self.min_y)
+        self.side = max(1, int(math.sqrt(len(points) / 2)))
+        self.size = span / self.side or 1.0
+        self.cells = defaultdict(list)
+        for index, point in enumerate(points):
+            self.cells[self._cell(*point)].append(index)
+    
+    def _cell(self, x, y):
+        return int((x - self.min_x) // self.size), int((y - self.min_y) // self.size)
+    
+    def remove(self, index):
+        cell = self._cell(*self.points[index])
+        self.cells[cell].remove(index)
+        if not self.cells[cell]:
+            del self.cells[cell]
+    
+    def nearest(self, x, y, count=1):
+        """Up to ``count`` ``(distance, index)`` pairs closest to ``(x, y)``, nearest first"""
+        cx, cy = self._cell(x, y)
+        last_ring = max(abs(cx), abs(cy), abs(self.side - cx), abs(self.side - cy)) + 1
+        found = []
+        for ring in range(last_ring + 1):
+            if not self.cells:
+                break
+            for dx in range(-ring, ring + 1):
+                # Top and bottom rows of the ring, then its sides
+                dys = (-ring, ring) if abs(dx) != ring else range(-ring, ring + 1)
+                for dy in dict.fromkeys(dys):
+                    for index in self.cells.get((cx + dx, cy + dy), ()):
+                        px, py = self.points[index]
+                        found.append((math.hypot(px - x, py - y), index))
+            # Points outside the rings searched so far are at least ring * size away
+            if len(found) >= count:
+                found.sort()
+                if found[count - 1][0] <= ring * self.size:
+                    break
+        found.sort()
+        return found[:count]
+
+
+def nearest_neighbour_tour(points, start):
+    """Indexes of ``points`` in nearest-neighbour order, starting from the point ``start``"""
+    grid = _Grid(points)
+    grid.remove(start)
+    tour = [start]
+    x, y = points[start]
+    for _ in range(len(points) - 1):
+        [(_, index)] = grid.nearest(x, y)
+        grid.remove(index)
+        tour.append(index)
+        x, y = points[index]
+    return tour
+
+
+def two_opt(tour, points, max_passes=50):
+    """Improve the closed ``tour`` in place with 2-opt moves between near neighbours"""
+    n = len(tour)
+    if n < 4:
+        return tour
+    
+    def distance(a, b):
+        return math.hypot(points[a][0] - points[b][0], points[a][1] - points[b][1])
+    
+    grid = _Grid(points)
+    neighbours = [
+        [index for _, index in grid.nearest(x, y, NEIGHBOURS + 1) if index != point]
+        for point, (x, y) in enumerate(points)
+    ]
+    position = [0] * n
+    for index, point in enumerate(tour):
+        position[point] = index
+    
+    def reverse(i, j):
+        """Reverse the stretch of the cycle from position i to position j"""
+        if i > j:
+            # The rest of the cycle gives the same tour, the other way round
+            i, j = j + 1, i - 1
+        while i < j:
+            tour[i], tour[j] = tour[j], tour[i]
+            position[tour[i]], position[tour[j]] = i, j
+            i += 1
+            j -= 1
+    
+    for _ in range(max_passes):
+        improved = False
+        for a in range(n):
+            for direction in (1, -1):
+                a_pos = position[a]
+                b = tour[(a_pos + direction) % n]
+                ab = distance(a, b)
+                for c in neighbours[a]:
+                    ac = distance(a, c)
+                    if ac >= ab:
+                        break
+                    c_pos = position[c]
+                    d = tour[(c_pos + direction) % n]
+                    if d == a or c == b:
+                        continue
+                    if ab + distance(c, d) - ac - distance(b, d) > 1e-9:
+                        # Swap edges a-b and c-d for a-c and b-d
+                        if direction == 1:
+                            reverse((a_pos + 1) % n, c_pos)
+                        else:
+                            reverse(c_pos, (a_pos - 1) % n)
+                        improved = True
+                        break
+        if not improved:
+            break
+    return tour
+
+
+def tour_length(tour, points):
+    return sum(
+        math.hypot(points[a][0] - points[b][0], points[a][1] - points[b][1])
+        for a, b in zip(tour, tour[1:] + tour[:1])
+    )
+
+
+def plan_area(area, stops, locations, depot, capacity):
+    """Routes for one area: ``stops`` maps pincodes to order ids, ``locations`` to coordinates"""
+    pincodes = sorted(stops)
+    coordinates = [locations[pincode] for pincode in pincodes]
+    if depot is None:
+        depot = (
+            sum(latitude for latitude, _ in coordinates) / len(coordinates),
+            sum(longitude for _, longitude in coordinates) / len(coordinates),
+        )
+    # Point 0 is the depot
+    points = project([depot] + coordinates)
+    tour = two_opt(nearest_neighbour_tour(points, 0), points)
+    start = tour.index(0)
+    visits = [
+        (index, order_id)
+        for index in tour[start + 1:] + tour[:start]
+        for order_id in stops[pincodes[index - 1]]
+    ]
+    
+    routes = []
+    for offset in range(0, len(visits), capacity):
+        route_stops = []
+        for index, order_id in visits[offset:offset + capacity]:
+            if not route_stops or route_stops[-1][0] != index:
+                route_stops.append((index, []))
+            route_stops[-1][1].append(order_id)
+        path = [0] + [index for index, _ in route_stops]
+        routes.append(Route(
+            area,
+            [(pincodes[index - 1], order_ids) for index, order_ids in route_stops],
+            round(tour_length(path, points), 2),
+        ))
+    return routes
+
+
+def plan_routes(orders, capacity=None, depot=None):
+    """Plan rider routes for ``orders`` (``(id, delivery_pincode)`` pairs)
+    
+    Returns ``(routes, unlocated)`` where ``unlocated`` lists the ids of
+    orders whose pincode is not in the geocode table.
+    """
+    capacity = capacity or default_capacity()
+    depot = depot or depot_location()
+    prefix = area_prefix_length()
+    
+    by_pincode = defaultdict(list)
+    for order_id, pincode in orders:
+        by_pincode[(pincode or '').strip()].append(order_id)
+    locations = {
+        location.pincode: (location.latitude, location.longitude)
+        for location in PincodeLocation.objects.filter(pincode__in=by_pincode)
+    }
+    
+    areas = defaultdict(dict)
+    unlocated = []
+    for pincode, order_ids in by_pincode.items():
+        if pincode in locations:
+            areas[pincode[:prefix]][pincode] = sorted(order_ids)
+        else:
+            unlocated.extend(order_ids)
+    
+    routes = []
+    for area in sorted(areas):
+        routes.extend(plan_area(area, areas[area], locations, depot, capacity))
+    return routes, sorted(unlocated)
+
+
+def ready_orders(queryset=None):
+    queryset = Order.objects.all() if queryset is None else queryset
+    return queryset.filter(status='ready').order_by().values_list('id', 'delivery_pincode')
+
+
+def rider_for(number, riders):
+    """The rider of route ``number`` (from 1), or None when ``riders`` has run out"""
+    if riders is None:
+        return f'Route {number}'
+    return riders[number - 1] if number <= len(riders) else None
+
+
+def assign_routes(routes, riders=None, assigned_by=''):
+    """Send the orders of ``routes`` out for delivery, one rider per route
+    
+    ``riders`` names the riders in route order (routes without one are not
+    assigned); by default routes are numbered. Returns the result of
+    ``transition_orders`` for the orders of the assigned routes.
+    """
+    tracking = {}
+    for number, route in enumerate(routes, start=1):
+        rider = rider_for(number, riders)
+        if rider is None:
+            break
+        for stop, (pincode, order_ids) in enumerate(route.stops, start=1):
+            for order_id in order_ids:
+                description = f'Out for delivery with {rider}, stop {stop} of {len(route.stops)}'
+                if assigned_by:
+                    description += f' (assigned by {assigned_by})'
+                tracking[order_id] = (description, pincode)
+    return transition_orders(list(tracking), 'out_for_delivery', tracking=tracking)
@@ -0,0 +1,252 @@
+"""
+Delivery ETAs from the current processing backlog.
+
+``CategoryLoad`` holds, per service category, the items of orders that are
+picked up or in progress and their total work (quantity times the service's
+``estimated_time``). It is kept in step incrementally, like the revenue
+rollups: status transitions (``order_status_changed``), order saves that
+change the status (or create an order in the backlog) and order deletes
+apply deltas in the same transaction, and ``create_order`` adds the items it
+bulk-creates with ``add_items``. Counters never go below zero.
+Deltas are worked out from each service's current ``estimated_time``, so
+saving a service with a new ``estimated_time`` or category recomputes the
+rows of its categories. Items edited on orders already in the backlog, and
+services changed by queryset updates, are picked up by the
+``rebuild_category_load`` command.
+
+The table is small (one row per category) and is cached whole, so an ETA
+costs one cache read however busy the shop is:
+
+    ready = start + max over lines (category work / capacity + estimated_time)
+    ETA   = ready + ETA_DELIVERY_BUFFER
+
+Orders placed without a ``delivery_date`` get this ETA as their delivery
+date; order details show a live estimate until the order is picked up.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_init, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from services.models import Service, ServiceCategory
+from .models import CategoryLoad, Order, OrderItem
+from .signals import order_status_changed
+
+
+# Orders whose items make up the backlog
+BACKLOG_STATUSES = {'picked_up', 'in_progress'}
+
+# Orders that have not joined the backlog yet; their ETA includes the wait
+QUEUED_STATUSES = {'pending', 'confirmed'}
+
+LOAD_TABLE_KEY = 'eta:load-table'
+
+
+def delivery_buffer():
+    return getattr(settings, 'ETA_DELIVERY_BUFFER', timedelta(hours=4))
+
+
+def cache_timeout():
+    return getattr(settings, 'ETA_LOAD_CACHE_SECONDS', 300)
+
+
+def get_load_table():
+    """category_id -> time until its queued work is through"""
+    table = cache.get(LOAD_TABLE_KEY)
+    if table is None:
+        table = {
+            category_id: work / capacity
+            for category_id, work, capacity in CategoryLoad.objects.values_list('category_id', 'work', 'capacity')
+        }
+        cache.set(LOAD_TABLE_KEY, table, cache_timeout())
+    return table
+
+
+def invalidate_load_table():
+    transaction.on_commit(lambda: cache.delete(LOAD_TABLE_KEY))
+
+
+def estimate_ready(lines, start, table=None):
+    """When items ``lines`` (``(category_id, estimated_time)``) started at ``start`` are done"""
+    table = get_load_table() if table is None else table
+    return start + max(
+        (table.get(category_id, timedelta(0)) + estimated_time for category_id, estimated_time in lines),
+        default=timedelta(0),
+    )
+
+
+def estimate_delivery(lines, start=None, table=None):
+    """Delivery ETA for items ``lines`` (``(category_id, estimated_time)``) picked up at ``start``"""
+    now = timezone.now()
+    start = max(start, now) if start else now
+    return estimate_ready(lines, start, table) + delivery_buffer()
+
+
+def order_eta(order, lines, table=None):
+    """The current delivery ETA of ``order`` with items ``lines``, or None once it is closed"""
+    if order.status in ('delivered', 'cancelled'):
+        return None
+    if order.status in QUEUED_STATUSES:
+        return estimate_delivery(lines, order.pickup_date, table)
+    # Already in (or past) the backlog: keep the promised date unless it has slipped
+    now = timezone.now()
+    if order.status in BACKLOG_STATUSES:
+        earliest = now + max((estimated_time for _, estimated_time in lines), default=timedelta(0))
+    else:
+        earliest = now
+    earliest += delivery_buffer()
+    return max(order.delivery_date, earliest) if order.delivery_date else earliest
+
+
+def _totals(rows):
+    totals = defaultdict(lambda: [set(), 0, timedelta(0)])
+    for order_id, category_id, quantity, estimated_time in rows:
+        total = totals[category_id]
+        total[0].add(order_id)
+        total[1] += quantity
+        total[2] += quantity * estimated_time
+    return {category_id: [len(orders), quantity, work] for category_id, (orders, quantity, work) in totals.items()}
+
+
+def backlog_totals(items):
+    """category_id -> ``[orders, quantity, work]`` for an OrderItem queryset"""
+    rows = items.order_by().values_list('order_id', 'service__category_id', 'quantity', 'service__estimated_time')
+    return _totals(rows.iterator(2000))
+
+
+def _changed(field, delta, zero=0):
+    # Rows are never taken below zero, whatever was missed on the way in
+    if delta < zero:
+        return Greatest(F(field) + delta, Value(zero))
+    return F(field) + delta
+
+
+def _apply_totals(totals, sign):
+    for category_id, (orders, quantity, work) in totals.items():
+        changes = {
+            'order_count': _changed('order_count', sign * orders),
+            'quantity': _changed('quantity', sign * quantity),
+            'work': _changed('work', sign * work, timedelta(0)),
+            'updated_at': timezone.now(),
+        }
+        if CategoryLoad.objects.filter(category_id=category_id).update(**changes) or sign < 0:
+            continue
+        try:
+            with transaction.atomic():
+                CategoryLoad.objects.create(
+                    category_id=category_id, order_count=sign * orders, quantity=sign * quantity, work=sign * work,
+                )
+        except IntegrityError:
+            # Created concurrently by another writer
+            CategoryLoad.objects.filter(category_id=category_id).update(**changes)
+    invalidate_load_table()
+
+
+def apply_load_deltas(order_ids, sign):
+    """Add (``sign=1``) or take away (``sign=-1``) the items of ``order_ids`` from the load table"""
+    if order_ids:
+        _apply_totals(backlog_totals(OrderItem.objects.filter(order_id__in=order_ids)), sign)
+
+
+def add_items(order, items):
+    """Count ``items`` created without signals (``bulk_create``) for a new ``order`` in the backlog"""
+    if order.status in BACKLOG_STATUSES and items:
+        rows = [(order.pk, item.service.category_id, item.quantity, item.service.estimated_time) for item in items]
+        _apply_totals(_totals(rows), 1)
+
+
+def rebuild_category_load(category_ids=None):
+    """Recompute the load rows of ``category_ids`` (default: every category) from the backlog
+    
+    Capacities are kept. Returns the backlog totals by category.
+    """
+    categories = ServiceCategory.objects.all()
+    items = OrderItem.objects.filter(order__status__in=BACKLOG_STATUSES)
+    if category_ids is not None:
+        categories = categories.filter(pk__in=category_ids)
+        items = items.filter(service__category_id__in=category_ids)
+    with transaction.atomic():
+        # Lock the rows first, so deltas committed after the count wait and apply on top
+        loads = CategoryLoad.objects.select_for_update().filter(category__in=categories).in_bulk(
+            field_name='category_id'
+        )
+        totals = backlog_totals(items)
+        for category_id in categories.values_list('id', flat=True):
+            order_count, quantity, work = totals.get(category_id, (0, 0, timedelta(0)))
+            load = loads.get(category_id) or CategoryLoad(category_id=category_id)
+            load.order_count, load.quantity, load.work = order_count, quantity, work
+            load.save()
+        invalidate_load_table()
+    return totals
+
+
+def _moves(changes):
+    """Ids of orders joining and leaving the backlog among ``(order, old_status)`` pairs"""
+    joining, leaving = [], []
+    for order, old_status in changes:
+        was, now = old_status in BACKLOG_STATUSES, order.status in BACKLOG_STATUSES
+        if now and not was:
+            joining.append(order.pk)
+        elif was and not now:
+            leaving.append(order.pk)
+    return joining, leaving
+
+
+@receiver(order_status_changed)
+def update_load_on_status_change(sender, changes, **kwargs):
+    joining, leaving = _moves(changes)
+    apply_load_deltas(joining, 1)
+    apply_load_deltas(leaving, -1)
+    for order, _ in changes:
+        order._load_status = order.status
+
+
+@receiver(post_init, sender=Order)
+def remember_load_status(sender, instance, **kwargs):
+    instance._load_status = None if 'status' in instance.get_deferred_fields() else instance.status
+
+
+@receiver(post_save, sender=Order)
+def update_load_on_order_save(sender, instance, created=False, raw=False, **kwargs):
+    if raw or 'status' in instance.get_deferred_fields():
+        return
+    # A new order joins the backlog if it is created in it
+    if created or instance._load_status is not None:
+        joining, leaving = _moves([(instance, None if created else instance._load_status)])
+        apply_load_deltas(joining, 1)
+        apply_load_deltas(leaving, -1)
+    instance._load_status = instance.status
+
+
+@receiver(pre_delete, sender=Order)
+def update_load_on_order_delete(sender, instance, **kwargs):
+    # Before the cascade removes the items
+    if instance._load_status in BACKLOG_STATUSES:
+        apply_load_deltas([instance.pk], -1)
+
+
+def _timing(service):
+    if {'category_id', 'estimated_time'} & service.get_deferred_fields():
+        return None
+    return service.category_id, service.estimated_time
+
+
+@receiver(post_init, sender=Service)
+def remember_service_timing(sender, instance, **kwargs):
+    instance._load_timing = _timing(instance)
+
+
+@receiver(post_save, sender=Service)
+def rebuild_load_on_service_change(sender, instance, created=False, raw=False, **kwargs):
+    old, new = instance._load_timing, _timing(instance)
+    instance._load_timing = new
+    if raw or created or old is None or new is None or old == new:
+        return
+    rebuild_category_load({old[0], new[0]})
@@ -0,0 +1,100 @@
+"""
+In-process pub/sub for order tracking events.
+
+Status changes publish one event per new ``OrderTracking`` row after their
+transaction commits; live streams (orders.streams) subscribe per user. The
+broker only reaches subscribers in the publishing process, so streams also
+catch up from the database on every keep-alive tick to pick up events
+published by other workers.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+from django.dispatch import receiver
+
+from .models import Order
+from .signals import order_status_changed
+
+
+def tracking_event(tracking, order):
+    return {
+        'id': tracking.id,
+        'order_id': order.id,
+        'order_number': order.order_number,
+        'status': tracking.status,
+        'description': tracking.description,
+        'location': tracking.location,
+        'created_at': tracking.created_at.isoformat(),
+    }
+
+
+class Subscription:
+    """One stream's queue; events are delivered on the subscriber's event loop"""
+    
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+    
+    def deliver(self, event):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+    
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+    
+    def drain(self):
+        events = []
+        while not self.queue.empty():
+            events.append(self.queue.get_nowait())
+        return events
+    
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class OrderEventBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+    
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+    
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+    
+    def publish(self, user_id, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.deliver(event)
+            except RuntimeError:
+                # The subscriber's loop has closed; it will unsubscribe itself
+                pass
+
+
+broker = OrderEventBroker()
+
+
+@receiver(order_status_changed, sender=Order)
+def publish_tracking_events(sender, changes, tracking, **kwargs):
+    orders = {order.id: order for order, _ in changes}
+    events = [(orders[entry.order_id].user_id, tracking_event(entry, orders[entry.order_id])) for entry in tracking]
+    
+    def publish():
+        for user_id, event in events:
+            broker.publish(user_id, event)
+    
+    transaction.on_commit(publish)
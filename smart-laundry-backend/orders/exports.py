@@ -0,0 +1,176 @@
+"""
+Streaming exports of orders, order items and payments.
+
+Rows are read with ``values_list(...).iterator()`` and encoded as CSV or
+NDJSON in buffered chunks, optionally gzipped on the fly, so an export of
+any size runs in constant memory. Orders and items moved to the archive
+(orders.archive) follow the live rows, read back from their archived
+documents. Used by the ``export`` endpoint (orders.views.export_dataset) and
+the ``export_orders`` command.
+"""
+import csv
+import io
+import zlib
+from datetime import datetime, time, timedelta
+from itertools import chain
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import Order, OrderItem, Payment, ArchivedOrder
+
+
+OUTPUT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+ITERATOR_CHUNK_SIZE = 2000
+# Encoded output is handed on in pieces of about this size
+BUFFER_SIZE = 64 * 1024
+
+
+class Dataset:
+    """An exportable model: its columns and the fields its filters apply to"""
+    
+    def __init__(self, model, columns, date_field, status_field, status_choices, archived_rows=None):
+        self.model = model
+        self.columns = columns
+        self.date_field = date_field
+        self.status_field = status_field
+        self.status_choices = status_choices
+        # Turns a queryset of matching archived orders into rows of the same columns
+        self.archived_rows = archived_rows
+    
+    def rows(self, start=None, end=None, statuses=None):
+        queryset = _filtered(
+            self.model.objects.order_by('pk'), self.date_field, self.status_field, start, end, statuses
+        )
+        rows = queryset.values_list(*self.columns).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+        if self.archived_rows is None:
+            return rows
+        archived = _filtered(ArchivedOrder.objects.order_by('pk'), 'created_at', 'status', start, end, statuses)
+        return chain(rows, self.archived_rows(archived))
+
+
+def _filtered(queryset, date_field, status_field, start, end, statuses):
+    if start:
+        queryset = queryset.filter(**{f'{date_field}__gte': day_start(start)})
+    if end:
+        queryset = queryset.filter(**{f'{date_field}__lt': day_start(end + timedelta(days=1))})
+    if statuses:
+        queryset = queryset.filter(**{f'{status_field}__in': statuses})
+    return queryset
+
+
+def archived_order_rows(queryset):
+    rows = queryset.values_list(
+        'id', 'order_number', 'user_id', 'user__email', 'status', 'payment_method', 'total_amount',
+        'created_at', 'closed_at', 'document',
+    ).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    for order_id, number, user_id, email, status, method, total, created_at, closed_at, document in rows:
+        yield (
+            order_id, number, user_id, email, status, document.get('payment_status'), method,
+            document.get('subtotal'), document.get('tax_amount'), document.get('delivery_charge'),
+            document.get('small_order_fee'), total, document.get('pickup_date'), document.get('delivery_date'),
+            created_at, closed_at,
+        )
+
+
+def archived_item_rows(queryset):
+    rows = queryset.values_list('id', 'order_number', 'status', 'document').iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    for order_id, number, status, document in rows:
+        for item in document['items']:
+            yield (
+                item['id'], order_id, number, status, item['service_id'], item['service_name'],
+                item['service_option_id'], item['quantity'], item['unit_price'], item['total_price'],
+                item['created_at'],
+            )
+
+
+DATASETS = {
+    'orders': Dataset(
+        Order,
+        ('id', 'order_number', 'user_id', 'user__email', 'status', 'payment_status', 'payment_method',
+         'subtotal', 'tax_amount', 'delivery_charge', 'small_order_fee', 'total_amount', 'pickup_date', 'delivery_date',
+         'created_at', 'updated_at'),
+        date_field='created_at', status_field='status', status_choices=Order.STATUS_CHOICES,
+        archived_rows=archived_order_rows,
+    ),
+    'items': Dataset(
+        OrderItem,
+        ('id', 'order_id', 'order__order_number', 'order__status', 'service_id', 'service__name',
+         'service_option_id', 'quantity', 'unit_price', 'total_price', 'created_at'),
+        date_field='order__created_at', status_field='order__status', status_choices=Order.STATUS_CHOICES,
+        archived_rows=archived_item_rows,
+    ),
+    'payments': Dataset(
+        Payment,
+        # Payments stay live when their order is archived; they then point at archived_order
+        ('id', 'order_id', 'order__order_number', 'archived_order_id', 'archived_order__order_number',
+         'payment_method', 'amount', 'status', 'transaction_id', 'created_at', 'updated_at'),
+        date_field='created_at', status_field='status', status_choices=Payment.STATUS_CHOICES,
+    ),
+}
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _buffered(lines):
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def csv_lines(columns, rows):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_plain(value) for value in row])
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+    yield out.getvalue()
+
+
+def ndjson_lines(columns, rows):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode(dict(zip(columns, row))) + '\n'
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_chunks(dataset, output='csv', compress=False, **filters):
+    """Encoded export of ``dataset`` (a DATASETS key) as an iterator of bytes"""
+    spec = DATASETS[dataset]
+    lines = csv_lines if output == 'csv' else ndjson_lines
+    chunks = _buffered(lines(spec.columns, spec.rows(**filters)))
+    return gzipped(chunks) if compress else chunks
+
+
+def export_filename(dataset, output, compress=False):
+    stamp = timezone.localdate().isoformat()
+    return f'{dataset}-{stamp}.{output}' + ('.gz' if compress else '')
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone
+
+from django.db.models import Q, Sum
+from core.query_plans import hot_query
+from .models import Order, OrderItem, Cart, OrderTracking, Payment, DailyRevenueRollup, PickupSlot, WebhookEvent
+from .dispatch import ready_orders
+
+
+@hot_query('orders.user_recent')
+def user_recent_orders():
+    return Order.objects.filter(user_id=1).order_by('-created_at', '-id')[:20]
+
+
+@hot_query('orders.user_by_status')
+def user_orders_by_status():
+    return Order.objects.filter(user_id=1, status='delivered')
+
+
+@hot_query('orders.keyset_page')
+def orders_keyset_page():
+    return Order.objects.order_by('-created_at', '-id')[:20]
+
+
+@hot_query('cart.user_items')
+def user_cart_items():
+    return Cart.objects.filter(user_id=1).order_by('-created_at', '-id')
+
+
+@hot_query('tracking.order_history')
+def order_tracking_history():
+    return OrderTracking.objects.filter(order_id=1).order_by('-created_at')
+
+
+@hot_query('items.user_recent')
+def user_recent_items():
+    return OrderItem.objects.filter(user_id=1).order_by('-created_at')[:20]
+
+
+@hot_query('tracking.user_recent')
+def user_recent_tracking():
+    return OrderTracking.objects.filter(user_id=1).order_by('-created_at', '-id')[:20]
+
+
+@hot_query('tracking.user_events')
+def user_tracking_events():
+    return OrderTracking.objects.filter(user_id=1, id__gt=100).select_related('order').order_by('id')[:100]
+
+
+@hot_query('payments.user_recent')
+def user_recent_payments():
+    return Payment.objects.filter(user_id=1).order_by('-created_at', '-id')[:20]
+
+
+@hot_query('rollups.revenue_range')
+def revenue_range():
+    return DailyRevenueRollup.objects.filter(
+        day__range=('2024-01-01', '2024-01-31'), category__isnull=True
+    ).values('day').annotate(revenue=Sum('revenue'))
+
+
+@hot_query('payments.by_transaction')
+def payments_by_transaction():
+    return Payment.objects.filter(transaction_id__in=['pay_1', 'pay_2']).order_by().values('id', 'transaction_id')
+
+
+@hot_query('webhooks.pending')
+def pending_webhook_events():
+    return WebhookEvent.objects.filter(
+        Q(retry_at__isnull=True) | Q(retry_at__lte='2024-01-01T00:00:00Z'), processed_at__isnull=True
+    ).order_by('id')[:500]
+
+
+@hot_query('slots.availability')
+def pickup_slot_availability():
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return PickupSlot.objects.filter(
+        area__in=['5', '56', '560', '5600', '56000', '560001'],
+        starts_at__gte=start, starts_at__lt=start + timedelta(days=7), is_active=True,
+    ).order_by('area', 'starts_at')
+
+
+@hot_query('dispatch.ready_orders')
+def dispatch_ready_orders():
+    return ready_orders()
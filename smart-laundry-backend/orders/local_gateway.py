@@ -0,0 +1,66 @@
+"""
+A local stand-in for the payment gateways, for tests and benchmarks.
+
+``LocalGateway`` builds the webhook deliveries Razorpay or Stripe would
+send for existing payments, signed with the configured secret, and replays
+them against the webhook view in-process or against a running server.
+"""
+import json
+import random
+import urllib.error
+import urllib.request
+import uuid
+
+from django.test import RequestFactory
+
+from .webhooks import GATEWAYS
+
+
+class LocalGateway:
+    def __init__(self, gateway='razorpay'):
+        self.gateway = GATEWAYS[gateway]
+    
+    def delivery(self, payment, status, event_id=None):
+        """``(body, headers)`` of a webhook moving ``payment`` to ``status``"""
+        event_id = event_id or f'evt_{uuid.uuid4().hex}'
+        payload = self.gateway.build_event(event_id, payment.transaction_id, status, payment.amount)
+        body = json.dumps(payload).encode()
+        headers = self.gateway.sign(body)
+        if self.gateway.name == 'razorpay':
+            headers['X-Razorpay-Event-Id'] = event_id
+        return body, headers
+    
+    def deliveries(self, payments, status='success', duplicate_rate=0.0, seed=None):
+        """One delivery per payment, with about ``duplicate_rate`` of them sent again (as gateways retry)"""
+        rng = random.Random(seed)
+        for payment in payments:
+            body, headers = self.delivery(payment, status)
+            yield body, headers
+            if rng.random() < duplicate_rate:
+                yield body, headers
+    
+    def replay(self, deliveries, url=None):
+        """Send ``deliveries``; returns the list of response status codes
+        
+        Without ``url`` each delivery goes straight to the webhook view.
+        """
+        from .views import payment_webhook
+        factory = RequestFactory()
+        codes = []
+        for body, headers in deliveries:
+            if url:
+                request = urllib.request.Request(
+                    url, data=body, headers={'Content-Type': 'application/json', **headers}, method='POST'
+                )
+                try:
+                    with urllib.request.urlopen(request) as response:
+                        codes.append(response.status)
+                except urllib.error.HTTPError as exc:
+                    codes.append(exc.code)
+            else:
+                request = factory.post(
+                    f'/api/orders/webhooks/{self.gateway.name}/', body,
+                    content_type='application/json', headers=headers,
+                )
+                codes.append(payment_webhook(request, gateway=self.gateway.name).status_code)
+        return codes
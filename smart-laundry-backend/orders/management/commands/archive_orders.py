@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from orders.archive import archive_orders
+
+
+class Command(BaseCommand):
+    help = (
+        'Move delivered and cancelled orders (with their items, tracking and payments) '
+        'into the archive. Each chunk commits on its own, so the command can be '
+        'stopped and re-run at any time.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int,
+                            help='Archive orders closed at least this many days ago '
+                                 '(default: ORDER_ARCHIVE_AFTER)')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of orders moved per transaction')
+        parser.add_argument('--limit', type=int,
+                            help='Stop after archiving this many orders')
+
+    def handle(self, *args, **options):
+        before = None
+        if options['older_than_days'] is not None:
+            before = timezone.now() - timedelta(days=options['older_than_days'])
+        
+        total = 0
+        for moved in archive_orders(before, options['chunk_size'], options['limit']):
+            total += moved
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Archived {total} orders so far')
+        
+        self.stdout.write(self.style.SUCCESS(f'Archived {total} orders'))
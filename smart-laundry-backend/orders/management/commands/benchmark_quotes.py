@@ -0,0 +1,73 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from orders.placement import price_items
+from orders.pricing import get_pricing_engine
+from orders.quotes import quote_baskets
+from services.models import Service
+
+
+class Command(BaseCommand):
+    help = (
+        'Price random baskets from the active catalog through the batch quote path and '
+        'one basket at a time, and report the cost per basket. Reads only.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--baskets', type=int, default=200, help='Baskets per batch')
+        parser.add_argument('--items', type=int, default=5, help='Items per basket')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs of each path; the best is reported')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        choices = [
+            (service.id, None) for service in Service.objects.filter(is_active=True)
+        ] + [
+            (option.service_id, option.id)
+            for service in Service.objects.filter(is_active=True).prefetch_related('options')
+            for option in service.options.all() if option.is_active
+        ]
+        if not choices:
+            raise CommandError('No active services to price; populate the catalog first')
+
+        rng = random.Random(options['seed'])
+        baskets = [
+            {'items': [
+                {'service_id': service_id, 'service_option_id': option_id, 'quantity': rng.randint(1, 5)}
+                for service_id, option_id in (rng.choice(choices) for _ in range(options['items']))
+            ]}
+            for _ in range(options['baskets'])
+        ]
+        engine = get_pricing_engine()
+
+        def one_at_a_time():
+            for basket in baskets:
+                priced = price_items(basket['items'])
+                engine.quote((service.category_id, price, item['quantity']) for item, service, _, price in priced)
+
+        for label, run in (('batch', lambda: quote_baskets(baskets)), ('one at a time', one_at_a_time)):
+            seconds, queries = self.measure(run, options['repeat'])
+            self.stdout.write(
+                f'{label:>14}: {seconds * 1000:9.2f} ms per batch, '
+                f'{seconds / len(baskets) * 1e6:8.1f} us per basket, {queries} queries'
+            )
+
+    def measure(self, run, repeat):
+        """Best wall time of ``repeat`` runs and the queries one run makes"""
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        best = None
+        for _ in range(max(repeat, 1)):
+            queries.clear()
+            with connection.execute_wrapper(count):
+                started = time.perf_counter()
+                run()
+                elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, len(queries)
@@ -0,0 +1,82 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.utils import timezone
+from orders.models import PickupSlot
+from orders.slots import book_slot
+from rest_framework import serializers
+
+
+class Command(BaseCommand):
+    help = (
+        'Race many concurrent clients for the seats of one pickup slot and report booking '
+        'throughput and whether the slot was oversold. Books into a temporary slot that is '
+        'deleted afterwards; no orders are created.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=300, help='Concurrent clients (one thread each)')
+        parser.add_argument('--capacity', type=int, default=50, help='Seats in the contested slot')
+        parser.add_argument('--attempts', type=int, default=1, help='Booking attempts per client')
+    
+    def handle(self, *args, **options):
+        clients, capacity = options['clients'], options['capacity']
+        if clients < 1 or capacity < 1:
+            raise CommandError('--clients and --capacity must be at least 1')
+        
+        starts_at = timezone.now().replace(microsecond=0) + timedelta(days=1)
+        slot = PickupSlot.objects.create(
+            area='benchmark', starts_at=starts_at, ends_at=starts_at + timedelta(hours=2), capacity=capacity,
+        )
+        outcomes = {'booked': 0, 'full': 0, 'error': 0}
+        latencies = []
+        lock = threading.Lock()
+        start_line = threading.Barrier(clients)
+        
+        def client():
+            try:
+                start_line.wait()
+                for _ in range(options['attempts']):
+                    started = time.perf_counter()
+                    try:
+                        book_slot(slot)
+                        outcome = 'booked'
+                    except serializers.ValidationError:
+                        outcome = 'full'
+                    except DatabaseError:
+                        outcome = 'error'
+                    with lock:
+                        outcomes[outcome] += 1
+                        latencies.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+        
+        try:
+            threads = [threading.Thread(target=client) for _ in range(clients)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            slot.refresh_from_db()
+        finally:
+            PickupSlot.objects.filter(pk=slot.pk).delete()
+        
+        attempts = sum(outcomes.values())
+        latencies.sort()
+        self.stdout.write(
+            f'{clients} clients, {attempts} attempts for {capacity} seats in {elapsed * 1000:.1f} ms '
+            f'({attempts / elapsed:.0f} attempts/s)'
+        )
+        self.stdout.write(
+            f"booked {outcomes['booked']}, rejected as full {outcomes['full']}, database errors {outcomes['error']}; "
+            f'latency p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, '
+            f'p99 {latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)] * 1000:.2f} ms'
+        )
+        if slot.booked > capacity or slot.booked != outcomes['booked']:
+            raise CommandError(f"Slot counter is {slot.booked} after {outcomes['booked']} successful bookings")
+        self.stdout.write(self.style.SUCCESS(f'Slot counter {slot.booked}/{capacity}; not oversold'))
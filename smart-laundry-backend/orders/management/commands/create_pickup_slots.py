@@ -0,0 +1,74 @@
+from datetime import date, datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from orders.models import PickupSlot
+from orders.slots import invalidate
+
+
+DEFAULT_WINDOWS = '08:00-10:00,10:00-12:00,12:00-14:00,14:00-16:00,16:00-18:00,18:00-20:00'
+
+
+def parse_windows(value):
+    windows = []
+    for window in value.split(','):
+        try:
+            start, end = (time.fromisoformat(part.strip()) for part in window.split('-'))
+        except ValueError:
+            raise CommandError(f'Invalid window {window!r}; expected HH:MM-HH:MM')
+        if end <= start:
+            raise CommandError(f'Window {window!r} must end after it starts')
+        windows.append((start, end))
+    return windows
+
+
+class Command(BaseCommand):
+    help = (
+        'Create pickup slots for areas (pincodes or pincode prefixes) over a range of days. '
+        'Slots that already exist are left as they are, so the command can be re-run daily.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('areas', nargs='+', help='Pincodes or pincode prefixes')
+        parser.add_argument('--start', type=date.fromisoformat,
+                            help='First day (YYYY-MM-DD, default: tomorrow)')
+        parser.add_argument('--days', type=int, default=7)
+        parser.add_argument('--windows', default=DEFAULT_WINDOWS,
+                            help='Comma separated HH:MM-HH:MM pickup windows per day (local time)')
+        parser.add_argument('--capacity', type=int, default=20, help='Pickups per slot')
+    
+    def handle(self, *args, **options):
+        if options['capacity'] < 1:
+            raise CommandError('--capacity must be at least 1')
+        windows = parse_windows(options['windows'])
+        first_day = options['start'] or timezone.localdate() + timedelta(days=1)
+        tz = timezone.get_current_timezone()
+        
+        slots = [
+            PickupSlot(
+                area=area,
+                starts_at=timezone.make_aware(datetime.combine(day, start), tz),
+                ends_at=timezone.make_aware(datetime.combine(day, end), tz),
+                capacity=options['capacity'],
+            )
+            for area in dict.fromkeys(options['areas'])
+            for day in (first_day + timedelta(days=offset) for offset in range(options['days']))
+            for start, end in windows
+        ]
+        if not slots:
+            raise CommandError('No slots to create')
+        existing = set(
+            PickupSlot.objects.filter(
+                area__in=options['areas'],
+                starts_at__gte=min(slot.starts_at for slot in slots),
+                starts_at__lte=max(slot.starts_at for slot in slots),
+            ).values_list('area', 'starts_at')
+        )
+        new_slots = [slot for slot in slots if (slot.area, slot.starts_at) not in existing]
+        # bulk_create sends no post_save, so drop cached availability here
+        PickupSlot.objects.bulk_create(new_slots, ignore_conflicts=True)
+        invalidate(new_slots)
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(new_slots)} pickup slots ({len(slots) - len(new_slots)} already existed)'
+        ))
@@ -0,0 +1,44 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from orders.exports import DATASETS, OUTPUT_FORMATS, export_chunks
+
+
+class Command(BaseCommand):
+    help = 'Stream orders, order items or payments to a file (or stdout) as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(DATASETS))
+        parser.add_argument('--output', choices=list(OUTPUT_FORMATS), default='csv')
+        parser.add_argument('--since', type=date.fromisoformat,
+                            help='First day to export (YYYY-MM-DD)')
+        parser.add_argument('--until', type=date.fromisoformat,
+                            help='Last day to export (YYYY-MM-DD)')
+        parser.add_argument('--status', action='append', default=[],
+                            help='Only rows with this status (repeatable)')
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output')
+        parser.add_argument('--file', help='Write to this path instead of stdout')
+
+    def handle(self, *args, **options):
+        spec = DATASETS[options['dataset']]
+        valid_statuses = {value for value, _ in spec.status_choices}
+        invalid = [value for value in options['status'] if value not in valid_statuses]
+        if invalid:
+            raise CommandError(f"Invalid status: {', '.join(invalid)}")
+        
+        chunks = export_chunks(
+            options['dataset'], options['output'], options['gzip'],
+            start=options['since'], end=options['until'], statuses=options['status'],
+        )
+        
+        if options['file']:
+            with open(options['file'], 'wb') as out:
+                for chunk in chunks:
+                    out.write(chunk)
+            self.stderr.write(self.style.SUCCESS(f'Exported {options["dataset"]} to {options["file"]}'))
+        else:
+            out = sys.stdout.buffer
+            for chunk in chunks:
+                out.write(chunk)
+            out.flush()
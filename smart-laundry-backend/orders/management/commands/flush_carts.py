@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from orders.cart_store import get_cart_store
+
+
+class Command(BaseCommand):
+    help = 'Write carts with unsaved changes from the cart store back to the cart table (run every CART_FLUSH_INTERVAL)'
+
+    def handle(self, *args, **options):
+        flushed = get_cart_store().flush_dirty()
+        self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} carts'))
@@ -0,0 +1,41 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from orders.models import PincodeLocation
+
+
+class Command(BaseCommand):
+    help = (
+        'Load the geocode table used for delivery route planning from a CSV with '
+        'pincode, latitude and longitude columns (and optionally name). '
+        'Existing pincodes are updated.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file')
+        parser.add_argument('--batch-size', type=int, default=1000)
+    
+    def handle(self, *args, **options):
+        locations = {}
+        with open(options['path'], newline='') as lines:
+            reader = csv.DictReader(lines)
+            missing = {'pincode', 'latitude', 'longitude'} - set(reader.fieldnames or [])
+            if missing:
+                raise CommandError(f"CSV has no column(s): {', '.join(sorted(missing))}")
+            for row in reader:
+                pincode = (row['pincode'] or '').strip()
+                try:
+                    latitude, longitude = float(row['latitude']), float(row['longitude'])
+                except (TypeError, ValueError):
+                    raise CommandError(f'Line {reader.line_num}: invalid coordinates')
+                if not pincode or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                    raise CommandError(f'Line {reader.line_num}: invalid pincode or coordinates')
+                locations[pincode] = PincodeLocation(
+                    pincode=pincode, name=(row.get('name') or '').strip(), latitude=latitude, longitude=longitude,
+                )
+        
+        PincodeLocation.objects.bulk_create(
+            locations.values(), batch_size=options['batch_size'],
+            update_conflicts=True, unique_fields=['pincode'], update_fields=['name', 'latitude', 'longitude'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Loaded {len(locations)} pincode locations'))
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from orders.dispatch import assign_routes, plan_routes, ready_orders, rider_for
+
+
+class Command(BaseCommand):
+    help = (
+        'Plan delivery routes for orders that are ready, grouped by area, and '
+        'send them out for delivery (one tracking entry per order naming the rider '
+        'and stop). Use --dry-run to only print the plan.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--capacity', type=int,
+                            help='Orders per rider route (default: DISPATCH_ROUTE_CAPACITY)')
+        parser.add_argument('--riders',
+                            help='Comma separated rider names, one per route in order; '
+                                 'routes beyond the list stay ready (default: number the routes)')
+        parser.add_argument('--area', action='append', default=[],
+                            help='Only plan orders whose pincode starts with this (repeatable)')
+        parser.add_argument('--dry-run', action='store_true', help='Print the plan; change no orders')
+    
+    def handle(self, *args, **options):
+        if options['capacity'] is not None and options['capacity'] < 1:
+            raise CommandError('--capacity must be at least 1')
+        riders = [name.strip() for name in options['riders'].split(',') if name.strip()] if options['riders'] else None
+        
+        orders = [
+            (order_id, pincode) for order_id, pincode in ready_orders()
+            if not options['area'] or (pincode or '').startswith(tuple(options['area']))
+        ]
+        started = time.perf_counter()
+        routes, unlocated = plan_routes(orders, options['capacity'])
+        elapsed = time.perf_counter() - started
+        
+        for number, route in enumerate(routes, start=1):
+            rider = rider_for(number, riders) or f'Route {number} (no rider, stays ready)'
+            self.stdout.write(
+                f'{rider}: area {route.area}, {sum(len(ids) for _, ids in route.stops)} orders, '
+                f'{len(route.stops)} stops, {route.distance_km:.1f} km'
+            )
+            if options['verbosity'] > 1:
+                for pincode, order_ids in route.stops:
+                    self.stdout.write(f"    {pincode}: {', '.join(map(str, order_ids))}")
+        if unlocated:
+            self.stdout.write(self.style.WARNING(
+                f'{len(unlocated)} orders have a pincode missing from the geocode table and were not planned'
+            ))
+        self.stdout.write(f'Planned {len(orders) - len(unlocated)} orders into {len(routes)} routes in {elapsed:.2f} s')
+        
+        if options['dry_run'] or not routes:
+            return
+        updated, failures = assign_routes(routes, riders, assigned_by='plan_delivery_routes')
+        if failures:
+            self.stdout.write(self.style.WARNING(f'{len(failures)} orders changed status meanwhile and were skipped'))
+        self.stdout.write(self.style.SUCCESS(f'Sent {len(updated)} orders out for delivery'))
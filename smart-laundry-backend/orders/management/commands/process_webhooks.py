@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from orders.webhooks import process_pending_events
+
+
+class Command(BaseCommand):
+    help = 'Apply pending payment webhook events from the inbox (what the process_webhook_events task does)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Events applied per transaction (default: WEBHOOK_BATCH_SIZE)')
+    
+    def handle(self, *args, **options):
+        outcomes = process_pending_events(options['batch_size'])
+        details = ', '.join(f'{outcome}: {count}' for outcome, count in sorted(outcomes.items()))
+        self.stdout.write(self.style.SUCCESS(f'Processed {sum(outcomes.values())} events ({details or "none pending"})'))
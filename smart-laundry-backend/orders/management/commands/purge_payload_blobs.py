@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from orders.blobs import unreferenced_blobs
+
+
+class Command(BaseCommand):
+    help = 'Delete stored gateway payloads no payment refers to any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-hours', type=int, default=24,
+                            help='Keep blobs created more recently than this (they may be about to be referenced)')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['older_than_hours'])
+        deleted, _ = unreferenced_blobs().filter(created_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} payload blobs'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from orders.eta import rebuild_category_load
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the per-category backlog used for delivery ETAs from the orders that '
+        'are picked up or in progress. Capacities are kept. Run after changing the items of '
+        'orders already being processed, or services with queryset updates.'
+    )
+    
+    def handle(self, *args, **options):
+        totals = rebuild_category_load()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt the load of {len(totals)} busy categories '
+            f'({sum(quantity for _, quantity, _ in totals.values())} items in progress)'
+        ))
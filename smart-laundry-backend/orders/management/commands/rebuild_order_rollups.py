@@ -0,0 +1,108 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from orders.models import Order, OrderItem, ArchivedOrder, DailyRevenueRollup
+from orders.rollups import MEASURES, order_day
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild daily revenue rollups from live and archived orders, scanning '
+        'orders in primary key chunks. Orders written while it runs may be missed; re-run '
+        'for the affected days if order writes were not paused.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Number of orders aggregated per query')
+        parser.add_argument('--since', type=date.fromisoformat,
+                            help='First day to rebuild (YYYY-MM-DD); default: all history')
+        parser.add_argument('--until', type=date.fromisoformat,
+                            help='Last day to rebuild (YYYY-MM-DD); default: all history')
+    
+    def handle(self, *args, **options):
+        orders = Order.objects.order_by('pk')
+        archived = ArchivedOrder.objects.order_by('pk')
+        rollups = DailyRevenueRollup.objects.all()
+        if options['since']:
+            orders = orders.filter(created_at__date__gte=options['since'])
+            archived = archived.filter(created_at__date__gte=options['since'])
+            rollups = rollups.filter(day__gte=options['since'])
+        if options['until']:
+            orders = orders.filter(created_at__date__lte=options['until'])
+            archived = archived.filter(created_at__date__lte=options['until'])
+            rollups = rollups.filter(day__lte=options['until'])
+        
+        totals = defaultdict(lambda: [0, 0, 0, Decimal('0.00')])
+        last_pk = 0
+        scanned = 0
+        while True:
+            pks = list(orders.filter(pk__gt=last_pk).values_list('pk', flat=True)[:options['chunk_size']])
+            if not pks:
+                break
+            last_pk = pks[-1]
+            scanned += len(pks)
+            
+            order_rows = (
+                Order.objects.filter(pk__in=pks)
+                .order_by()
+                .values('status', 'payment_method', day=TruncDate('created_at'))
+                .annotate(orders=Count('id'), revenue=Sum('total_amount'))
+            )
+            for row in order_rows:
+                total = totals[(row['day'], row['status'], row['payment_method'], None)]
+                total[0] += row['orders']
+                total[3] += row['revenue']
+            
+            item_rows = (
+                OrderItem.objects.filter(order_id__in=pks)
+                .order_by()
+                .values(
+                    'service__category_id',
+                    status=F('order__status'),
+                    payment_method=F('order__payment_method'),
+                    day=TruncDate('order__created_at'),
+                )
+                .annotate(items=Count('id'), quantity=Sum('quantity'), revenue=Sum('total_price'))
+            )
+            for row in item_rows:
+                order_key = (row['day'], row['status'], row['payment_method'])
+                for category_id, revenue in ((row['service__category_id'], row['revenue']), (None, 0)):
+                    total = totals[order_key + (category_id,)]
+                    total[1] += row['items']
+                    total[2] += row['quantity']
+                    total[3] += revenue
+        
+        # Archived orders carry their item totals per category in ``lines``
+        archived_rows = archived.values_list('created_at', 'status', 'payment_method', 'total_amount', 'lines')
+        for created_at, status, payment_method, total_amount, lines in archived_rows.iterator(options['chunk_size']):
+            order_key = (order_day(created_at), status, payment_method)
+            total = totals[order_key + (None,)]
+            total[0] += 1
+            total[3] += total_amount
+            for category_id, items, quantity, revenue in lines:
+                for key, amount in ((order_key + (category_id,), Decimal(revenue)), (order_key + (None,), 0)):
+                    total = totals[key]
+                    total[1] += items
+                    total[2] += quantity
+                    total[3] += amount
+            scanned += 1
+        
+        with transaction.atomic():
+            deleted, _ = rollups.delete()
+            DailyRevenueRollup.objects.bulk_create([
+                DailyRevenueRollup(
+                    day=day, status=status, payment_method=payment_method, category_id=category_id,
+                    **dict(zip(MEASURES, total))
+                )
+                for (day, status, payment_method, category_id), total in totals.items()
+            ], batch_size=500)
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {len(totals)} rollup rows from {scanned} orders (replaced {deleted})'
+        ))
@@ -0,0 +1,61 @@
+import gzip
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from orders.settlements import SettlementFormatError, reconcile_settlement
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconcile payments against a gateway settlement CSV (plain or .gz): update '
+        'payment and order payment statuses and write rows that do not match to a report'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Settlement CSV file')
+        parser.add_argument('--report',
+                            help='Mismatch report to write (default: <path>.mismatches.csv)')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Rows looked up and updated per query')
+        parser.add_argument('--id-column', default='transaction_id',
+                            help='Column holding the gateway transaction id')
+        parser.add_argument('--amount-column', default='amount',
+                            help='Column holding the settled amount')
+        parser.add_argument('--status-column', default='status',
+                            help='Column holding the settlement status')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report only; change no payments or orders')
+    
+    def handle(self, *args, **options):
+        path = options['path']
+        report_path = options['report'] or f'{path.removesuffix(".gz")}.mismatches.csv'
+        columns = {
+            'transaction_id': options['id_column'],
+            'amount': options['amount_column'],
+            'status': options['status_column'],
+        }
+        opener = gzip.open if path.endswith('.gz') else open
+        
+        totals = Counter()
+        started = time.monotonic()
+        try:
+            with opener(path, 'rt', newline='', encoding='utf-8-sig') as lines, \
+                    open(report_path, 'w', newline='', encoding='utf-8') as report:
+                for outcomes in reconcile_settlement(
+                    lines, report, options['chunk_size'], columns, options['dry_run']
+                ):
+                    totals.update(outcomes)
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f'{sum(totals.values())} rows reconciled')
+        except (OSError, SettlementFormatError) as exc:
+            raise CommandError(str(exc))
+        
+        mismatches = sum(count for outcome, count in totals.items() if outcome not in ('updated', 'unchanged'))
+        details = ', '.join(f'{outcome}: {count}' for outcome, count in sorted(totals.items()))
+        self.stdout.write(self.style.SUCCESS(
+            f'Reconciled {sum(totals.values())} rows in {time.monotonic() - started:.1f}s '
+            f'({details or "empty file"}){" [dry run]" if options["dry_run"] else ""}'
+        ))
+        if mismatches:
+            self.stdout.write(self.style.WARNING(f'{mismatches} mismatches written to {report_path}'))
@@ -0,0 +1,61 @@
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from orders.local_gateway import LocalGateway
+from orders.models import Payment
+from orders.webhooks import GATEWAYS, SCHEDULED_KEY, process_pending_events
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay signed webhooks from a local stand-in gateway for payments that have a '
+        'transaction id, then apply them, reporting the cost of each stage. For tests '
+        'and benchmarks: it changes the statuses of the payments it picks.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--gateway', choices=list(GATEWAYS), default='razorpay')
+        parser.add_argument('--status', choices=['success', 'failed', 'refunded'], default='success',
+                            help='Payment status the events report')
+        parser.add_argument('--limit', type=int, default=1000, help='Number of payments to send events for')
+        parser.add_argument('--duplicates', type=float, default=0.1,
+                            help='Share of deliveries sent twice, as gateway retries would')
+        parser.add_argument('--url', help='Post to a running server instead of calling the view in-process')
+        parser.add_argument('--no-process', action='store_true',
+                            help='Only deliver; leave the events to the worker')
+    
+    def handle(self, *args, **options):
+        gateway = LocalGateway(options['gateway'])
+        if not gateway.gateway.secret:
+            raise CommandError(f'Set {gateway.gateway.secret_setting} to sign the replayed webhooks')
+        payments = list(
+            Payment.objects.exclude(transaction_id='').order_by('pk')[:options['limit']]
+        )
+        if not payments:
+            raise CommandError('No payments with a transaction id to send events for')
+        
+        deliveries = list(gateway.deliveries(payments, options['status'], options['duplicates'], seed=0))
+        if not options['url'] and not options['no_process']:
+            # Mark a run as queued so the deliveries queue none; this command applies them below
+            cache.set(SCHEDULED_KEY, 1, None)
+        started = time.perf_counter()
+        codes = Counter(gateway.replay(deliveries, url=options['url']))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Delivered {len(deliveries)} webhooks in {elapsed:.2f}s '
+            f'({elapsed / len(deliveries) * 1000:.2f} ms each); responses: '
+            + ', '.join(f'{code}: {count}' for code, count in sorted(codes.items()))
+        )
+        
+        if not options['no_process']:
+            started = time.perf_counter()
+            outcomes = process_pending_events()
+            elapsed = time.perf_counter() - started
+            count = sum(outcomes.values())
+            self.stdout.write(
+                f'Applied {count} events in {elapsed:.2f}s'
+                + (f' ({elapsed / count * 1000:.3f} ms each)' if count else '') + ': '
+                + ', '.join(f'{outcome}: {n}' for outcome, n in sorted(outcomes.items()))
+            )
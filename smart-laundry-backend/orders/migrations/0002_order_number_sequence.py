@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:41
+
+from django.db import migrations, models
+
+
+def seed_order_sequence(apps, schema_editor):
+    # Legacy ORD-XXXXXXXX numbers are 8 hex characters; sequence numbers start
+    # at nine digits so the two formats never collide.
+    OrderNumberSequence = apps.get_model('orders', 'OrderNumberSequence')
+    OrderNumberSequence.objects.get_or_create(name='order', defaults={'next_value': 100000000})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderNumberSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('next_value', models.PositiveBigIntegerField()),
+            ],
+            options={
+                'verbose_name': 'Order Number Sequence',
+                'verbose_name_plural': 'Order Number Sequences',
+                'db_table': 'order_number_sequences',
+            },
+        ),
+        migrations.RunPython(seed_order_sequence, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,127 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:18
+
+import hashlib
+import json
+import zlib
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import migrations, models
+import django.db.models.deletion
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+CHUNK_SIZE = 500
+SUMMARY_MAX_FIELDS = 20
+SUMMARY_MAX_LENGTH = 200
+
+
+# Frozen copies of the orders.blobs helpers this migration was written with
+
+def canonical_json(payload):
+    return json.dumps(payload, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':')).encode()
+
+
+def summarize(payload):
+    if not isinstance(payload, dict):
+        return {}
+    summary = {}
+    for key, value in payload.items():
+        if len(summary) >= SUMMARY_MAX_FIELDS:
+            break
+        if isinstance(value, str):
+            summary[key] = value[:SUMMARY_MAX_LENGTH]
+        elif value is None or isinstance(value, (bool, int, float)):
+            summary[key] = value
+    return summary
+
+
+def decompress(codec, data):
+    data = bytes(data)
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    if codec == 'zstd' and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise RuntimeError(f'Cannot read {codec} payload blobs; install the zstandard package')
+
+
+def offload_large_payloads(apps, schema_editor):
+    Payment = apps.get_model('orders', 'Payment')
+    PayloadBlob = apps.get_model('orders', 'PayloadBlob')
+    inline_limit = getattr(settings, 'PAYMENT_PAYLOAD_INLINE_LIMIT', 1024)
+    last_pk = 0
+    while True:
+        payments = list(
+            Payment.objects.filter(pk__gt=last_pk).order_by('pk').only('id', 'payment_gateway_response')[:CHUNK_SIZE]
+        )
+        if not payments:
+            break
+        last_pk = payments[-1].pk
+        blobs, changed = {}, []
+        for payment in payments:
+            raw = canonical_json(payment.payment_gateway_response)
+            if len(raw) <= inline_limit:
+                continue
+            digest = hashlib.sha256(raw).hexdigest()
+            blobs[digest] = PayloadBlob(digest=digest, codec='zlib', size=len(raw), data=zlib.compress(raw, 9))
+            payment.payment_gateway_response = dict(summarize(payment.payment_gateway_response), payload_digest=digest)
+            payment.gateway_payload_id = digest
+            changed.append(payment)
+        PayloadBlob.objects.bulk_create(blobs.values(), ignore_conflicts=True)
+        Payment.objects.bulk_update(changed, ['payment_gateway_response', 'gateway_payload'])
+
+
+def restore_payloads(apps, schema_editor):
+    """Put the full payloads back on the payments before the blobs are dropped"""
+    Payment = apps.get_model('orders', 'Payment')
+    PayloadBlob = apps.get_model('orders', 'PayloadBlob')
+    last_pk = 0
+    while True:
+        payments = list(
+            Payment.objects.filter(pk__gt=last_pk, gateway_payload__isnull=False).order_by('pk')
+            .only('id', 'gateway_payload')[:CHUNK_SIZE]
+        )
+        if not payments:
+            break
+        last_pk = payments[-1].pk
+        blobs = PayloadBlob.objects.in_bulk({payment.gateway_payload_id for payment in payments})
+        for payment in payments:
+            blob = blobs[payment.gateway_payload_id]
+            payment.payment_gateway_response = json.loads(decompress(blob.codec, blob.data))
+            payment.gateway_payload_id = None
+        Payment.objects.bulk_update(payments, ['payment_gateway_response', 'gateway_payload'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_webhook_events'),
+    ]
+    
+    operations = [
+        migrations.CreateModel(
+            name='PayloadBlob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('codec', models.CharField(choices=[('zlib', 'zlib'), ('zstd', 'Zstandard')], max_length=10)),
+                ('size', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Payload Blob',
+                'verbose_name_plural': 'Payload Blobs',
+                'db_table': 'payload_blobs',
+            },
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='gateway_payload',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='payments', to='orders.payloadblob'),
+        ),
+        migrations.RunPython(offload_large_payloads, restore_payloads),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_payload_blobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PickupSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('area', models.CharField(max_length=10)),
+                ('starts_at', models.DateTimeField()),
+                ('ends_at', models.DateTimeField()),
+                ('capacity', models.PositiveIntegerField()),
+                ('booked', models.PositiveIntegerField(default=0)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Pickup Slot',
+                'verbose_name_plural': 'Pickup Slots',
+                'db_table': 'pickup_slots',
+                'ordering': ['starts_at', 'area'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pickupslot',
+            constraint=models.UniqueConstraint(fields=('area', 'starts_at'), name='pickup_slot_area_start_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='pickupslot',
+            constraint=models.CheckConstraint(check=models.Q(('booked__lte', models.F('capacity'))), name='pickup_slot_within_capacity'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='pickup_slot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='orders', to='orders.pickupslot'),
+        ),
+    ]
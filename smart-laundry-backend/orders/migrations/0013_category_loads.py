@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:29
+
+import datetime
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0002_service_rating_aggregates'),
+        ('orders', '0012_dispatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryLoad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_count', models.IntegerField(default=0)),
+                ('quantity', models.IntegerField(default=0)),
+                ('work', models.DurationField(default=datetime.timedelta(0))),
+                ('capacity', models.PositiveIntegerField(default=50, help_text='Items this category works on at the same time', validators=[django.core.validators.MinValueValidator(1)])),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='load', to='services.servicecategory')),
+            ],
+            options={
+                'verbose_name': 'Category Load',
+                'verbose_name_plural': 'Category Loads',
+                'db_table': 'category_loads',
+                'ordering': ['category'],
+            },
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:31
+
+from django.conf import settings
+from django.db import migrations, models, transaction
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+CHUNK_SIZE = 2000
+
+
+def backfill_owners(apps, schema_editor):
+    """Copy orders.user_id onto items, tracking and payments, a primary key range per transaction"""
+    db_alias = schema_editor.connection.alias
+    Order = apps.get_model('orders', 'Order')
+    owner = Subquery(Order.objects.filter(pk=OuterRef('order_id')).values('user_id')[:1])
+    for model_name in ('OrderItem', 'OrderTracking', 'Payment'):
+        model = apps.get_model('orders', model_name)
+        last_pk = 0
+        while True:
+            bounds = list(
+                model.objects.using(db_alias).filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', flat=True)[:CHUNK_SIZE]
+            )
+            if not bounds:
+                break
+            with transaction.atomic(using=db_alias):
+                model.objects.using(db_alias).filter(
+                    pk__gte=bounds[0], pk__lte=bounds[-1], user__isnull=True
+                ).update(user_id=owner)
+            last_pk = bounds[-1]
+
+
+class Migration(migrations.Migration):
+
+    # Each backfill chunk commits on its own, so large tables are not
+    # rewritten in one long transaction
+    atomic = False
+    
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('orders', '0013_category_loads'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='user',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='ordertracking',
+            name='user',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='user',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_owners, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['user', '-created_at'], name='items_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordertracking',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='tracking_user_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='payments_user_created_id_idx'),
+        ),
+    ]
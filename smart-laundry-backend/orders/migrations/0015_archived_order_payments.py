@@ -0,0 +1,91 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:47
+
+from django.db import migrations, models
+from django.utils.dateparse import parse_datetime
+import django.db.models.deletion
+
+
+CHUNK_SIZE = 500
+
+
+def slim_item(item):
+    service = item.get('service') or {}
+    option = item.get('service_option') or {}
+    return {
+        'id': item.get('id'),
+        'service_id': service.get('id'),
+        'service_name': service.get('name'),
+        'service_option_id': option.get('id'),
+        'service_option_name': option.get('name'),
+        **{field: item.get(field) for field in (
+            'quantity', 'unit_price', 'total_price', 'item_description', 'special_instructions', 'created_at',
+        )},
+    }
+
+
+def restore_archived_payments(apps, schema_editor):
+    """Bring back payments of already archived orders from their documents, and slim the documents
+    
+    Archiving used to delete an order's payments, keeping them only in the
+    document, and to embed each item's full catalog entry.
+    """
+    ArchivedOrder = apps.get_model('orders', 'ArchivedOrder')
+    Payment = apps.get_model('orders', 'Payment')
+    PayloadBlob = apps.get_model('orders', 'PayloadBlob')
+    
+    last_pk = 0
+    while True:
+        chunk = list(ArchivedOrder.objects.filter(pk__gt=last_pk).order_by('pk')[:CHUNK_SIZE])
+        if not chunk:
+            break
+        last_pk = chunk[-1].pk
+        
+        for archived in chunk:
+            document = dict(archived.document)
+            payments = document.pop('payments', None) or []
+            document.pop('estimated_delivery', None)
+            document['items'] = [slim_item(item) for item in document.get('items', [])]
+            ArchivedOrder.objects.filter(pk=archived.pk).update(document=document)
+            
+            existing = set(Payment.objects.filter(pk__in=[p['id'] for p in payments]).values_list('pk', flat=True))
+            for data in payments:
+                if data['id'] in existing:
+                    continue
+                response = data.get('payment_gateway_response') or {}
+                digest = response.get('payload_digest') if isinstance(response, dict) else None
+                Payment.objects.create(
+                    id=data['id'],
+                    archived_order_id=archived.pk,
+                    user_id=archived.user_id,
+                    payment_method=data['payment_method'],
+                    amount=data['amount'],
+                    status=data['status'],
+                    transaction_id=data.get('transaction_id') or '',
+                    payment_gateway_response=response,
+                    gateway_payload_id=digest if digest and PayloadBlob.objects.filter(pk=digest).exists() else None,
+                )
+                # created_at is auto_now_add
+                created_at = parse_datetime(data['created_at']) if data.get('created_at') else None
+                if created_at:
+                    Payment.objects.filter(pk=data['id']).update(created_at=created_at)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0014_child_owner_columns'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='archived_order',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payments', to='orders.archivedorder'),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='order',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='orders.order'),
+        ),
+        migrations.RunPython(restore_archived_payments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:52
+
+from django.db import migrations, models
+
+
+def requeue_unknown_transactions(apps, schema_editor):
+    """Give events dropped for an unknown transaction another go"""
+    WebhookEvent = apps.get_model('orders', 'WebhookEvent')
+    WebhookEvent.objects.filter(processed_at__isnull=False, error__startswith='Unknown transaction').update(
+        processed_at=None
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0015_archived_order_payments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webhookevent',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='retry_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(requeue_unknown_transactions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 07:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0016_webhook_event_retries'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ordertracking',
+            index=models.Index(fields=['user', 'id'], name='tracking_user_id_idx'),
+        ),
+    ]
@@ -1,5 +1,9 @@
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models.signals import post_init
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
+from datetime import timedelta
 from decimal import Decimal
 
 
@@ -17,6 +21,20 @@ class Order(models.Model):
         ('cancelled', 'Cancelled'),
     ]
     
+    # Allowed status moves: forward along the fulfilment flow (stages may be
+    # skipped), cancellation until delivery, and back to ready after a failed
+    # delivery attempt. Delivered and cancelled are final.
+    STATUS_TRANSITIONS = {
+        'pending': {'confirmed', 'picked_up', 'in_progress', 'ready', 'out_for_delivery', 'delivered', 'cancelled'},
+        'confirmed': {'picked_up', 'in_progress', 'ready', 'out_for_delivery', 'delivered', 'cancelled'},
+        'picked_up': {'in_progress', 'ready', 'out_for_delivery', 'delivered', 'cancelled'},
+        'in_progress': {'ready', 'out_for_delivery', 'delivered', 'cancelled'},
+        'ready': {'out_for_delivery', 'delivered', 'cancelled'},
+        'out_for_delivery': {'ready', 'delivered', 'cancelled'},
+        'delivered': set(),
+        'cancelled': set(),
+    }
+    
     PAYMENT_STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('paid', 'Paid'),
@@ -39,13 +57,20 @@ class Order(models.Model):
     # Address information
     pickup_address = models.TextField()
     delivery_address = models.TextField()
+    delivery_pincode = models.CharField(max_length=10, blank=True)
     
     # Pricing
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
     tax_amount = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
     delivery_charge = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    small_order_fee = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
     
+    # Booked pickup window; pickup_date is set to its start (see orders.slots)
+    pickup_slot = models.ForeignKey(
+        'PickupSlot', on_delete=models.PROTECT, null=True, blank=True, related_name='orders'
+    )
+    
     # Timestamps
     pickup_date = models.DateTimeField(null=True, blank=True)
     delivery_date = models.DateTimeField(null=True, blank=True)
@@ -61,24 +86,74 @@ class Order(models.Model):
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='orders_created_id_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='orders_user_created_id_idx'),
+            models.Index(fields=['user', 'status'], name='orders_user_status_idx'),
+            # Orders waiting for dispatch (orders.dispatch)
+            models.Index(fields=['delivery_pincode'], condition=models.Q(status='ready'), name='orders_ready_pincode_idx'),
+        ]
     
     def __str__(self):
         return f"Order {self.order_number} - {self.user.email}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_user_id = instance.__dict__.get('user_id')
+        return instance
+    
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None:
+            # The reloaded row is what the next save is compared against, so
+            # the post_init receivers (slots, eta, rollups) remember it afresh
+            self._loaded_user_id = self.user_id
+            post_init.send(sender=type(self), instance=self)
+    
     def save(self, *args, **kwargs):
         if not self.order_number:
             self.order_number = self.generate_order_number()
-        super().save(*args, **kwargs)
+        # Reassigning an order moves the ``user`` copies of its items,
+        # tracking and payments along with it (see set_owner)
+        update_fields = kwargs.get('update_fields')
+        loaded_user_id = getattr(self, '_loaded_user_id', None)
+        reassigned = (
+            loaded_user_id is not None and loaded_user_id != self.user_id
+            and (update_fields is None or {'user', 'user_id'} & set(update_fields))
+        )
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            if reassigned:
+                for model in (OrderItem, OrderTracking, Payment):
+                    model.objects.filter(order=self).update(user_id=self.user_id)
+        self._loaded_user_id = self.user_id
+    
+    def can_transition_to(self, new_status):
+        return new_status in self.STATUS_TRANSITIONS.get(self.status, set())
     
     def generate_order_number(self):
-        import uuid
-        return f"ORD-{uuid.uuid4().hex[:8].upper()}"
+        from .numbering import next_order_number
+        return next_order_number()
+
+
+def set_owner(child):
+    """Fill the ``user`` copy of an order's item, tracking entry or payment from its order
+    
+    Rows written with ``bulk_create`` must set ``user_id`` themselves.
+    """
+    if child.user_id is None and child.order_id is not None:
+        child.user_id = child.order.user_id
 
 
 class OrderItem(models.Model):
     """Individual items in an order"""
     
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+    # Copy of order.user_id, so per-user listings need no join to orders
+    user = models.ForeignKey(
+        'accounts.User', on_delete=models.CASCADE, null=True, editable=False, related_name='+', db_index=False
+    )
     service = models.ForeignKey('services.Service', on_delete=models.CASCADE)
     service_option = models.ForeignKey('services.ServiceOption', on_delete=models.CASCADE, null=True, blank=True)
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
@@ -97,12 +172,16 @@ class OrderItem(models.Model):
         verbose_name = 'Order Item'
         verbose_name_plural = 'Order Items'
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='items_user_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.order.order_number} - {self.service.name} x{self.quantity}"
     
     def save(self, *args, **kwargs):
         self.total_price = self.unit_price * self.quantity
+        set_owner(self)
         super().save(*args, **kwargs)
 
 
@@ -122,6 +201,9 @@ class Cart(models.Model):
         verbose_name_plural = 'Cart Items'
         ordering = ['-created_at']
         unique_together = ['user', 'service', 'service_option']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='cart_user_created_id_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.email} - {self.service.name} x{self.quantity}"
@@ -137,6 +219,10 @@ class OrderTracking(models.Model):
     """Order tracking history"""
     
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='tracking')
+    # Copy of order.user_id, so per-user listings need no join to orders
+    user = models.ForeignKey(
+        'accounts.User', on_delete=models.CASCADE, null=True, editable=False, related_name='+', db_index=False
+    )
     status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
     description = models.TextField()
     location = models.CharField(max_length=255, blank=True)
@@ -147,9 +233,20 @@ class OrderTracking(models.Model):
         verbose_name = 'Order Tracking'
         verbose_name_plural = 'Order Tracking'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='tracking_created_id_idx'),
+            models.Index(fields=['order', '-created_at'], name='tracking_order_created_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='tracking_user_created_id_idx'),
+            # Event streams read a user's entries after the last event id
+            models.Index(fields=['user', 'id'], name='tracking_user_id_idx'),
+        ]
     
     def __str__(self):
         return f"{self.order.order_number} - {self.status}"
+    
+    def save(self, *args, **kwargs):
+        set_owner(self)
+        super().save(*args, **kwargs)
 
 
 class Payment(models.Model):
@@ -170,12 +267,24 @@ class Payment(models.Model):
         ('refunded', 'Refunded'),
     ]
     
-    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='payments')
+    # Empty once the order is archived; the payment then points at archived_order
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True, related_name='payments')
+    archived_order = models.ForeignKey(
+        'ArchivedOrder', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='payments'
+    )
+    # Copy of order.user_id, so per-user listings need no join to orders
+    user = models.ForeignKey(
+        'accounts.User', on_delete=models.CASCADE, null=True, editable=False, related_name='+', db_index=False
+    )
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     transaction_id = models.CharField(max_length=255, blank=True)
+    # A summary when the full payload is kept in gateway_payload (see orders.blobs)
     payment_gateway_response = models.JSONField(default=dict, blank=True)
+    gateway_payload = models.ForeignKey(
+        'PayloadBlob', on_delete=models.PROTECT, null=True, blank=True, related_name='payments'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -184,6 +293,292 @@ class Payment(models.Model):
         verbose_name = 'Payment'
         verbose_name_plural = 'Payments'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='payments_created_id_idx'),
+            models.Index(fields=['transaction_id'], name='payments_transaction_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='payments_user_created_id_idx'),
+        ]
+    
+    def __str__(self):
+        order = self.order or self.archived_order
+        return f"Payment {self.transaction_id} - {order.order_number if order else 'no order'}"
+    
+    def save(self, *args, **kwargs):
+        from .blobs import offload_payload
+        offload_payload(self)
+        set_owner(self)
+        super().save(*args, **kwargs)
+
+
+class PayloadBlob(models.Model):
+    """A compressed gateway payload, stored once per content hash (see orders.blobs)"""
+    
+    CODEC_CHOICES = [
+        ('zlib', 'zlib'),
+        ('zstd', 'Zstandard'),
+    ]
+    
+    digest = models.CharField(max_length=64, primary_key=True)  # SHA-256 of the canonical JSON
+    codec = models.CharField(max_length=10, choices=CODEC_CHOICES)
+    size = models.PositiveIntegerField()  # uncompressed bytes
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'payload_blobs'
+        verbose_name = 'Payload Blob'
+        verbose_name_plural = 'Payload Blobs'
+    
+    def __str__(self):
+        return f"{self.digest[:12]} ({self.codec}, {self.size} bytes)"
+
+
+class OrderNumberSequence(models.Model):
+    """High-water mark for order number blocks (see orders.numbering)"""
+    
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.PositiveBigIntegerField()
+    
+    class Meta:
+        db_table = 'order_number_sequences'
+        verbose_name = 'Order Number Sequence'
+        verbose_name_plural = 'Order Number Sequences'
+    
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+
+class DailyRevenueRollup(models.Model):
+    """Order volume and revenue per day, status, payment method and category (see orders.rollups)
+    
+    Rows without a category hold order totals: ``revenue`` is the sum of
+    ``total_amount`` (tax and delivery included). Category rows hold the
+    order items of that category: ``revenue`` is the sum of item prices and
+    ``order_count`` stays 0.
+    """
+    
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    payment_method = models.CharField(max_length=20, choices=Order.PAYMENT_METHOD_CHOICES)
+    category = models.ForeignKey('services.ServiceCategory', on_delete=models.CASCADE, null=True, blank=True)
+    
+    order_count = models.IntegerField(default=0)
+    item_count = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    
+    class Meta:
+        db_table = 'daily_revenue_rollups'
+        verbose_name = 'Daily Revenue Rollup'
+        verbose_name_plural = 'Daily Revenue Rollups'
+        ordering = ['-day', 'status', 'payment_method']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'status', 'payment_method'],
+                condition=models.Q(category__isnull=True),
+                name='rollup_order_totals_uniq',
+            ),
+            models.UniqueConstraint(
+                fields=['day', 'status', 'payment_method', 'category'],
+                condition=models.Q(category__isnull=False),
+                name='rollup_category_uniq',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.day} {self.status}/{self.payment_method} {self.category_id or 'all'}: {self.revenue}"
+
+
+class ArchivedOrder(models.Model):
+    """A closed order moved out of the live tables (see orders.archive)
+    
+    ``document`` is the order as ``ArchivedOrderSerializer`` rendered it when
+    it was archived: its fields, items (services by id and name) and
+    tracking. Its payments stay in the payments table, pointing here, so
+    they can still be found by transaction id. ``lines`` keeps its item
+    totals per category so revenue rollups can be rebuilt.
+    """
+    
+    id = models.BigIntegerField(primary_key=True)  # the original order id
+    order_number = models.CharField(max_length=20, unique=True)
+    user = models.ForeignKey('accounts.User', on_delete=models.CASCADE, related_name='archived_orders')
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    payment_method = models.CharField(max_length=20, choices=Order.PAYMENT_METHOD_CHOICES)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField()
+    closed_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    # [[category_id, item_count, quantity, revenue], ...]
+    lines = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    document = models.JSONField(encoder=DjangoJSONEncoder)
+    
+    class Meta:
+        db_table = 'archived_orders'
+        verbose_name = 'Archived Order'
+        verbose_name_plural = 'Archived Orders'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='archived_user_created_idx'),
+        ]
     
     def __str__(self):
-        return f"Payment {self.transaction_id} - {self.order.order_number}"
\ No newline at end of file
+        return f"{self.order_number} (archived)"
+
+
+class PricingRuleSet(models.Model):
+    """Tax slabs, delivery tiers and minimum order fee (see orders.pricing)
+    
+    The newest active rule set prices carts and orders.
+    """
+    
+    name = models.CharField(max_length=100)
+    rules = models.JSONField(default=dict)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'pricing_rule_sets'
+        verbose_name = 'Pricing Rule Set'
+        verbose_name_plural = 'Pricing Rule Sets'
+        ordering = ['-updated_at']
+    
+    def __str__(self):
+        return self.name
+    
+    def clean(self):
+        from .pricing import PricingEngine
+        try:
+            PricingEngine(self.rules)
+        except ValidationError as exc:
+            raise ValidationError({'rules': exc.messages})
+
+
+class WebhookEvent(models.Model):
+    """Append-only inbox of verified payment gateway webhooks (see orders.webhooks)
+    
+    Each gateway event is stored once; redeliveries are dropped. Events are
+    applied to payments by the ``process_webhook_events`` task, which sets
+    ``processed_at`` (and ``error`` when the event could not be applied).
+    An event waiting for its payment to appear stays pending until
+    ``retry_at``, counting its ``attempts``.
+    """
+    
+    GATEWAY_CHOICES = [
+        ('razorpay', 'Razorpay'),
+        ('stripe', 'Stripe'),
+    ]
+    
+    gateway = models.CharField(max_length=20, choices=GATEWAY_CHOICES)
+    event_id = models.CharField(max_length=255)
+    event_type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    retry_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'webhook_events'
+        verbose_name = 'Webhook Event'
+        verbose_name_plural = 'Webhook Events'
+        ordering = ['-received_at']
+        constraints = [
+            models.UniqueConstraint(fields=['gateway', 'event_id'], name='webhook_event_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(processed_at__isnull=True), name='webhook_pending_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.gateway} {self.event_type} {self.event_id}"
+
+
+class PickupSlot(models.Model):
+    """A pickup window in an area with a fixed number of pickups (see orders.slots)
+    
+    ``area`` is a pincode or pincode prefix; the slot serves every pincode
+    starting with it. ``booked`` only changes through conditional UPDATEs, so
+    it never exceeds ``capacity``.
+    """
+    
+    area = models.CharField(max_length=10)
+    starts_at = models.DateTimeField()
+    ends_at = models.DateTimeField()
+    capacity = models.PositiveIntegerField()
+    booked = models.PositiveIntegerField(default=0)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'pickup_slots'
+        verbose_name = 'Pickup Slot'
+        verbose_name_plural = 'Pickup Slots'
+        ordering = ['starts_at', 'area']
+        constraints = [
+            # Also the index availability lookups use
+            models.UniqueConstraint(fields=['area', 'starts_at'], name='pickup_slot_area_start_uniq'),
+            models.CheckConstraint(check=models.Q(booked__lte=models.F('capacity')), name='pickup_slot_within_capacity'),
+        ]
+    
+    def __str__(self):
+        return f"{self.area} {self.starts_at:%Y-%m-%d %H:%M}-{self.ends_at:%H:%M}"
+    
+    @property
+    def remaining(self):
+        return self.capacity - self.booked
+    
+    def clean(self):
+        if self.starts_at and self.ends_at and self.ends_at <= self.starts_at:
+            raise ValidationError({'ends_at': 'A slot must end after it starts'})
+
+
+class PincodeLocation(models.Model):
+    """Local geocode table: the centre of each pincode, used to plan delivery routes"""
+    
+    pincode = models.CharField(max_length=10, unique=True)
+    name = models.CharField(max_length=100, blank=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    
+    class Meta:
+        db_table = 'pincode_locations'
+        verbose_name = 'Pincode Location'
+        verbose_name_plural = 'Pincode Locations'
+        ordering = ['pincode']
+    
+    def __str__(self):
+        return f"{self.pincode} {self.name}".strip()
+
+
+class CategoryLoad(models.Model):
+    """Work queued per service category, kept in step with orders (see orders.eta)
+    
+    Counts the items of orders that are picked up or in progress; ``work``
+    is their quantity times their service's ``estimated_time``. ``capacity``
+    is how many items the category works on at once.
+    """
+    
+    category = models.OneToOneField('services.ServiceCategory', on_delete=models.CASCADE, related_name='load')
+    order_count = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    work = models.DurationField(default=timedelta(0))
+    capacity = models.PositiveIntegerField(default=50, validators=[MinValueValidator(1)],
+                                           help_text="Items this category works on at the same time")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'category_loads'
+        verbose_name = 'Category Load'
+        verbose_name_plural = 'Category Loads'
+        ordering = ['category']
+    
+    def __str__(self):
+        return f"{self.category_id}: {self.quantity} items queued"
+    
+    @property
+    def wait(self):
+        """Time until the queued work is through, at full capacity"""
+        return self.work / self.capacity
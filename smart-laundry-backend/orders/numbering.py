@@ -0,0 +1,73 @@
+"""
+Order number allocation.
+
+Numbers come from the ``order`` row of ``OrderNumberSequence`` in HiLo
+fashion: each worker process reserves a block of ``ORDER_NUMBER_BLOCK_SIZE``
+values with one atomic UPDATE and then hands them out from memory, so placing
+an order normally costs no extra round-trip. Numbers are unique and increase
+within a worker; blocks reserved by different workers interleave.
+
+Legacy ``ORD-XXXXXXXX`` numbers (8 hex characters) stay valid. New numbers
+start at ``ORD-100000000`` and always have at least nine digits, so the two
+formats can never collide.
+"""
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import OrderNumberSequence
+
+
+ORDER_SEQUENCE = 'order'
+ORDER_NUMBER_PREFIX = 'ORD-'
+ORDER_NUMBER_START = 100_000_000
+
+
+def reserve_block(size, name=ORDER_SEQUENCE):
+    """Reserve ``size`` consecutive values and return the first one"""
+    with transaction.atomic():
+        updated = OrderNumberSequence.objects.filter(name=name).update(next_value=F('next_value') + size)
+        if not updated:
+            OrderNumberSequence.objects.create(name=name, next_value=ORDER_NUMBER_START + size)
+            return ORDER_NUMBER_START
+        end = OrderNumberSequence.objects.filter(name=name).values_list('next_value', flat=True).get()
+    return end - size
+
+
+class BlockAllocator:
+    """Hands out values from blocks reserved ahead of time"""
+    
+    def __init__(self, name=ORDER_SEQUENCE, block_size=None):
+        self.name = name
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+    
+    def get_block_size(self):
+        return self.block_size or getattr(settings, 'ORDER_NUMBER_BLOCK_SIZE', 50)
+    
+    def next_value(self):
+        if connection.in_atomic_block:
+            # A block reserved here would be rolled back along with the
+            # caller's transaction while still being handed out from memory,
+            # so reserve just this value inside that transaction instead.
+            return reserve_block(1, self.name)
+        
+        with self._lock:
+            if self._next >= self._end:
+                size = self.get_block_size()
+                self._next = reserve_block(size, self.name)
+                self._end = self._next + size
+            value = self._next
+            self._next += 1
+            return value
+
+
+order_number_allocator = BlockAllocator()
+
+
+def next_order_number():
+    return f'{ORDER_NUMBER_PREFIX}{order_number_allocator.next_value()}'
@@ -0,0 +1,42 @@
+"""
+Payment status bookkeeping shared by settlement reconciliation and gateway
+webhooks.
+"""
+from collections import defaultdict
+
+from django.utils import timezone
+
+from .models import Order
+
+
+# Payment status -> Order payment status
+ORDER_PAYMENT_STATUSES = {
+    'success': 'paid',
+    'failed': 'failed',
+    'refunded': 'refunded',
+}
+
+
+def group_by_value(mapping):
+    """``{key: value}`` -> ``{value: [keys]}``, for one UPDATE per value"""
+    grouped = defaultdict(list)
+    for key, value in mapping.items():
+        grouped[value].append(key)
+    return grouped
+
+
+def sync_order_payment_statuses(payment_statuses):
+    """Set ``Order.payment_status`` from ``{order_id: payment status}``; call inside a transaction
+    
+    Payments of archived orders have no ``order_id`` (None) and are skipped.
+    """
+    order_statuses = {
+        order_id: ORDER_PAYMENT_STATUSES[status]
+        for order_id, status in payment_statuses.items()
+        if order_id is not None and status in ORDER_PAYMENT_STATUSES
+    }
+    now = timezone.now()
+    for payment_status, ids in group_by_value(order_statuses).items():
+        Order.objects.filter(pk__in=ids).exclude(payment_status=payment_status).update(
+            payment_status=payment_status, updated_at=now
+        )
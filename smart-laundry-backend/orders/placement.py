@@ -0,0 +1,153 @@
+"""
+Order placement.
+
+All prices referenced by an order are loaded with one ``in_bulk`` per model,
+the items are written with a single ``bulk_create`` and the whole order,
+its items and the initial tracking row commit in one transaction along with
+their revenue rollup deltas. ``checkout_cart`` does the same for a cart and
+deletes it in that transaction. A requested pickup slot is booked in that
+transaction too, so a failed order gives its seat back. Orders placed
+without a delivery date get the current ETA (see orders.eta).
+"""
+from django.db import transaction
+from rest_framework import serializers
+
+from services.models import Service, ServiceOption
+from .models import Order, OrderItem, OrderTracking, Cart
+from .eta import add_items as add_load_items, estimate_delivery
+from .numbering import next_order_number
+from .pricing import get_pricing_engine
+from .rollups import add_items
+from .slots import book_slot
+
+
+def price_items(items_data):
+    """Resolve unit prices for ``items_data`` in two queries.
+    
+    Returns a list of ``(item_data, service, service_option, unit_price)``
+    and raises ``ValidationError`` for unknown or mismatched references.
+    """
+    service_ids = {item['service_id'] for item in items_data}
+    option_ids = {item['service_option_id'] for item in items_data if item.get('service_option_id')}
+    
+    services = Service.objects.in_bulk(service_ids)
+    options = ServiceOption.objects.in_bulk(option_ids) if option_ids else {}
+    
+    priced = []
+    errors = []
+    for position, item in enumerate(items_data):
+        service = services.get(item['service_id'])
+        option = options.get(item.get('service_option_id')) if item.get('service_option_id') else None
+        
+        if service is None or not service.is_active:
+            errors.append(f"Item {position}: service {item['service_id']} is not available")
+        elif item.get('service_option_id') and (option is None or not option.is_active):
+            errors.append(f"Item {position}: service option {item['service_option_id']} is not available")
+        elif option is not None and option.service_id != service.id:
+            errors.append(f"Item {position}: service option {option.id} does not belong to service {service.id}")
+        else:
+            unit_price = option.price if option is not None else service.price
+            priced.append((item, service, option, unit_price))
+    
+    if errors:
+        raise serializers.ValidationError({'items_data': errors})
+    return priced
+
+
+def place_order(user, order_data, items_data):
+    """Create an order with its items and initial tracking entry atomically"""
+    if not items_data:
+        raise serializers.ValidationError({'items_data': ['An order needs at least one item']})
+    
+    priced = price_items(items_data)
+    
+    # Allocated before the transaction opens so it comes from the cached block
+    order_number = next_order_number()
+    
+    with transaction.atomic():
+        return create_order(user, order_data, priced, order_number)
+
+
+def checkout_cart(user, order_data):
+    """Turn ``user``'s cart into an order and empty the cart in one transaction"""
+    order_number = next_order_number()
+    
+    with transaction.atomic():
+        cart = list(
+            Cart.objects.select_for_update().filter(user=user)
+            .values('id', 'service_id', 'service_option_id', 'quantity')
+        )
+        if not cart:
+            raise serializers.ValidationError({'cart': ['Your cart is empty']})
+        
+        order = create_order(user, order_data, price_items(cart), order_number)
+        Cart.objects.filter(id__in=[item['id'] for item in cart]).delete()
+    
+    return order
+
+
+# Order fields create_order sets itself, whatever ``order_data`` holds
+COMPUTED_FIELDS = (
+    'order_number', 'payment_status', 'subtotal', 'tax_amount', 'delivery_charge', 'small_order_fee', 'total_amount',
+)
+
+
+def create_order(user, order_data, priced, order_number):
+    """Write an order for items priced by ``price_items``; call inside a transaction"""
+    order_data = {key: value for key, value in order_data.items() if key not in COMPUTED_FIELDS}
+    order_data['delivery_pincode'] = order_data.get('delivery_pincode') or user.pincode or ''
+    
+    # Tax, delivery charge and small order fee
+    quote = get_pricing_engine().quote(
+        ((service.category_id, unit_price, item['quantity']) for item, service, _, unit_price in priced),
+        pincode=order_data['delivery_pincode'],
+    )
+    
+    slot = order_data.get('pickup_slot')
+    if slot is not None:
+        book_slot(slot, order_data['delivery_pincode'])
+        order_data['pickup_date'] = slot.starts_at
+    
+    if not order_data.get('delivery_date'):
+        order_data['delivery_date'] = estimate_delivery(
+            [(service.category_id, service.estimated_time) for _, service, _, _ in priced],
+            order_data.get('pickup_date'),
+        )
+    
+    order = Order.objects.create(
+        user=user,
+        order_number=order_number,
+        subtotal=quote.subtotal,
+        tax_amount=quote.tax_amount,
+        delivery_charge=quote.delivery_charge,
+        small_order_fee=quote.small_order_fee,
+        total_amount=quote.total_amount,
+        **order_data
+    )
+    
+    items = OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            user=user,
+            service=service,
+            service_option=option,
+            quantity=item['quantity'],
+            unit_price=unit_price,
+            total_price=unit_price * item['quantity'],
+            item_description=item.get('item_description', ''),
+            special_instructions=item.get('special_instructions', ''),
+        )
+        for item, service, option, unit_price in priced
+    ])
+    # bulk_create sends no post_save signals
+    add_items(order, items)
+    add_load_items(order, items)
+    
+    # Create initial tracking entry
+    OrderTracking.objects.create(
+        order=order,
+        status='pending',
+        description='Order placed successfully'
+    )
+    
+    return order
@@ -0,0 +1,247 @@
+"""
+Pricing engine for carts, orders and quotes.
+
+Tax, delivery and small-order fees come from a declarative rule set: the
+newest active ``PricingRuleSet``, or ``PRICING_RULES`` from settings when
+there is none. A rule set is compiled once into a ``PricingEngine`` and kept
+in memory per rule-set version, so pricing a cart or an order reads no rules
+from the database and costs O(items).
+
+The rule-set version is a fingerprint of the ``pricing_rule_sets`` table
+(row count, latest id and modification time) read from the database, as
+for the catalog version. Each worker keeps it in the cache for
+``PRICING_VERSION_CHECK_SECONDS``, so a rule set edited through any worker
+prices every worker's carts within that time; edits made through this
+process drop the version at once.
+
+Rule set format (amounts and rates as strings)::
+
+    {
+        "tax": {
+            "default_rate": "0.18",
+            # first matching slab wins, per item
+            "slabs": [
+                {"categories": [3, 4], "rate": "0.05"},
+                {"max_unit_price": "100.00", "rate": "0.12"}
+            ]
+        },
+        "delivery": {
+            "default_charge": "50.00",
+            # first matching tier wins; pincodes match by prefix
+            "tiers": [
+                {"min_subtotal": "999.00", "charge": "0.00"},
+                {"pincodes": ["5600"], "charge": "30.00"}
+            ]
+        },
+        "minimum_order": {"subtotal": "200.00", "fee": "25.00"}
+    }
+
+Price bounds are inclusive for ``min_*`` and exclusive for ``max_*``.
+"""
+import threading
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Max
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import PricingRuleSet
+
+
+DEFAULT_RULES = {
+    'tax': {'default_rate': '0.18'},  # 18% GST
+    'delivery': {'default_charge': '50.00'},  # Fixed delivery charge
+}
+
+PRICING_VERSION_KEY = 'orders:pricing:version'
+
+CENT = Decimal('0.01')
+
+Quote = namedtuple('Quote', 'subtotal tax_amount delivery_charge small_order_fee total_amount')
+
+
+def _amount(value, path):
+    try:
+        amount = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        raise ValidationError(f'{path}: {value!r} is not a number')
+    if amount < 0:
+        raise ValidationError(f'{path}: must not be negative')
+    return amount
+
+
+def _money(value, path):
+    return _amount(value, path).quantize(CENT, ROUND_HALF_UP)
+
+
+def _optional_amount(rule, name, path):
+    return _amount(rule[name], f'{path}.{name}') if rule.get(name) is not None else None
+
+
+def _in_range(value, low, high):
+    return (low is None or value >= low) and (high is None or value < high)
+
+
+class PricingEngine:
+    """A rule set compiled for evaluation; raises ``ValidationError`` for invalid rules"""
+    
+    def __init__(self, rules):
+        try:
+            self._compile(rules)
+        except (AttributeError, TypeError, ValueError) as exc:
+            raise ValidationError(f'Malformed pricing rules: {exc}')
+    
+    def _compile(self, rules):
+        if not isinstance(rules, dict):
+            raise ValidationError('Pricing rules must be an object')
+        tax = rules.get('tax') or {}
+        delivery = rules.get('delivery') or {}
+        minimum = rules.get('minimum_order') or {}
+        
+        self.default_tax_rate = _amount(tax.get('default_rate', '0'), 'tax.default_rate')
+        # (categories or None, min_unit_price, max_unit_price, rate)
+        slabs = []
+        for position, slab in enumerate(tax.get('slabs') or []):
+            path = f'tax.slabs[{position}]'
+            categories = slab.get('categories')
+            slabs.append((
+                frozenset(int(category) for category in categories) if categories else None,
+                _optional_amount(slab, 'min_unit_price', path),
+                _optional_amount(slab, 'max_unit_price', path),
+                _amount(slab.get('rate'), f'{path}.rate'),
+            ))
+        # Slabs that can apply to items of a category, in rule order; items of
+        # other categories only ever look at the category-independent slabs
+        self.generic_slabs = [slab[1:] for slab in slabs if slab[0] is None]
+        self.category_slabs = {}
+        for category in set().union(*(slab[0] for slab in slabs if slab[0])):
+            self.category_slabs[category] = [slab[1:] for slab in slabs if slab[0] is None or category in slab[0]]
+        
+        self.default_delivery_charge = _money(delivery.get('default_charge', '0'), 'delivery.default_charge')
+        # (pincode prefixes or None, min_subtotal, max_subtotal, charge)
+        self.delivery_tiers = []
+        for position, tier in enumerate(delivery.get('tiers') or []):
+            path = f'delivery.tiers[{position}]'
+            pincodes = tier.get('pincodes')
+            self.delivery_tiers.append((
+                tuple(str(pincode) for pincode in pincodes) if pincodes else None,
+                _optional_amount(tier, 'min_subtotal', path),
+                _optional_amount(tier, 'max_subtotal', path),
+                _money(tier.get('charge'), f'{path}.charge'),
+            ))
+        
+        self.minimum_subtotal = _optional_amount(minimum, 'subtotal', 'minimum_order')
+        self.small_order_fee = _money(minimum.get('fee', '0'), 'minimum_order.fee')
+    
+    def tax_rate(self, category_id, unit_price):
+        for low, high, rate in self.category_slabs.get(category_id, self.generic_slabs):
+            if _in_range(unit_price, low, high):
+                return rate
+        return self.default_tax_rate
+    
+    def delivery_charge(self, subtotal, pincode):
+        for prefixes, low, high, charge in self.delivery_tiers:
+            if prefixes is not None and not (pincode and pincode.startswith(prefixes)):
+                continue
+            if _in_range(subtotal, low, high):
+                return charge
+        return self.default_delivery_charge
+    
+    def quote(self, lines, pincode=''):
+        """Price ``lines`` of ``(category_id, unit_price, quantity)`` delivered to ``pincode``"""
+        return self._quote(lines, pincode, self.tax_rate)
+    
+    def quote_many(self, baskets):
+        """Price ``(lines, pincode)`` pairs, looking up each category and price's tax rate once"""
+        rates = {}
+        
+        def tax_rate(category_id, unit_price):
+            key = (category_id, unit_price)
+            rate = rates.get(key)
+            if rate is None:
+                rate = rates[key] = self.tax_rate(category_id, unit_price)
+            return rate
+        
+        return [self._quote(lines, pincode, tax_rate) for lines, pincode in baskets]
+    
+    def _quote(self, lines, pincode, tax_rate):
+        subtotal = Decimal('0.00')
+        tax_amount = Decimal('0.00')
+        for category_id, unit_price, quantity in lines:
+            line_total = unit_price * quantity
+            subtotal += line_total
+            tax_amount += line_total * tax_rate(category_id, unit_price)
+        
+        subtotal = subtotal.quantize(CENT, ROUND_HALF_UP)
+        tax_amount = tax_amount.quantize(CENT, ROUND_HALF_UP)
+        delivery_charge = self.delivery_charge(subtotal, (pincode or '').strip())
+        small_order_fee = (
+            self.small_order_fee
+            if self.minimum_subtotal is not None and subtotal < self.minimum_subtotal
+            else Decimal('0.00')
+        )
+        return Quote(
+            subtotal, tax_amount, delivery_charge, small_order_fee,
+            subtotal + tax_amount + delivery_charge + small_order_fee,
+        )
+
+
+def version_check_seconds():
+    return getattr(settings, 'PRICING_VERSION_CHECK_SECONDS', 5)
+
+
+def compute_pricing_version():
+    """Fingerprint of the rule sets as they are in the database"""
+    state = PricingRuleSet.objects.order_by().aggregate(
+        count=Count('pk'), last_id=Max('pk'), latest=Max('updated_at')
+    )
+    latest = state['latest'].isoformat() if state['latest'] else None
+    return f"{state['count']}:{state['last_id']}:{latest}"
+
+
+def get_pricing_version():
+    version = cache.get(PRICING_VERSION_KEY)
+    if version is None:
+        version = compute_pricing_version()
+        cache.set(PRICING_VERSION_KEY, version, timeout=version_check_seconds())
+    return version
+
+
+def bump_pricing_version():
+    """Make the next quote re-read the rule-set version"""
+    cache.delete(PRICING_VERSION_KEY)
+
+
+def load_rules():
+    rule_set = PricingRuleSet.objects.filter(is_active=True).order_by('-updated_at', '-id').first()
+    if rule_set is not None:
+        return rule_set.rules
+    return getattr(settings, 'PRICING_RULES', DEFAULT_RULES)
+
+
+_compiled = (None, None)
+_compile_lock = threading.Lock()
+
+
+def get_pricing_engine():
+    """The engine for the current rule-set version, compiled on first use"""
+    global _compiled
+    version = get_pricing_version()
+    compiled_version, engine = _compiled
+    if compiled_version != version:
+        with _compile_lock:
+            compiled_version, engine = _compiled
+            if compiled_version != version:
+                engine = PricingEngine(load_rules())
+                _compiled = (version, engine)
+    return engine
+
+
+@receiver([post_save, post_delete], sender=PricingRuleSet)
+def invalidate_pricing(sender, **kwargs):
+    transaction.on_commit(bump_pricing_version)
@@ -0,0 +1,79 @@
+"""
+Batch quotes: price many prospective baskets in one call.
+
+Every service and option referenced by the batch is priced by a single
+query, and all baskets go through the current ``PricingEngine`` together
+(``quote_many``), so a batch costs one round trip plus O(items) arithmetic.
+Used by the ``quote/batch`` endpoint and the ``benchmark_quotes`` command.
+"""
+from django.conf import settings
+from django.db.models import IntegerField, Value
+
+from services.models import Service
+from .pricing import get_pricing_engine
+
+
+def max_batch_size():
+    return getattr(settings, 'QUOTE_BATCH_MAX_BASKETS', 500)
+
+
+def load_price_table(items):
+    """``(service_id, service_option_id)`` -> ``(category_id, unit_price)`` for available ``items``
+    
+    Services and options come back from one UNION query; an option is only
+    listed under its own service, and only while both are active.
+    """
+    service_ids = {item['service_id'] for item in items}
+    option_ids = {item['service_option_id'] for item in items if item.get('service_option_id')}
+    
+    services = Service.objects.filter(is_active=True).order_by()
+    # Expressions are selected after fields, so the option id goes last
+    rows = services.filter(pk__in=service_ids).values_list(
+        'id', 'category_id', 'price', Value(None, output_field=IntegerField()),
+    )
+    if option_ids:
+        rows = rows.union(
+            services.filter(options__pk__in=option_ids, options__is_active=True).values_list(
+                'id', 'category_id', 'options__price', 'options__id',
+            ),
+            all=True,
+        )
+    return {
+        (service_id, option_id): (category_id, price)
+        for service_id, category_id, price, option_id in rows
+    }
+
+
+def quote_baskets(baskets, pincode=''):
+    """Quote each of ``baskets`` (``{'items': [...], 'pincode': ...}``), in order
+    
+    A basket with unavailable items gets ``{'errors': [...]}`` instead of a
+    quote; the others are priced regardless.
+    """
+    table = load_price_table([item for basket in baskets for item in basket['items']])
+    
+    priced, errors = [], []
+    for basket in baskets:
+        lines, problems = [], []
+        for position, item in enumerate(basket['items']):
+            option_id = item.get('service_option_id') or None
+            price = table.get((item['service_id'], option_id))
+            if price is None:
+                what = f'service option {option_id}' if option_id else f"service {item['service_id']}"
+                problems.append(f'Item {position}: {what} is not available')
+            else:
+                lines.append((price[0], price[1], item['quantity']))
+        errors.append(problems)
+        priced.append((lines, basket.get('pincode') or pincode))
+    
+    quotes = get_pricing_engine().quote_many(
+        (lines, basket_pincode) for (lines, basket_pincode), problems in zip(priced, errors) if not problems
+    )
+    quotes = iter(quotes)
+    results = []
+    for (lines, _), problems in zip(priced, errors):
+        if problems:
+            results.append({'errors': problems})
+        else:
+            results.append(dict(next(quotes)._asdict(), total_items=sum(line[2] for line in lines)))
+    return results
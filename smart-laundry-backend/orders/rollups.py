@@ -0,0 +1,219 @@
+"""
+Incremental daily revenue rollups.
+
+``DailyRevenueRollup`` is kept in step with orders by applying deltas in the
+transaction that writes them: order saves and deletes (post_save /
+post_delete), order item saves and deletes, the items ``place_order``
+bulk-creates (``add_items``) and status transitions (``order_status_changed``).
+Archiving moves orders without changing their contribution, so deletes made
+inside ``rollups_paused()`` are not subtracted. ``rebuild_order_rollups``
+recomputes the table from live and archived orders.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from services.models import Service
+from .models import Order, OrderItem, DailyRevenueRollup
+from .signals import order_status_changed
+
+
+# Positions in a delta: order_count, item_count, quantity, revenue
+MEASURES = ('order_count', 'item_count', 'quantity', 'revenue')
+
+ORDER_FIELDS = {'created_at', 'status', 'payment_method', 'total_amount'}
+ITEM_FIELDS = {'order_id', 'service_id', 'quantity', 'total_price'}
+
+# State of an instance loaded with rollup fields deferred; saves of such
+# instances cannot have changed those fields and are not diffed
+UNTRACKED = object()
+
+_paused = ContextVar('rollups_paused', default=False)
+
+
+@contextmanager
+def rollups_paused():
+    """Skip rollup deltas for order and item deletes made inside the block"""
+    token = _paused.set(True)
+    try:
+        yield
+    finally:
+        _paused.reset(token)
+
+
+def order_day(created_at):
+    return timezone.localtime(created_at).date()
+
+
+def _new_deltas():
+    return defaultdict(lambda: [0, 0, 0, Decimal('0.00')])
+
+
+def _add(deltas, key, sign, orders=0, items=0, quantity=0, revenue=Decimal('0.00')):
+    delta = deltas[key]
+    delta[0] += sign * orders
+    delta[1] += sign * items
+    delta[2] += sign * quantity
+    delta[3] += sign * revenue
+
+
+def _add_lines(deltas, order_key, lines, sign):
+    """Add item ``lines`` of ``(category_id, items, quantity, revenue)`` under ``order_key``"""
+    for category_id, items, quantity, revenue in lines:
+        _add(deltas, order_key + (category_id,), sign, items=items, quantity=quantity, revenue=revenue)
+        _add(deltas, order_key + (None,), sign, items=items, quantity=quantity)
+
+
+def apply_deltas(deltas):
+    """Add ``deltas`` (key -> measures) to the rollup rows, creating missing rows"""
+    for (day, status, payment_method, category_id), delta in deltas.items():
+        if not any(delta):
+            continue
+        lookup = {'day': day, 'status': status, 'payment_method': payment_method, 'category_id': category_id}
+        changes = {field: F(field) + value for field, value in zip(MEASURES, delta)}
+        if DailyRevenueRollup.objects.filter(**lookup).update(**changes):
+            continue
+        try:
+            with transaction.atomic():
+                DailyRevenueRollup.objects.create(**lookup, **dict(zip(MEASURES, delta)))
+        except IntegrityError:
+            # Created concurrently by another writer
+            DailyRevenueRollup.objects.filter(**lookup).update(**changes)
+
+
+def category_lines(order_ids):
+    """Item lines per category for ``order_ids``: order_id -> [(category_id, items, quantity, revenue)]"""
+    rows = (
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .order_by()
+        .values('order_id', 'service__category_id')
+        .annotate(items=Count('id'), quantity=Sum('quantity'), revenue=Sum('total_price'))
+    )
+    lines = defaultdict(list)
+    for row in rows:
+        lines[row['order_id']].append((row['service__category_id'], row['items'], row['quantity'], row['revenue']))
+    return lines
+
+
+def add_items(order, items):
+    """Record ``items`` created without signals (``bulk_create``) for ``order``"""
+    lines = [
+        (item.service.category_id, 1, item.quantity, item.total_price)
+        for item in items
+    ]
+    deltas = _new_deltas()
+    _add_lines(deltas, _order_state(order)[:3], lines, sign=1)
+    apply_deltas(deltas)
+
+
+def _order_state(order):
+    """Rollup key of an order plus its total, or None if it is not saved"""
+    if order.pk is None:
+        return None
+    if order.get_deferred_fields() & ORDER_FIELDS:
+        return UNTRACKED
+    return (order_day(order.created_at), order.status, order.payment_method, order.total_amount)
+
+
+def _item_state(item):
+    if item.pk is None:
+        return None
+    if item.get_deferred_fields() & ITEM_FIELDS:
+        return UNTRACKED
+    return (item.order_id, item.service_id, item.quantity, item.total_price)
+
+
+def _apply_item_delta(state, sign):
+    order_id, service_id, quantity, total_price = state
+    order = Order.objects.filter(pk=order_id).values_list('created_at', 'status', 'payment_method').first()
+    if order is None:
+        return
+    category_id = Service.objects.filter(pk=service_id).values_list('category_id', flat=True).first()
+    deltas = _new_deltas()
+    created_at, status, payment_method = order
+    key = (order_day(created_at), status, payment_method)
+    _add_lines(deltas, key, [(category_id, 1, quantity, total_price)], sign)
+    apply_deltas(deltas)
+
+
+@receiver(post_init, sender=Order)
+def remember_order_state(sender, instance, **kwargs):
+    instance._rollup_state = _order_state(instance)
+
+
+@receiver(post_save, sender=Order)
+def update_rollups_on_order_save(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    old_state = None if created else instance._rollup_state
+    new_state = _order_state(instance)
+    if UNTRACKED not in (old_state, new_state) and old_state != new_state:
+        deltas = _new_deltas()
+        if old_state:
+            _add(deltas, old_state[:3] + (None,), -1, orders=1, revenue=old_state[3])
+        _add(deltas, new_state[:3] + (None,), 1, orders=1, revenue=new_state[3])
+        if old_state and old_state[:3] != new_state[:3]:
+            lines = category_lines([instance.pk])[instance.pk]
+            _add_lines(deltas, old_state[:3], lines, sign=-1)
+            _add_lines(deltas, new_state[:3], lines, sign=1)
+        apply_deltas(deltas)
+    instance._rollup_state = new_state
+
+
+@receiver(post_delete, sender=Order)
+def update_rollups_on_order_delete(sender, instance, **kwargs):
+    # Its items were deleted (and subtracted) before the order itself
+    state = instance._rollup_state
+    if state and state is not UNTRACKED and not _paused.get():
+        deltas = _new_deltas()
+        _add(deltas, state[:3] + (None,), -1, orders=1, revenue=state[3])
+        apply_deltas(deltas)
+        instance._rollup_state = None
+
+
+@receiver(post_init, sender=OrderItem)
+def remember_item_state(sender, instance, **kwargs):
+    instance._rollup_state = _item_state(instance)
+
+
+@receiver(post_save, sender=OrderItem)
+def update_rollups_on_item_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old_state = instance._rollup_state
+    new_state = _item_state(instance)
+    if UNTRACKED not in (old_state, new_state) and old_state != new_state:
+        if old_state:
+            _apply_item_delta(old_state, sign=-1)
+        _apply_item_delta(new_state, sign=1)
+    instance._rollup_state = new_state
+
+
+@receiver(post_delete, sender=OrderItem)
+def update_rollups_on_item_delete(sender, instance, **kwargs):
+    if instance._rollup_state and instance._rollup_state is not UNTRACKED and not _paused.get():
+        _apply_item_delta(instance._rollup_state, sign=-1)
+        instance._rollup_state = None
+
+
+@receiver(order_status_changed)
+def move_rollups_on_status_change(sender, changes, **kwargs):
+    lines = category_lines([order.id for order, _ in changes])
+    deltas = _new_deltas()
+    for order, old_status in changes:
+        day = order_day(order.created_at)
+        old_key = (day, old_status, order.payment_method)
+        new_key = (day, order.status, order.payment_method)
+        _add(deltas, old_key + (None,), -1, orders=1, revenue=order.total_amount)
+        _add(deltas, new_key + (None,), 1, orders=1, revenue=order.total_amount)
+        _add_lines(deltas, old_key, lines[order.id], sign=-1)
+        _add_lines(deltas, new_key, lines[order.id], sign=1)
+        order._rollup_state = _order_state(order)
+    apply_deltas(deltas)
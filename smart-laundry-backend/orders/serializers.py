@@ -1,6 +1,15 @@
+from datetime import timedelta
+
+from django.utils import timezone
 from rest_framework import serializers
-from decimal import Decimal
 from .models import Order, OrderItem, Cart, OrderTracking, Payment
+from .exports import DATASETS, OUTPUT_FORMATS
+from .cart_store import get_cart_store
+from .eta import order_eta
+from .placement import place_order, price_items
+from .quotes import max_batch_size
+from .slots import max_days
+from services.models import Service, ServiceOption
 from services.serializers import ServiceSerializer, ServiceOptionSerializer
 
 
@@ -18,27 +27,27 @@ class OrderItemSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'unit_price', 'total_price', 'created_at')
     
     def create(self, validated_data):
-        from services.models import Service, ServiceOption
-        
-        service_id = validated_data.pop('service_id')
-        service_option_id = validated_data.pop('service_option_id', None)
-        
-        service = Service.objects.get(id=service_id)
-        service_option = None
-        
-        if service_option_id:
-            service_option = ServiceOption.objects.get(id=service_option_id)
-            validated_data['unit_price'] = service_option.price
-        else:
-            validated_data['unit_price'] = service.price
+        [(_, service, service_option, unit_price)] = price_items([validated_data])
+        validated_data.pop('service_id')
+        validated_data.pop('service_option_id', None)
         
         validated_data['service'] = service
         validated_data['service_option'] = service_option
-        validated_data['total_price'] = validated_data['unit_price'] * validated_data['quantity']
+        validated_data['unit_price'] = unit_price
+        validated_data['total_price'] = unit_price * validated_data['quantity']
         
         return super().create(validated_data)
 
 
+class OrderItemInputSerializer(serializers.Serializer):
+    """Validates one entry of ``items_data`` when placing an order"""
+    service_id = serializers.IntegerField()
+    service_option_id = serializers.IntegerField(required=False, allow_null=True)
+    quantity = serializers.IntegerField(min_value=1)
+    item_description = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    special_instructions = serializers.CharField(required=False, allow_blank=True)
+
+
 class OrderTrackingSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderTracking
@@ -47,11 +56,17 @@ class OrderTrackingSerializer(serializers.ModelSerializer):
 
 
 class PaymentSerializer(serializers.ModelSerializer):
+    # The full payload of a summarized response is served by payments/{id}/payload/
+    has_raw_payload = serializers.SerializerMethodField()
+    
     class Meta:
         model = Payment
         fields = ('id', 'payment_method', 'amount', 'status', 'transaction_id', 
-                 'payment_gateway_response', 'created_at')
+                 'payment_gateway_response', 'has_raw_payload', 'created_at')
         read_only_fields = ('id', 'created_at')
+    
+    def get_has_raw_payload(self, obj):
+        return obj.gateway_payload_id is not None
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -60,57 +75,202 @@ class OrderSerializer(serializers.ModelSerializer):
     payments = PaymentSerializer(many=True, read_only=True)
     user_email = serializers.CharField(source='user.email', read_only=True)
     user_name = serializers.CharField(source='user.full_name', read_only=True)
+    items_data = OrderItemInputSerializer(many=True, write_only=True, required=False)
+    estimated_delivery = serializers.SerializerMethodField()
     
     class Meta:
         model = Order
         fields = ('id', 'order_number', 'user_email', 'user_name', 'status', 
                  'payment_status', 'payment_method', 'pickup_address', 'delivery_address',
-                 'subtotal', 'tax_amount', 'delivery_charge', 'total_amount',
-                 'pickup_date', 'delivery_date', 'special_instructions', 'notes',
-                 'items', 'tracking', 'payments', 'created_at', 'updated_at')
-        read_only_fields = ('id', 'order_number', 'created_at', 'updated_at')
+                 'delivery_pincode', 'subtotal', 'tax_amount', 'delivery_charge', 'small_order_fee',
+                 'total_amount', 'pickup_slot', 'pickup_date', 'delivery_date', 'estimated_delivery',
+                 'special_instructions', 'notes',
+                 'items', 'tracking', 'payments', 'items_data', 'created_at', 'updated_at')
+        # Prices are worked out by place_order, payment status follows the
+        # payments and status only moves through transition_orders
+        read_only_fields = ('id', 'order_number', 'status', 'payment_status', 'subtotal', 'tax_amount',
+                            'delivery_charge', 'small_order_fee', 'total_amount', 'created_at', 'updated_at')
     
     def create(self, validated_data):
-        # Calculate totals
-        items_data = self.context.get('items_data', [])
-        subtotal = Decimal('0.00')
-        
-        for item_data in items_data:
-            if 'service_option_id' in item_data and item_data['service_option_id']:
-                from services.models import ServiceOption
-                service_option = ServiceOption.objects.get(id=item_data['service_option_id'])
-                item_total = service_option.price * item_data['quantity']
-            else:
-                from services.models import Service
-                service = Service.objects.get(id=item_data['service_id'])
-                item_total = service.price * item_data['quantity']
-            
-            subtotal += item_total
-        
-        # Calculate tax and delivery charge
-        tax_amount = subtotal * Decimal('0.18')  # 18% GST
-        delivery_charge = Decimal('50.00')  # Fixed delivery charge
-        total_amount = subtotal + tax_amount + delivery_charge
-        
-        validated_data['subtotal'] = subtotal
-        validated_data['tax_amount'] = tax_amount
-        validated_data['delivery_charge'] = delivery_charge
-        validated_data['total_amount'] = total_amount
-        
-        order = super().create(validated_data)
-        
-        # Create order items
-        for item_data in items_data:
-            OrderItem.objects.create(order=order, **item_data)
-        
-        # Create initial tracking entry
-        OrderTracking.objects.create(
-            order=order,
-            status='pending',
-            description='Order placed successfully'
-        )
-        
-        return order
+        items_data = validated_data.pop('items_data', [])
+        user = validated_data.pop('user')
+        return place_order(user, validated_data, items_data)
+    
+    def get_estimated_delivery(self, obj):
+        eta = order_eta(obj, [(item.service.category_id, item.service.estimated_time) for item in obj.items.all()])
+        return serializers.DateTimeField().to_representation(eta)
+    
+    def validate_pickup_slot(self, slot):
+        # Seats are only taken when an order is placed
+        if self.instance is not None and slot != self.instance.pickup_slot:
+            raise serializers.ValidationError('The pickup slot cannot be changed once the order is placed')
+        return slot
+    
+    def validate_payment_method(self, method):
+        # Chosen at checkout; payments are recorded against it
+        if self.instance is not None and method != self.instance.payment_method:
+            raise serializers.ValidationError('The payment method cannot be changed once the order is placed')
+        return method
+    
+    def update(self, instance, validated_data):
+        # Items are fixed once an order is placed
+        validated_data.pop('items_data', None)
+        return super().update(instance, validated_data)
+
+
+# Everything OrderSerializer renders, loaded in a fixed number of queries
+ORDER_DETAIL_PREFETCHES = (
+    'items__service__options',
+    'items__service__images',
+    'items__service__reviews__user',
+    'items__service_option',
+    'tracking',
+    'payments',
+)
+
+
+def with_order_detail_plan(queryset):
+    return queryset.select_related('user').prefetch_related(*ORDER_DETAIL_PREFETCHES)
+
+
+class ArchivedOrderItemSerializer(serializers.ModelSerializer):
+    """An item as kept in the archive: the service by id and name, not its catalog entry"""
+    service_name = serializers.CharField(source='service.name', read_only=True)
+    service_option_name = serializers.CharField(source='service_option.name', read_only=True, default=None)
+    
+    class Meta:
+        model = OrderItem
+        fields = ('id', 'service_id', 'service_name', 'service_option_id', 'service_option_name',
+                 'quantity', 'unit_price', 'total_price', 'item_description',
+                 'special_instructions', 'created_at')
+        read_only_fields = fields
+
+
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    """The ``ArchivedOrder.document`` of an order; payments stay in the payments table"""
+    items = ArchivedOrderItemSerializer(many=True, read_only=True)
+    tracking = OrderTrackingSerializer(many=True, read_only=True)
+    user_email = serializers.CharField(source='user.email', read_only=True)
+    user_name = serializers.CharField(source='user.full_name', read_only=True)
+    
+    class Meta:
+        model = Order
+        fields = ('id', 'order_number', 'user_email', 'user_name', 'status',
+                 'payment_status', 'payment_method', 'pickup_address', 'delivery_address',
+                 'delivery_pincode', 'subtotal', 'tax_amount', 'delivery_charge', 'small_order_fee',
+                 'total_amount', 'pickup_slot', 'pickup_date', 'delivery_date',
+                 'special_instructions', 'notes', 'items', 'tracking', 'created_at', 'updated_at')
+        read_only_fields = fields
+
+
+def with_archive_plan(queryset):
+    return queryset.select_related('user').prefetch_related('items__service', 'items__service_option', 'tracking')
+
+
+class OrderListSerializer(serializers.ModelSerializer):
+    """Order summary for listings; item counts come from queryset annotations"""
+    user_email = serializers.CharField(source='user.email', read_only=True)
+    user_name = serializers.CharField(source='user.full_name', read_only=True)
+    item_count = serializers.IntegerField(read_only=True)
+    total_quantity = serializers.IntegerField(read_only=True)
+    
+    class Meta:
+        model = Order
+        fields = ('id', 'order_number', 'user_email', 'user_name', 'status',
+                 'payment_status', 'payment_method', 'subtotal', 'tax_amount',
+                 'delivery_charge', 'small_order_fee', 'total_amount', 'item_count', 'total_quantity',
+                 'pickup_date', 'delivery_date', 'created_at', 'updated_at')
+        read_only_fields = fields
+
+
+class BulkStatusUpdateSerializer(serializers.Serializer):
+    order_ids = serializers.ListField(child=serializers.IntegerField(), min_length=1, max_length=1000)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+    description = serializers.CharField(required=False, allow_blank=True, default='')
+    location = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+
+
+class CommaSeparatedChoiceField(serializers.Field):
+    """Query parameter holding a comma-separated list of choices"""
+    
+    def __init__(self, choices, **kwargs):
+        self.choices = [value for value, *_ in choices]
+        super().__init__(**kwargs)
+    
+    def to_internal_value(self, data):
+        values = [value.strip() for value in str(data).split(',') if value.strip()]
+        invalid = [value for value in values if value not in self.choices]
+        if invalid:
+            raise serializers.ValidationError(
+                f"Invalid choice(s): {', '.join(invalid)}. Choose from: {', '.join(self.choices)}"
+            )
+        return list(dict.fromkeys(values))
+    
+    def to_representation(self, value):
+        return ','.join(value)
+
+
+class RevenueAnalyticsQuerySerializer(serializers.Serializer):
+    GROUP_BY_CHOICES = [('day',), ('status',), ('payment_method',), ('category',)]
+    
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    group_by = CommaSeparatedChoiceField(GROUP_BY_CHOICES, required=False, default=['day'])
+    status = CommaSeparatedChoiceField(Order.STATUS_CHOICES, required=False, default=list)
+    payment_method = CommaSeparatedChoiceField(Order.PAYMENT_METHOD_CHOICES, required=False, default=list)
+    
+    def validate(self, attrs):
+        end = attrs.get('end') or timezone.localdate()
+        start = attrs.get('start') or end - timedelta(days=29)
+        if start > end:
+            raise serializers.ValidationError({'start': 'start must not be after end'})
+        attrs['start'], attrs['end'] = start, end
+        return attrs
+
+
+class ExportQuerySerializer(serializers.Serializer):
+    """Filters for an export; ``status`` choices depend on the dataset in context"""
+    output = serializers.ChoiceField(choices=list(OUTPUT_FORMATS), default='csv')
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    status = CommaSeparatedChoiceField([], required=False, default=list)
+    gzip = serializers.BooleanField(required=False, default=False)
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['status'].choices = [value for value, _ in DATASETS[self.context['dataset']].status_choices]
+    
+    def validate(self, attrs):
+        if attrs.get('start') and attrs.get('end') and attrs['start'] > attrs['end']:
+            raise serializers.ValidationError({'start': 'start must not be after end'})
+        return attrs
+
+
+class QuoteBasketSerializer(serializers.Serializer):
+    items = OrderItemInputSerializer(many=True, allow_empty=False)
+    pincode = serializers.CharField(max_length=10, required=False, allow_blank=True)
+
+
+class BatchQuoteSerializer(serializers.Serializer):
+    """Baskets to price; ``pincode`` applies to baskets without their own"""
+    baskets = QuoteBasketSerializer(many=True, allow_empty=False)
+    pincode = serializers.CharField(max_length=10, required=False, allow_blank=True)
+    
+    def validate_baskets(self, baskets):
+        if len(baskets) > max_batch_size():
+            raise serializers.ValidationError(f'At most {max_batch_size()} baskets per request')
+        return baskets
+
+
+class SlotAvailabilityQuerySerializer(serializers.Serializer):
+    pincode = serializers.CharField(max_length=10, required=False, allow_blank=True)
+    date = serializers.DateField(required=False)
+    days = serializers.IntegerField(min_value=1, required=False, default=7)
+    
+    def validate_days(self, days):
+        if days > max_days():
+            raise serializers.ValidationError(f'At most {max_days()} days')
+        return days
 
 
 class CartSerializer(serializers.ModelSerializer):
@@ -126,15 +286,42 @@ class CartSerializer(serializers.ModelSerializer):
                  'quantity', 'total_price', 'created_at', 'updated_at')
         read_only_fields = ('id', 'total_price', 'created_at', 'updated_at')
     
+    def validate(self, attrs):
+        service_id = attrs.get('service_id')
+        option_id = attrs.get('service_option_id')
+        if self.instance is None:
+            if not Service.objects.filter(pk=service_id, is_active=True).exists():
+                raise serializers.ValidationError({'service_id': 'Service is not available'})
+            if option_id and not ServiceOption.objects.filter(pk=option_id, service_id=service_id, is_active=True).exists():
+                raise serializers.ValidationError({'service_option_id': 'Service option is not available'})
+        return attrs
+    
     def create(self, validated_data):
-        validated_data['user'] = self.context['request'].user
-        return super().create(validated_data)
+        return get_cart_store().add_line(
+            self.context['request'].user,
+            validated_data['service_id'],
+            validated_data.get('service_option_id'),
+            validated_data.get('quantity', 1),
+        )
     
     def update(self, instance, validated_data):
-        # Update quantity
-        instance.quantity = validated_data.get('quantity', instance.quantity)
-        instance.save()
-        return instance
+        # Only the quantity of a line can change
+        return get_cart_store().set_quantity(
+            self.context['request'].user, instance.id, validated_data.get('quantity', instance.quantity)
+        )
+
+
+class CartSummaryItemSerializer(serializers.ModelSerializer):
+    """Cart line for the summary; prices are set by the cart store (unit_price, line_total)"""
+    service_name = serializers.CharField(source='service.name', read_only=True)
+    service_option_name = serializers.CharField(source='service_option.name', read_only=True, default=None)
+    unit_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    total_price = serializers.DecimalField(source='line_total', max_digits=10, decimal_places=2, read_only=True)
+    
+    class Meta:
+        model = Cart
+        fields = ('id', 'service_id', 'service_name', 'service_option_id', 'service_option_name',
+                 'quantity', 'unit_price', 'total_price')
 
 
 class CartSummarySerializer(serializers.Serializer):
@@ -143,5 +330,20 @@ class CartSummarySerializer(serializers.Serializer):
     subtotal = serializers.DecimalField(max_digits=10, decimal_places=2)
     tax_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
     delivery_charge = serializers.DecimalField(max_digits=10, decimal_places=2)
+    small_order_fee = serializers.DecimalField(max_digits=10, decimal_places=2)
     total_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
-    items = CartSerializer(many=True)
\ No newline at end of file
+    estimated_delivery = serializers.DateTimeField(allow_null=True)
+    items = CartSummaryItemSerializer(many=True)
+
+
+class CheckoutSerializer(serializers.ModelSerializer):
+    """Order details for turning the cart into an order"""
+    
+    class Meta:
+        model = Order
+        fields = ('payment_method', 'pickup_address', 'delivery_address', 'delivery_pincode',
+                 'pickup_slot', 'pickup_date', 'delivery_date', 'special_instructions')
+    
+    def create(self, validated_data):
+        user = validated_data.pop('user')
+        return get_cart_store().checkout(user, validated_data)
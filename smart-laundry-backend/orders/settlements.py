@@ -0,0 +1,145 @@
+"""
+Reconciliation of payments against gateway settlement reports.
+
+A settlement CSV is read row by row and handled in chunks: each chunk's
+transaction ids are looked up with one indexed ``transaction_id IN (...)``
+query, and the payments and orders whose status changes are written with
+one ``UPDATE`` per target status, in a transaction per chunk. Rows that do
+not reconcile are streamed to a mismatch report, so memory stays bounded by
+the chunk size whatever the size of the file. Used by the
+``reconcile_settlements`` command.
+"""
+import csv
+from collections import Counter, defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Payment
+from .payments import group_by_value, sync_order_payment_statuses
+
+
+# Settlement status (lower case) -> Payment status
+SETTLEMENT_STATUSES = {
+    'settled': 'success',
+    'captured': 'success',
+    'success': 'success',
+    'failed': 'failed',
+    'refunded': 'refunded',
+    'reversed': 'refunded',
+    'cancelled': 'cancelled',
+}
+
+REPORT_COLUMNS = (
+    'line', 'transaction_id', 'reason', 'settlement_amount', 'payment_amount',
+    'settlement_status', 'payment_status',
+)
+
+DEFAULT_COLUMNS = {'transaction_id': 'transaction_id', 'amount': 'amount', 'status': 'status'}
+
+
+class SettlementFormatError(ValueError):
+    pass
+
+
+def _rows(lines, columns):
+    """``(line_number, transaction_id, amount, status)`` for each data row of a CSV"""
+    reader = csv.DictReader(lines)
+    missing = [name for name in columns.values() if name not in (reader.fieldnames or [])]
+    if missing:
+        raise SettlementFormatError(f"Settlement file has no column(s): {', '.join(missing)}")
+    for row in reader:
+        yield (
+            reader.line_num,
+            (row[columns['transaction_id']] or '').strip(),
+            (row[columns['amount']] or '').strip(),
+            (row[columns['status']] or '').strip().lower(),
+        )
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def reconcile_chunk(chunk, report, dry_run=False):
+    """Reconcile parsed settlement rows; returns a Counter of outcomes"""
+    outcomes = Counter()
+    payments = defaultdict(list)
+    for payment in Payment.objects.filter(
+        transaction_id__in={transaction_id for _, transaction_id, _, _ in chunk if transaction_id}
+    ).order_by().values('id', 'order_id', 'transaction_id', 'amount', 'status'):
+        payments[payment['transaction_id']].append(payment)
+    
+    # id -> new status; the last row for a payment wins
+    payment_updates = {}
+    order_updates = {}
+    
+    for line, transaction_id, amount, status in chunk:
+        matches = payments.get(transaction_id, [])
+        payment = matches[0] if len(matches) == 1 else None
+        target = SETTLEMENT_STATUSES.get(status)
+        try:
+            settled_amount = Decimal(amount)
+        except InvalidOperation:
+            settled_amount = None
+        if settled_amount is not None and not settled_amount.is_finite():
+            # NaN, sNaN and Infinity cannot match (sNaN cannot even be compared)
+            settled_amount = None
+        
+        if not transaction_id:
+            reason = 'missing_transaction_id'
+        elif not matches:
+            reason = 'unknown_transaction'
+        elif payment is None:
+            reason = 'ambiguous_transaction'
+        elif settled_amount is None:
+            reason = 'invalid_amount'
+        elif settled_amount != payment['amount']:
+            reason = 'amount_mismatch'
+        elif target is None:
+            reason = 'unknown_status'
+        else:
+            reason = None
+        
+        if reason:
+            outcomes[reason] += 1
+            report.writerow((
+                line, transaction_id, reason, amount, payment['amount'] if payment else '',
+                status, payment['status'] if payment else '',
+            ))
+        elif payment['status'] == target:
+            outcomes['unchanged'] += 1
+        else:
+            outcomes['updated'] += 1
+            payment_updates[payment['id']] = target
+            order_updates[payment['order_id']] = target
+            # Later rows for the same transaction see the new status
+            payment['status'] = target
+    
+    if not dry_run:
+        now = timezone.now()
+        with transaction.atomic():
+            for target, ids in group_by_value(payment_updates).items():
+                Payment.objects.filter(pk__in=ids).update(status=target, updated_at=now)
+            sync_order_payment_statuses(order_updates)
+    return outcomes
+
+
+def reconcile_settlement(lines, report_file, chunk_size=1000, columns=None, dry_run=False):
+    """Reconcile a settlement CSV (an iterable of lines) and write mismatches to ``report_file``
+    
+    ``columns`` maps ``transaction_id``, ``amount`` and ``status`` to the
+    file's column names. Yields a Counter of outcomes per chunk.
+    """
+    report = csv.writer(report_file)
+    report.writerow(REPORT_COLUMNS)
+    for chunk in _chunks(_rows(lines, {**DEFAULT_COLUMNS, **(columns or {})}), chunk_size):
+        yield reconcile_chunk(chunk, report, dry_run)
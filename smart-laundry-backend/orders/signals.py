@@ -0,0 +1,7 @@
+from django.dispatch import Signal
+
+
+# Sent inside the transaction that changed the statuses, with
+# ``changes``: list of ``(order, old_status)`` (orders carry the new status)
+# ``tracking``: the OrderTracking rows written for them
+order_status_changed = Signal()
@@ -0,0 +1,157 @@
+"""
+Pickup slot inventory.
+
+A ``PickupSlot`` is a window in an area with a capacity. Booking is a single
+conditional UPDATE (``booked = booked + 1 WHERE booked < capacity``): the
+database serializes concurrent bookings of a slot on the row itself, so no
+slot is read and locked first and none is oversold however many clients
+race for the last seat. Cancelled orders give their seat back the same way,
+whether they are cancelled by a status transition (``order_status_changed``)
+or by saving the order (admin, order API).
+
+Availability is served from a per-area, per-day matrix in the cache, built
+with one indexed query for whatever the cache is missing. A booking, release
+or admin edit deletes the affected day's entry when its transaction commits,
+and entries also expire after ``PICKUP_SLOT_CACHE_SECONDS``; the UPDATE,
+not the matrix, decides whether a booking succeeds.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import Order, PickupSlot
+from .signals import order_status_changed
+
+
+def cache_timeout():
+    return getattr(settings, 'PICKUP_SLOT_CACHE_SECONDS', 60)
+
+
+def max_days():
+    return getattr(settings, 'PICKUP_SLOT_MAX_DAYS', 14)
+
+
+def areas_for(pincode):
+    """The areas serving ``pincode``: the pincode and each of its prefixes"""
+    pincode = (pincode or '').strip()
+    return [pincode[:length] for length in range(1, len(pincode) + 1)]
+
+
+def matrix_key(area, day):
+    return f'slots:{area}:{day.isoformat()}'
+
+
+def _day_bounds(first_day, last_day):
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(first_day, time.min), tz),
+        timezone.make_aware(datetime.combine(last_day + timedelta(days=1), time.min), tz),
+    )
+
+
+def invalidate(slots):
+    """Drop the cached matrix entries of ``slots`` once the transaction commits"""
+    keys = {matrix_key(slot.area, timezone.localdate(slot.starts_at)) for slot in slots}
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(list(keys)))
+
+
+def load_matrix(areas, days):
+    """``(area, day)`` -> list of slot dicts for each pair, from the cache where possible"""
+    keys = {matrix_key(area, day): (area, day) for area in areas for day in days}
+    matrix = {keys[key]: entry for key, entry in cache.get_many(list(keys)).items()}
+    missing = [pair for pair in keys.values() if pair not in matrix]
+    if missing:
+        built = {pair: [] for pair in missing}
+        start, end = _day_bounds(min(day for _, day in missing), max(day for _, day in missing))
+        rows = PickupSlot.objects.filter(
+            area__in={area for area, _ in missing}, starts_at__gte=start, starts_at__lt=end, is_active=True,
+        ).order_by('area', 'starts_at').values('id', 'area', 'starts_at', 'ends_at', 'capacity', 'booked')
+        for row in rows:
+            pair = (row['area'], timezone.localdate(row['starts_at']))
+            if pair in built:
+                built[pair].append(row)
+        cache.set_many({matrix_key(*pair): entry for pair, entry in built.items()}, cache_timeout())
+        matrix.update(built)
+    return matrix
+
+
+def availability(pincode, first_day, days):
+    """Open pickup slots for ``pincode`` on ``days`` days from ``first_day``, grouped by day"""
+    dates = [first_day + timedelta(days=offset) for offset in range(days)]
+    matrix = load_matrix(areas_for(pincode), dates)
+    now = timezone.now()
+    
+    by_day = defaultdict(list)
+    for (_, day), entry in matrix.items():
+        by_day[day].extend(slot for slot in entry if slot['starts_at'] > now)
+    return [
+        {
+            'date': day,
+            'slots': [
+                dict(slot, remaining=slot['capacity'] - slot['booked'], available=slot['booked'] < slot['capacity'])
+                for slot in sorted(by_day[day], key=lambda slot: (slot['starts_at'], slot['area']))
+            ],
+        }
+        for day in dates
+    ]
+
+
+def book_slot(slot, pincode=None):
+    """Take one seat in ``slot``; raises ``ValidationError`` when it cannot be booked
+    
+    Inside a transaction the seat is returned if the transaction rolls back.
+    """
+    if pincode is not None and not (pincode or '').strip().startswith(slot.area):
+        raise serializers.ValidationError({'pickup_slot': [f'This slot does not serve pincode {pincode or "(none)"}']})
+    booked = PickupSlot.objects.filter(
+        pk=slot.pk, is_active=True, starts_at__gt=timezone.now(), booked__lt=F('capacity'),
+    ).update(booked=F('booked') + 1)
+    if not booked:
+        raise serializers.ValidationError({'pickup_slot': ['This pickup slot is full or no longer available']})
+    invalidate([slot])
+
+
+def release_slots(slot_ids):
+    """Give back one seat per entry of ``slot_ids`` (ids may repeat)"""
+    for slot_id, seats in Counter(slot_ids).items():
+        PickupSlot.objects.filter(pk=slot_id, booked__gte=seats).update(booked=F('booked') - seats)
+    invalidate(PickupSlot.objects.filter(pk__in=set(slot_ids)).only('area', 'starts_at'))
+
+
+@receiver(order_status_changed)
+def release_cancelled_pickups(sender, changes, **kwargs):
+    slot_ids = [order.pickup_slot_id for order, _ in changes if order.status == 'cancelled' and order.pickup_slot_id]
+    if slot_ids:
+        release_slots(slot_ids)
+    for order, _ in changes:
+        order._slot_status = order.status
+
+
+@receiver(post_init, sender=Order)
+def remember_slot_status(sender, instance, **kwargs):
+    instance._slot_status = None if 'status' in instance.get_deferred_fields() else instance.status
+
+
+@receiver(post_save, sender=Order)
+def release_pickup_on_cancel(sender, instance, created=False, raw=False, **kwargs):
+    if raw or 'status' in instance.get_deferred_fields():
+        return
+    was_cancelled = instance._slot_status in (None, 'cancelled')
+    if not created and not was_cancelled and instance.status == 'cancelled' and instance.pickup_slot_id:
+        release_slots([instance.pickup_slot_id])
+    instance._slot_status = instance.status
+
+
+@receiver([post_save, post_delete], sender=PickupSlot)
+def invalidate_slot(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate([instance])
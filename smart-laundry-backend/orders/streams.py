@@ -0,0 +1,188 @@
+"""
+Live order tracking for customers' apps.
+
+``GET /api/orders/stream/`` pushes new tracking events for the user's orders
+as Server-Sent Events when served over ASGI. Reconnects send ``Last-Event-ID``
+(done automatically by EventSource) and receive only the events they missed.
+With ``?mode=poll``, or under WSGI, the endpoint long-polls instead: it
+returns as soon as there are events after ``last_event_id`` or after
+``ORDER_STREAM_POLL_TIMEOUT`` seconds with an empty list.
+
+``EventSource`` cannot send an Authorization header, and a JWT in the query
+string would end up in access and proxy logs. Browsers therefore first
+``POST /api/orders/stream/ticket/`` (with the header) and connect with
+``?ticket=``: a signed, single-use ticket that expires after
+``ORDER_STREAM_TICKET_SECONDS``. With a per-process cache, "single use"
+holds per worker; the short expiry bounds the rest.
+"""
+import asyncio
+import json
+import secrets
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework import permissions
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.response import Response
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import TokenError
+
+from .events import broker, tracking_event
+from .models import OrderTracking
+
+
+KEEPALIVE_SECONDS = 15
+
+TICKET_SALT = 'orders.streams.ticket'
+TICKET_USED_KEY = 'orders:stream-ticket-used:{nonce}'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def ticket_lifetime():
+    return _setting('ORDER_STREAM_TICKET_SECONDS', 30)
+
+
+def issue_ticket(user):
+    return signing.dumps({'user': user.pk, 'nonce': secrets.token_urlsafe(16)}, salt=TICKET_SALT)
+
+
+def redeem_ticket(ticket):
+    """The user a stream ticket was issued to, or None if it is invalid, expired or used"""
+    try:
+        payload = signing.loads(ticket, salt=TICKET_SALT, max_age=ticket_lifetime())
+    except signing.BadSignature:
+        return None
+    if not cache.add(TICKET_USED_KEY.format(nonce=payload['nonce']), 1, ticket_lifetime()):
+        return None
+    return get_user_model().objects.filter(pk=payload['user'], is_active=True).first()
+
+
+def authenticate(request):
+    """Resolve the user from a Bearer header or a ``?ticket=`` (EventSource cannot set headers)"""
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        ticket = request.GET.get('ticket')
+        return redeem_ticket(ticket) if ticket else None
+    
+    raw_token = header.split(' ', 1)[1]
+    authentication = JWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (AuthenticationFailed, TokenError):
+        return None
+
+
+def events_since(user, last_event_id, limit=100):
+    entries = (
+        OrderTracking.objects.filter(user=user, id__gt=last_event_id)
+        .select_related('order')
+        .order_by('id')[:limit]
+    )
+    return [tracking_event(entry, entry.order) for entry in entries]
+
+
+def latest_event_id(user):
+    return OrderTracking.objects.filter(user=user).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def _parse_last_event_id(request):
+    value = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def _format_event(event):
+    return f"id: {event['id']}\nevent: tracking\ndata: {json.dumps(event)}\n\n"
+
+
+async def _event_stream(user, subscription, last_event_id):
+    deadline = time.monotonic() + _setting('ORDER_STREAM_MAX_SECONDS', 300)
+    try:
+        yield f"retry: {_setting('ORDER_STREAM_RETRY_MS', 3000)}\n\n"
+        
+        # Stream lifetime is capped: Django 4.2 does not notice disconnected
+        # clients, and EventSource reconnects with Last-Event-ID anyway.
+        catch_up = True
+        while time.monotonic() < deadline:
+            if catch_up:
+                # Missed events on (re)connect, and events published by
+                # other worker processes on every keep-alive tick
+                for event in await sync_to_async(events_since)(user, last_event_id):
+                    last_event_id = event['id']
+                    yield _format_event(event)
+                catch_up = False
+            
+            try:
+                events = [await subscription.get(KEEPALIVE_SECONDS)] + subscription.drain()
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                catch_up = True
+                continue
+            
+            for event in sorted(events, key=lambda event: event['id']):
+                if event['id'] > last_event_id:
+                    last_event_id = event['id']
+                    yield _format_event(event)
+    finally:
+        subscription.close()
+
+
+async def _long_poll(user, subscription, last_event_id):
+    try:
+        events = await sync_to_async(events_since)(user, last_event_id)
+        if not events:
+            try:
+                events = [await subscription.get(_setting('ORDER_STREAM_POLL_TIMEOUT', 25))] + subscription.drain()
+            except asyncio.TimeoutError:
+                events = []
+            events = sorted((event for event in events if event['id'] > last_event_id), key=lambda event: event['id'])
+        
+        if events:
+            last_event_id = events[-1]['id']
+        return JsonResponse({'events': events, 'last_event_id': last_event_id})
+    finally:
+        subscription.close()
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def stream_ticket(request):
+    """A single-use ticket for connecting to the stream without an Authorization header"""
+    return Response({'ticket': issue_ticket(request.user), 'expires_in': ticket_lifetime()})
+
+
+async def order_event_stream(request):
+    """Push new tracking events for the authenticated user's orders"""
+    user = await sync_to_async(authenticate)(request)
+    if user is None:
+        return JsonResponse({'error': 'Authentication credentials were not provided or are invalid'}, status=401)
+    
+    # Subscribe before reading the backlog so nothing falls in between
+    subscription = broker.subscribe(user.id)
+    last_event_id = _parse_last_event_id(request)
+    if last_event_id is None:
+        # Fresh connections get only events from now on
+        last_event_id = await sync_to_async(latest_event_id)(user)
+    
+    if request.GET.get('mode') == 'poll' or not isinstance(request, ASGIRequest):
+        return await _long_poll(user, subscription, last_event_id)
+    
+    response = StreamingHttpResponse(
+        _event_stream(user, subscription, last_event_id),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
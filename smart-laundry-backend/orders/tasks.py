@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from .webhooks import process_pending_events
+
+
+@shared_task(ignore_result=True)
+def process_webhook_events():
+    """Apply every pending webhook inbox event to payments and orders"""
+    return dict(process_pending_events())
@@ -1,3 +1,1021 @@
-from django.test import TestCase
+import csv
+import json
+import math
+import zlib
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from itertools import count
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from services.models import ServiceCategory, Service, ServiceOption
+from .archive import archive_orders
+from .blobs import decompress, raw_payload, unreferenced_blobs, zstandard
+from .cart_store import CachedCartStore, DatabaseCartStore
+from .dispatch import assign_routes, nearest_neighbour_tour, plan_routes, ready_orders, tour_length, two_opt
+from .local_gateway import LocalGateway
+from .models import (
+    Order, OrderItem, OrderTracking, ArchivedOrder, Cart, CategoryLoad, DailyRevenueRollup, OrderNumberSequence,
+    PayloadBlob, Payment, PickupSlot, PincodeLocation, PricingRuleSet, WebhookEvent,
+)
+from .numbering import ORDER_NUMBER_START, BlockAllocator, next_order_number
+from .placement import place_order
+from .pricing import PRICING_VERSION_KEY, get_pricing_engine
+from .settlements import SettlementFormatError, reconcile_chunk, reconcile_settlement
+from .streams import events_since, latest_event_id
+from .transitions import transition_orders
+from .webhooks import process_pending_events, reprocess_events, retry_delay
+
+
+_phones = count(1)
+
+
+def make_user(name='customer', **extra):
+    return get_user_model().objects.create_user(
+        username=name, email=f'{name}@example.com', phone=f'+9199{next(_phones):08d}', password='x', **extra
+    )
+
+
+class OrderTestCase(TestCase):
+    """A customer and a two-category catalog"""
+    
+    def setUp(self):
+        self.user = make_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        wash = ServiceCategory.objects.create(name='Wash')
+        dry = ServiceCategory.objects.create(name='Dry Cleaning')
+        self.shirt = Service.objects.create(category=wash, name='Shirt', price=20, estimated_time=timedelta(hours=4))
+        self.suit = Service.objects.create(category=dry, name='Suit', price=150, estimated_time=timedelta(hours=24))
+        self.starch = ServiceOption.objects.create(service=self.shirt, name='Starch', price=5)
+    
+    def place(self, quantity=1, user=None, **order_data):
+        order_data.setdefault('pickup_address', '1 Main St')
+        order_data.setdefault('delivery_address', '1 Main St')
+        items = [
+            {'service_id': self.shirt.pk, 'service_option_id': self.starch.pk, 'quantity': quantity},
+            {'service_id': self.suit.pk, 'quantity': 1},
+        ]
+        return place_order(user or self.user, order_data, items)
+
+
+class OrderNumberTests(TransactionTestCase):
+    def test_blocks_are_handed_out_from_memory(self):
+        allocator = BlockAllocator(name='test', block_size=3)
+        with CaptureQueriesContext(connection) as queries:
+            values = [allocator.next_value() for _ in range(7)]
+        self.assertEqual(values, list(range(ORDER_NUMBER_START, ORDER_NUMBER_START + 7)))
+        # Three blocks, each reserved with one UPDATE (INSERT for the first) and one SELECT at most
+        self.assertLessEqual(len([query for query in queries if 'order_number_sequences' in query['sql']]), 6)
+        self.assertEqual(OrderNumberSequence.objects.get(name='test').next_value, ORDER_NUMBER_START + 9)
+    
+    def test_workers_get_disjoint_blocks(self):
+        first, second = BlockAllocator(name='test', block_size=5), BlockAllocator(name='test', block_size=5)
+        values = [allocator.next_value() for _ in range(6) for allocator in (first, second)]
+        self.assertEqual(len(set(values)), len(values))
+    
+    def test_inside_a_transaction_one_value_is_reserved(self):
+        allocator = BlockAllocator(name='test', block_size=50)
+        with transaction.atomic():
+            value = allocator.next_value()
+        self.assertEqual(OrderNumberSequence.objects.get(name='test').next_value, value + 1)
+        # Nothing is kept in memory that a rollback could take back
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            allocator.next_value()
+            raise RuntimeError
+        self.assertEqual(allocator.next_value(), value + 1)
+    
+    def test_order_numbers_cannot_collide_with_legacy_ones(self):
+        number = next_order_number()
+        self.assertRegex(number, r'^ORD-\d{9,}$')
+        self.assertNotRegex(number, r'^ORD-[0-9A-F]{8}$')
+
+
+class OrderPlacementTests(OrderTestCase):
+    def items(self, count):
+        services = [self.shirt, self.suit] + [
+            Service.objects.create(
+                category=self.shirt.category, name=f'Towel {n}', price=10, estimated_time=timedelta(hours=2)
+            )
+            for n in range(count - 2)
+        ]
+        return [{'service_id': service.pk, 'quantity': 2} for service in services]
+    
+    def test_client_cannot_set_prices(self):
+        response = self.client.post('/api/orders/orders/', {
+            'pickup_address': '1 Main St', 'delivery_address': '1 Main St', 'items_data': self.items(2),
+            'subtotal': '0.01', 'tax_amount': '0', 'delivery_charge': '0', 'total_amount': '0.01',
+            'payment_status': 'paid',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        order = Order.objects.get(pk=response.json()['id'])
+        self.assertEqual(order.subtotal, Decimal('340.00'))
+        self.assertEqual(order.total_amount, order.subtotal + order.tax_amount + order.delivery_charge)
+        self.assertEqual(order.payment_status, 'pending')
+    
+    def test_queries_do_not_grow_with_the_items(self):
+        # Rollup rows for the day and categories exist after the first order
+        self.place()
+        small, large = self.items(2), self.items(8)
+        with CaptureQueriesContext(connection) as queries:
+            place_order(self.user, {'pickup_address': '1 Main St', 'delivery_address': '1 Main St'}, small)
+        with self.assertNumQueries(len(queries)):
+            order = place_order(self.user, {'pickup_address': '1 Main St', 'delivery_address': '1 Main St'}, large)
+        self.assertEqual(order.items.count(), 8)
+
+
+class CartStoreTests(OrderTestCase):
+    def add_twice(self, store):
+        store.add_line(self.user, self.shirt.pk, self.starch.pk, 2)
+        store.add_line(self.user, self.suit.pk)
+        return store.add_line(self.user, self.shirt.pk, self.starch.pk, 3)
+    
+    def test_database_store_merges_repeated_items(self):
+        line = self.add_twice(DatabaseCartStore())
+        self.assertEqual(line.quantity, 5)
+        self.assertEqual(Cart.objects.filter(user=self.user).count(), 2)
+    
+    def test_cached_store_merges_repeated_items_and_flushes(self):
+        cache.clear()
+        store = CachedCartStore()
+        line = self.add_twice(store)
+        self.assertEqual(line.quantity, 5)
+        self.assertEqual(len(store.lines(self.user)), 2)
+        
+        self.assertEqual(store.flush_dirty(), 1)
+        rows = dict(Cart.objects.filter(user=self.user).values_list('service_id', 'quantity'))
+        self.assertEqual(rows, {self.shirt.pk: 5, self.suit.pk: 1})
+        
+        store.add_line(self.user, self.suit.pk)
+        order = store.checkout(self.user, {'pickup_address': '1 Main St', 'delivery_address': '1 Main St'})
+        self.assertEqual(sorted(order.items.values_list('quantity', flat=True)), [2, 5])
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+
+
+class CartCheckoutTests(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.store = DatabaseCartStore()
+        self.store.add_line(self.user, self.shirt.pk, self.starch.pk, 3)
+        self.store.add_line(self.user, self.suit.pk)
+    
+    def summary(self):
+        response = self.client.get('/api/orders/cart/summary/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+    
+    def test_summary_prices_each_line(self):
+        summary = self.summary()
+        self.assertEqual(summary['total_items'], 4)
+        self.assertEqual(Decimal(summary['subtotal']), Decimal('165.00'))
+        lines = {line['service_name']: line for line in summary['items']}
+        self.assertEqual((lines['Shirt']['service_option_name'], lines['Shirt']['unit_price']), ('Starch', '5.00'))
+        self.assertEqual((lines['Shirt']['total_price'], lines['Suit']['total_price']), ('15.00', '150.00'))
+        self.assertIsNotNone(summary['estimated_delivery'])
+    
+    def test_summary_queries_do_not_grow_with_the_cart(self):
+        self.summary()
+        with CaptureQueriesContext(connection) as small:
+            self.summary()
+        for n in range(4):
+            service = Service.objects.create(
+                category=self.shirt.category, name=f'Towel {n}', price=10, estimated_time=timedelta(hours=2)
+            )
+            self.store.add_line(self.user, service.pk, None, 2)
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self.summary()['total_items'], 12)
+        self.assertEqual(len(large), len(small))
+    
+    def test_checkout_places_the_cart_and_empties_it(self):
+        summary = self.summary()
+        response = self.client.post('/api/orders/cart/checkout/', {
+            'pickup_address': '1 Main St', 'delivery_address': '1 Main St', 'total_amount': '1.00',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        order = response.json()
+        self.assertEqual(order['total_amount'], summary['total_amount'])
+        self.assertEqual(
+            sorted((item['service']['name'], item['quantity']) for item in order['items']), [('Shirt', 3), ('Suit', 1)]
+        )
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+        
+        response = self.client.post('/api/orders/cart/checkout/', {
+            'pickup_address': '1 Main St', 'delivery_address': '1 Main St',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'cart': ['Your cart is empty']})
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class PricingVersionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.rule_set = PricingRuleSet.objects.create(name='Standard', rules={'tax': {'default_rate': '0.18'}})
+    
+    def test_engine_is_reused_until_the_rules_change(self):
+        engine = get_pricing_engine()
+        self.assertIs(get_pricing_engine(), engine)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rule_set.rules = {'tax': {'default_rate': '0.05'}}
+            self.rule_set.save()
+        self.assertEqual(get_pricing_engine().default_tax_rate, Decimal('0.05'))
+    
+    def test_edit_by_another_worker_is_seen_after_the_version_check(self):
+        self.assertEqual(get_pricing_engine().default_tax_rate, Decimal('0.18'))
+        # No signal runs here, as for an edit saved by another process
+        PricingRuleSet.objects.filter(pk=self.rule_set.pk).update(
+            rules={'tax': {'default_rate': '0.12'}}, updated_at=self.rule_set.updated_at + timedelta(seconds=1)
+        )
+        self.assertEqual(get_pricing_engine().default_tax_rate, Decimal('0.18'))
+        cache.delete(PRICING_VERSION_KEY)  # what PRICING_VERSION_CHECK_SECONDS does
+        self.assertEqual(get_pricing_engine().default_tax_rate, Decimal('0.12'))
+
+
+class QuoteTests(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.shirts = {'service_id': self.shirt.pk, 'service_option_id': self.starch.pk, 'quantity': 3}
+        self.suits = {'service_id': self.suit.pk, 'quantity': 1}
+    
+    def quote(self, baskets):
+        return self.client.post('/api/orders/quote/batch/', {'baskets': baskets}, format='json')
+    
+    def test_baskets_are_quoted_in_order(self):
+        self.suit.is_active = False
+        self.suit.save()
+        response = self.quote([{'items': [self.shirts]}, {'items': [self.shirts, self.suits]}, {'items': [self.shirts]}])
+        self.assertEqual(response.status_code, 200)
+        first, second, third = response.json()['results']
+        self.assertEqual((first['subtotal'], first['total_items']), ('15.00', 3))
+        self.assertEqual(second, {'errors': [f'Item 1: service {self.suit.pk} is not available']})
+        self.assertEqual(third, first)
+    
+    def test_quotes_match_the_placed_order(self):
+        result, = self.quote([{'items': [self.shirts, self.suits]}]).json()['results']
+        order = self.place(quantity=3)
+        self.assertEqual(
+            [Decimal(result[field]) for field in ('subtotal', 'tax_amount', 'delivery_charge', 'total_amount')],
+            [order.subtotal, order.tax_amount, order.delivery_charge, order.total_amount],
+        )
+    
+    def test_a_batch_is_one_query_once_the_engine_is_cached(self):
+        self.quote([{'items': [self.shirts]}])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.quote([{'items': [self.shirts, self.suits]}] * 20).status_code, 200)
+    
+    @override_settings(QUOTE_BATCH_MAX_BASKETS=2)
+    def test_batches_are_capped(self):
+        response = self.quote([{'items': [self.shirts]}] * 3)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'baskets': ['At most 2 baskets per request']})
+
+
+class RevenueRollupTests(OrderTestCase):
+    def rollups(self):
+        return {
+            (row.day, row.status, row.payment_method, row.category_id): (
+                row.order_count, row.item_count, row.quantity, row.revenue
+            )
+            for row in DailyRevenueRollup.objects.all()
+            if row.order_count or row.item_count or row.quantity or row.revenue
+        }
+    
+    def assertMatchesRebuild(self):
+        kept = self.rollups()
+        call_command('rebuild_order_rollups', stdout=StringIO())
+        self.assertEqual(kept, self.rollups())
+    
+    def test_placing_an_order_adds_it(self):
+        order = self.place(quantity=3)
+        day = timezone.localdate(order.created_at)
+        rollups = self.rollups()
+        self.assertEqual(rollups[(day, 'pending', order.payment_method, None)], (1, 2, 4, order.total_amount))
+        self.assertEqual(rollups[(day, 'pending', order.payment_method, self.shirt.category_id)], (0, 1, 3, Decimal('15.00')))
+        self.assertMatchesRebuild()
+    
+    def test_incremental_rollups_match_a_rebuild(self):
+        first, second, third = self.place(), self.place(quantity=2), self.place()
+        transition_orders([first.pk, second.pk], 'confirmed')
+        
+        order = Order.objects.get(pk=second.pk)
+        order.status = 'cancelled'
+        order.save()
+        
+        item = OrderItem.objects.filter(order=first, service=self.shirt).get()
+        item.quantity = 4
+        item.save()
+        OrderItem.objects.get(order=first, service=self.suit).delete()
+        
+        Order.objects.get(pk=third.pk).delete()
+        self.assertMatchesRebuild()
+    
+    def test_archiving_keeps_the_contribution(self):
+        order = self.place()
+        transition_orders([order.pk], 'delivered')
+        Order.objects.filter(pk=order.pk).update(updated_at=timezone.now() - timedelta(days=365))
+        before = self.rollups()
+        self.assertEqual(sum(archive_orders()), 1)
+        self.assertEqual(self.rollups(), before)
+        self.assertMatchesRebuild()
+
+
+class CategoryLoadTests(OrderTestCase):
+    def load(self, service):
+        row = CategoryLoad.objects.filter(category=service.category).first()
+        return (row.order_count, row.quantity, row.work) if row else None
+    
+    def test_load_follows_status_changes(self):
+        order = self.place(quantity=2)
+        self.assertIsNone(self.load(self.shirt))
+        transition_orders([order.pk], 'picked_up')
+        self.assertEqual(self.load(self.shirt), (1, 2, timedelta(hours=8)))
+        self.assertEqual(self.load(self.suit), (1, 1, timedelta(hours=24)))
+        
+        order = Order.objects.get(pk=order.pk)
+        order.status = 'ready'
+        order.save()
+        self.assertEqual(self.load(self.shirt), (0, 0, timedelta(0)))
+    
+    def test_service_edits_do_not_drift_the_load(self):
+        order = self.place(quantity=2)
+        transition_orders([order.pk], 'in_progress')
+        self.shirt.estimated_time = timedelta(hours=1)
+        self.shirt.save()
+        self.assertEqual(self.load(self.shirt), (1, 2, timedelta(hours=2)))
+        
+        self.suit.category = self.shirt.category
+        self.suit.save()
+        self.assertEqual(self.load(self.shirt), (1, 3, timedelta(hours=26)))
+        self.assertEqual(self.load(self.suit), (1, 3, timedelta(hours=26)))
+        
+        transition_orders([order.pk], 'delivered')
+        self.assertEqual(self.load(self.shirt), (0, 0, timedelta(0)))
+        self.assertFalse(CategoryLoad.objects.exclude(work=timedelta(0)).exists())
+    
+    def test_orders_created_in_the_backlog_join_it(self):
+        order = self.place(quantity=2, status='in_progress')
+        self.assertEqual(self.load(self.shirt), (1, 2, timedelta(hours=8)))
+        self.assertEqual(self.load(self.suit), (1, 1, timedelta(hours=24)))
+        
+        transition_orders([order.pk], 'ready')
+        self.assertEqual(self.load(self.shirt), (0, 0, timedelta(0)))
+        self.assertEqual(self.load(self.suit), (0, 0, timedelta(0)))
+    
+    def test_load_never_goes_negative(self):
+        order = self.place(status='picked_up')
+        # Items added to an order in the backlog wait for rebuild_category_load
+        order.items.create(service=self.shirt, quantity=5, unit_price=20)
+        transition_orders([order.pk], 'ready')
+        self.assertEqual(self.load(self.shirt), (0, 0, timedelta(0)))
+        self.assertEqual(self.load(self.suit), (0, 0, timedelta(0)))
+    
+    def test_closed_orders_have_no_estimate(self):
+        order = self.place()
+        self.assertIsNotNone(self.client.get(f'/api/orders/orders/{order.pk}/').json()['estimated_delivery'])
+        transition_orders([order.pk], 'cancelled')
+        self.assertIsNone(self.client.get(f'/api/orders/orders/{order.pk}/').json()['estimated_delivery'])
+
+
+class PickupSlotTests(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        starts_at = timezone.now() + timedelta(days=1)
+        self.slot = PickupSlot.objects.create(
+            area='5600', starts_at=starts_at, ends_at=starts_at + timedelta(hours=2), capacity=2
+        )
+    
+    def book(self):
+        return self.place(pickup_slot=self.slot, delivery_pincode='560001')
+    
+    def booked(self):
+        self.slot.refresh_from_db()
+        return self.slot.booked
+    
+    def test_slot_is_not_oversold(self):
+        self.book()
+        self.book()
+        with self.assertRaises(serializers.ValidationError):
+            self.book()
+        self.assertEqual(self.booked(), 2)
+    
+    def test_cancelling_by_transition_releases_the_seat(self):
+        order = self.book()
+        other = self.book()
+        transition_orders([order.pk], 'cancelled')
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'cancelled')
+        self.assertEqual(self.booked(), 1)
+        # Saving the reloaded order afterwards does not release its seat again
+        order.special_instructions = 'Called to cancel'
+        order.save()
+        self.assertEqual(self.booked(), 1)
+        self.assertEqual(Order.objects.get(pk=other.pk).status, 'pending')
+    
+    def test_cancelling_by_saving_the_order_releases_the_seat(self):
+        order = Order.objects.get(pk=self.book().pk)
+        order.status = 'cancelled'
+        order.save()
+        self.assertEqual(self.booked(), 0)
+        
+        order = Order.objects.get(pk=order.pk)
+        order.special_instructions = 'Called to cancel'
+        order.save()
+        self.assertEqual(self.booked(), 0)
+
+
+class StatusTransitionTests(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user.role = 'admin'
+        self.user.save()
+        self.first, self.second = self.place(), self.place()
+        transition_orders([self.second.pk], 'cancelled')
+    
+    def statuses(self):
+        return dict(Order.objects.values_list('pk', 'status'))
+    
+    def test_bulk_update_reports_each_failure(self):
+        response = self.client.post('/api/orders/orders/bulk_update_status/', {
+            'order_ids': [self.first.pk, self.second.pk, 0], 'status': 'confirmed', 'location': 'Hub',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'status': 'confirmed',
+            'updated': [self.first.pk],
+            'failed': [
+                {'id': self.second.pk, 'error': 'Cannot change status from cancelled to confirmed'},
+                {'id': 0, 'error': 'Order not found'},
+            ],
+        })
+        self.assertEqual(self.statuses(), {self.first.pk: 'confirmed', self.second.pk: 'cancelled'})
+        self.assertEqual(self.first.tracking.get(status='confirmed').location, 'Hub')
+    
+    def test_bulk_update_is_for_admins_only(self):
+        self.user.role = 'customer'
+        self.user.save()
+        response = self.client.post('/api/orders/orders/bulk_update_status/', {
+            'order_ids': [self.first.pk], 'status': 'confirmed',
+        }, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.statuses()[self.first.pk], 'pending')
+    
+    def test_status_and_payment_fields_cannot_be_edited(self):
+        url = f'/api/orders/orders/{self.first.pk}/'
+        response = self.client.patch(url, {'status': 'delivered', 'payment_status': 'paid'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['status'], response.json()['payment_status']), ('pending', 'pending'))
+        self.assertFalse(self.first.tracking.filter(status='delivered').exists())
+        
+        response = self.client.patch(url, {'payment_method': 'razorpay'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('payment_method', response.json())
+    
+    def test_admin_action_reports_rejected_orders(self):
+        staff = make_user('staff', is_staff=True, is_superuser=True)
+        client = Client()
+        client.force_login(staff)
+        response = client.post('/admin/orders/order/', {
+            'action': 'mark_confirmed', '_selected_action': [self.first.pk, self.second.pk],
+        }, follow=True)
+        notes = [str(message) for message in response.context['messages']]
+        self.assertEqual(notes, [
+            '1 order(s) moved to Confirmed.',
+            f'1 order(s) not updated - {self.second.order_number}: Cannot change status from cancelled to confirmed',
+        ])
+        self.assertEqual(self.statuses(), {self.first.pk: 'confirmed', self.second.pk: 'cancelled'})
+    
+    def test_admin_form_leaves_status_to_the_actions(self):
+        staff = make_user('staff', is_staff=True, is_superuser=True)
+        client = Client()
+        client.force_login(staff)
+        form = client.get(f'/admin/orders/order/{self.first.pk}/change/').content.decode()
+        self.assertNotIn('name="status"', form)
+        self.assertNotIn('name="payment_status"', form)
+        self.assertNotIn('name="payment_method"', form)
+
+
+class OwnerCopyTests(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = self.place()
+        transition_orders([self.order.pk], 'confirmed')
+        Payment.objects.create(order=self.order, payment_method='razorpay', amount=self.order.total_amount)
+    
+    def owners(self):
+        return {
+            model.__name__: set(model.objects.filter(order=self.order).values_list('user_id', flat=True))
+            for model in (OrderItem, OrderTracking, Payment)
+        }
+    
+    def test_children_copy_the_owner(self):
+        self.assertEqual(self.owners(), {name: {self.user.pk} for name in ('OrderItem', 'OrderTracking', 'Payment')})
+        for url in ('/api/orders/items/', '/api/orders/tracking/', '/api/orders/payments/'):
+            self.assertGreater(len(self.client.get(url).json()['results']), 0, url)
+    
+    def test_reassigning_the_order_moves_the_copies(self):
+        other = make_user('other')
+        order = Order.objects.get(pk=self.order.pk)
+        order.user = other
+        order.save()
+        self.assertEqual(self.owners(), {name: {other.pk} for name in ('OrderItem', 'OrderTracking', 'Payment')})
+        for url in ('/api/orders/items/', '/api/orders/tracking/', '/api/orders/payments/'):
+            self.assertEqual(self.client.get(url).json()['results'], [], url)
+    
+    def test_backfill_fills_missing_copies(self):
+        for model in (OrderItem, OrderTracking, Payment):
+            model.objects.update(user=None)
+        migration = import_module('orders.migrations.0014_child_owner_columns')
+        # The backfill only needs the editor's connection
+        migration.backfill_owners(apps, SimpleNamespace(connection=connection))
+        self.assertEqual(self.owners(), {name: {self.user.pk} for name in ('OrderItem', 'OrderTracking', 'Payment')})
+
+
+class SettlementTests(OrderTestCase):
+    def test_settlement_file_updates_payments_and_reports_mismatches(self):
+        order = self.place()
+        paid = Payment.objects.create(order=order, payment_method='razorpay', amount=order.total_amount, transaction_id='pay_1')
+        other = Payment.objects.create(order=order, payment_method='razorpay', amount=order.total_amount, transaction_id='pay_2')
+        lines = StringIO(
+            'Txn,Amount,State\n'
+            f'pay_1,{order.total_amount},Captured\n'
+            f'pay_2,1.00,settled\n'
+            f'pay_3,{order.total_amount},settled\n'
+            f'pay_1,{order.total_amount},settled\n'
+        )
+        report = StringIO()
+        outcomes = sum(
+            reconcile_settlement(
+                lines, report, chunk_size=2, columns={'transaction_id': 'Txn', 'amount': 'Amount', 'status': 'State'}
+            ),
+            Counter(),
+        )
+        self.assertEqual(outcomes, {'updated': 1, 'unchanged': 1, 'amount_mismatch': 1, 'unknown_transaction': 1})
+        self.assertEqual([row[:3] for row in csv.reader(StringIO(report.getvalue()))][1:], [
+            ['3', 'pay_2', 'amount_mismatch'], ['4', 'pay_3', 'unknown_transaction'],
+        ])
+        paid.refresh_from_db()
+        other.refresh_from_db()
+        order.refresh_from_db()
+        self.assertEqual((paid.status, other.status, order.payment_status), ('success', 'pending', 'paid'))
+    
+    def test_dry_run_changes_nothing(self):
+        order = self.place()
+        payment = Payment.objects.create(
+            order=order, payment_method='razorpay', amount=order.total_amount, transaction_id='pay_1'
+        )
+        lines = StringIO(f'transaction_id,amount,status\npay_1,{order.total_amount},settled\n')
+        self.assertEqual(sum(reconcile_settlement(lines, StringIO(), dry_run=True), Counter()), {'updated': 1})
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'pending')
+    
+    def test_missing_columns_are_reported(self):
+        with self.assertRaisesMessage(SettlementFormatError, 'Settlement file has no column(s): amount'):
+            list(reconcile_settlement(StringIO('transaction_id,status\n'), StringIO()))
+    
+    def test_non_finite_amounts_are_invalid(self):
+        order = self.place()
+        Payment.objects.create(order=order, payment_method='razorpay', amount=order.total_amount, transaction_id='pay_1')
+        rows = [(n, 'pay_1', amount, 'success') for n, amount in enumerate(('sNaN', 'NaN', '-Infinity', 'x'), 2)]
+        outcomes = reconcile_chunk(rows, csv.writer(StringIO()))
+        self.assertEqual(outcomes, {'invalid_amount': 4})
+
+
+class ExportTests(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user.role = 'admin'
+        self.user.save()
+        self.live = self.place(quantity=2)
+        self.closed = self.place()
+        Payment.objects.create(
+            order=self.closed, payment_method='razorpay', amount=self.closed.total_amount, transaction_id='pay_1'
+        )
+        transition_orders([self.closed.pk], 'delivered')
+        Order.objects.filter(pk=self.closed.pk).update(updated_at=timezone.now() - timedelta(days=365))
+        self.assertEqual(sum(archive_orders()), 1)
+    
+    def export(self, dataset, **params):
+        response = self.client.get(f'/api/orders/export/{dataset}/', {'output': 'ndjson', **params})
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content)
+        if params.get('gzip'):
+            content = zlib.decompress(content, wbits=31)
+        return [json.loads(line) for line in content.decode().splitlines()]
+    
+    def test_orders_include_the_archive(self):
+        rows = {row['order_number']: row for row in self.export('orders')}
+        self.assertEqual(set(rows), {self.live.order_number, self.closed.order_number})
+        archived = rows[self.closed.order_number]
+        self.assertEqual((archived['id'], archived['status']), (self.closed.pk, 'delivered'))
+        self.assertEqual(Decimal(archived['subtotal']), self.closed.subtotal)
+        self.assertEqual(Decimal(archived['total_amount']), self.closed.total_amount)
+        
+        self.assertEqual([row['order_number'] for row in self.export('orders', status='delivered')],
+                         [self.closed.order_number])
+        yesterday = (timezone.localdate() - timedelta(days=1)).isoformat()
+        self.assertEqual(self.export('orders', end=yesterday), [])
+    
+    def test_items_include_the_archive(self):
+        rows = self.export('items', gzip='true')
+        self.assertEqual(
+            sorted((row['order__order_number'], row['service__name'], row['quantity']) for row in rows),
+            sorted([(self.live.order_number, 'Shirt', 2), (self.live.order_number, 'Suit', 1),
+                    (self.closed.order_number, 'Shirt', 1), (self.closed.order_number, 'Suit', 1)]),
+        )
+    
+    def test_payments_name_their_archived_order(self):
+        row, = self.export('payments')
+        self.assertEqual((row['order_id'], row['order__order_number']), (None, None))
+        self.assertEqual(
+            (row['archived_order_id'], row['archived_order__order_number']), (self.closed.pk, self.closed.order_number)
+        )
+    
+    def test_exports_are_for_admins_only(self):
+        self.user.role = 'customer'
+        self.user.save()
+        self.assertEqual(self.client.get('/api/orders/export/orders/').status_code, 403)
+
+
+@override_settings(RAZORPAY_WEBHOOK_SECRET='secret', CELERY_TASK_ALWAYS_EAGER=True)
+class WebhookTests(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.gateway = LocalGateway('razorpay')
+        self.order = self.place()
+        self.payment = Payment.objects.create(
+            order=self.order, payment_method='razorpay', amount=self.order.total_amount, transaction_id='pay_1'
+        )
+    
+    def send(self, *deliveries):
+        # The eager worker runs once each delivery commits
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.gateway.replay(deliveries)
+    
+    def test_redelivery_is_applied_once(self):
+        delivery = self.gateway.delivery(self.payment, 'success', event_id='evt_1')
+        self.assertEqual(self.send(delivery, delivery), [200, 200])
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+        self.payment.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual(self.payment.status, 'success')
+        self.assertEqual(self.order.payment_status, 'paid')
+    
+    def test_late_failure_does_not_undo_a_capture(self):
+        self.send(self.gateway.delivery(self.payment, 'success'))
+        self.send(self.gateway.delivery(self.payment, 'failed'))
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'success')
+        
+        self.send(self.gateway.delivery(self.payment, 'refunded'))
+        self.send(self.gateway.delivery(self.payment, 'success'))
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'refunded')
+    
+    def test_events_apply_in_arrival_order(self):
+        WebhookEvent.objects.bulk_create([
+            WebhookEvent(gateway='razorpay', event_id=event_id, event_type=payload['event'], payload=payload)
+            for event_id, payload in (
+                (event_id, self.gateway.gateway.build_event(event_id, 'pay_1', status, self.payment.amount))
+                for event_id, status in (('evt_1', 'failed'), ('evt_2', 'success'), ('evt_3', 'failed'))
+            )
+        ])
+        self.assertEqual(+process_pending_events(batch_size=2), {'applied': 2, 'stale': 1})
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'success')
+    
+    def test_unknown_transaction_is_retried(self):
+        late = Payment(order=self.order, payment_method='razorpay', amount=self.order.total_amount, transaction_id='pay_2')
+        self.send(self.gateway.delivery(late, 'success'))
+        event = WebhookEvent.objects.get()
+        self.assertIsNone(event.processed_at)
+        self.assertEqual(event.attempts, 1)
+        self.assertGreater(event.retry_at, timezone.now())
+        # Not due yet
+        self.assertEqual(+process_pending_events(), {})
+        
+        late.save()
+        WebhookEvent.objects.update(retry_at=timezone.now())
+        self.assertEqual(+process_pending_events(), {'applied': 1})
+        late.refresh_from_db()
+        self.assertEqual(late.status, 'success')
+        event.refresh_from_db()
+        self.assertEqual((event.error, event.retry_at), ('', None))
+    
+    @override_settings(WEBHOOK_RETRY_SECONDS=10)
+    def test_retry_delay_doubles(self):
+        self.assertEqual([retry_delay(attempts).total_seconds() for attempts in (1, 2, 3, 4)], [10, 20, 40, 80])
+    
+    @override_settings(WEBHOOK_RETRY_SECONDS=10, WEBHOOK_MAX_ATTEMPTS=3)
+    def test_unknown_transaction_backs_off_then_is_dead_lettered(self):
+        late = Payment(order=self.order, payment_method='razorpay', amount=self.order.total_amount, transaction_id='pay_2')
+        start = timezone.now()
+        self.send(self.gateway.delivery(late, 'success'))
+        event = WebhookEvent.objects.get()
+        self.assertEqual(event.attempts, 1)
+        self.assertTrue(start + timedelta(seconds=10) <= event.retry_at <= timezone.now() + timedelta(seconds=10))
+        
+        WebhookEvent.objects.update(retry_at=timezone.now())
+        start = timezone.now()
+        self.assertEqual(+process_pending_events(), {'retrying': 1})
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, 2)
+        self.assertTrue(start + timedelta(seconds=20) <= event.retry_at <= timezone.now() + timedelta(seconds=20))
+        self.assertIsNone(event.processed_at)
+        
+        WebhookEvent.objects.update(retry_at=timezone.now())
+        self.assertEqual(+process_pending_events(), {'failed': 1})
+        event.refresh_from_db()
+        self.assertEqual((event.attempts, event.retry_at, event.error), (3, None, 'Unknown transaction pay_2'))
+        self.assertIsNotNone(event.processed_at)
+        self.assertEqual(+process_pending_events(), {})
+    
+    @override_settings(WEBHOOK_MAX_ATTEMPTS=1)
+    def test_given_up_events_can_be_reprocessed(self):
+        late = Payment(order=self.order, payment_method='razorpay', amount=self.order.total_amount, transaction_id='pay_2')
+        self.send(self.gateway.delivery(late, 'success'))
+        event = WebhookEvent.objects.get()
+        self.assertIsNotNone(event.processed_at)
+        self.assertEqual(event.error, 'Unknown transaction pay_2')
+        
+        late.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(reprocess_events(WebhookEvent.objects.all()), 1)
+        late.refresh_from_db()
+        self.assertEqual(late.status, 'success')
+
+
+@override_settings(PAYMENT_PAYLOAD_INLINE_LIMIT=256)
+class PayloadBlobTests(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = self.place()
+        self.payload = {'id': 'pay_1', 'status': 'captured', 'amount': 17000, 'notes': ['x' * 40] * 20}
+    
+    def pay(self, transaction_id, payload):
+        return Payment.objects.create(
+            order=self.order, payment_method='razorpay', amount=self.order.total_amount,
+            transaction_id=transaction_id, payment_gateway_response=payload,
+        )
+    
+    def assertRoundTrip(self, codec):
+        payment = self.pay('pay_1', self.payload)
+        blob = PayloadBlob.objects.get()
+        self.assertEqual(blob.codec, codec)
+        self.assertLess(len(blob.data), blob.size)
+        self.assertEqual(
+            payment.payment_gateway_response,
+            {'id': 'pay_1', 'status': 'captured', 'amount': 17000, 'payload_digest': blob.digest},
+        )
+        self.assertEqual(raw_payload(Payment.objects.get(pk=payment.pk)), self.payload)
+        self.assertEqual(self.client.get(f'/api/orders/payments/{payment.pk}/payload/').json(), self.payload)
+    
+    def test_zlib_round_trip(self):
+        with mock.patch('orders.blobs.zstandard', None):
+            self.assertRoundTrip('zlib')
+    
+    @skipUnless(zstandard, 'zstandard is not installed')
+    def test_zstd_round_trip(self):
+        self.assertRoundTrip('zstd')
+    
+    def test_small_payloads_stay_inline(self):
+        payment = self.pay('pay_1', {'id': 'pay_1', 'status': 'captured'})
+        self.assertIsNone(payment.gateway_payload_id)
+        self.assertEqual(raw_payload(payment), {'id': 'pay_1', 'status': 'captured'})
+        self.assertFalse(PayloadBlob.objects.exists())
+    
+    def test_repeated_payloads_share_a_blob(self):
+        first, second = self.pay('pay_1', self.payload), self.pay('pay_2', self.payload)
+        self.assertEqual(first.gateway_payload_id, second.gateway_payload_id)
+        self.assertEqual(PayloadBlob.objects.count(), 1)
+        
+        first.delete()
+        self.assertFalse(unreferenced_blobs().exists())
+        second.delete()
+        self.assertEqual(unreferenced_blobs().count(), 1)
+    
+    def test_unknown_codecs_are_refused(self):
+        with self.assertRaisesMessage(ValueError, "Unknown payload codec 'lz4'"):
+            decompress('lz4', b'')
+
+
+@override_settings(DISPATCH_DEPOT='')
+class DispatchTests(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        PincodeLocation.objects.bulk_create([
+            PincodeLocation(pincode='560001', latitude=12.97, longitude=77.59),
+            PincodeLocation(pincode='560034', latitude=12.93, longitude=77.62),
+            PincodeLocation(pincode='560076', latitude=12.90, longitude=77.60),
+            PincodeLocation(pincode='110001', latitude=28.63, longitude=77.22),
+        ])
+        pincodes = ('560001', '560034', '560034', '560076', '110001', '999999')
+        self.orders = {pincode: [] for pincode in pincodes}
+        for pincode in pincodes:
+            self.orders[pincode].append(self.place(delivery_pincode=pincode).pk)
+        transition_orders([pk for pks in self.orders.values() for pk in pks], 'ready')
+    
+    def test_tours_are_untangled(self):
+        points = [(math.cos(2 * math.pi * n / 30), math.sin(2 * math.pi * n / 30)) for n in range(30)]
+        tour = nearest_neighbour_tour(points, 0)
+        # Scramble the tour, then let 2-opt recover the circle
+        tour = tour[::2] + tour[1::2]
+        self.assertAlmostEqual(tour_length(two_opt(tour, points), points), tour_length(list(range(30)), points))
+        self.assertEqual(sorted(tour), list(range(30)))
+    
+    def test_routes_are_planned_per_area_within_capacity(self):
+        routes, unlocated = plan_routes(ready_orders(), capacity=2)
+        self.assertEqual(unlocated, self.orders['999999'])
+        self.assertEqual([route.area for route in routes], ['110', '560', '560'])
+        # Without a depot each area starts from its centre, which a lone stop sits on
+        self.assertEqual(routes[0].distance_km, 0)
+        self.assertTrue(routes[1].distance_km > 0 and routes[2].distance_km > 0)
+        for route in routes:
+            self.assertLessEqual(sum(len(order_ids) for _, order_ids in route.stops), 2)
+            self.assertTrue(all(pincode.startswith(route.area) for pincode, _ in route.stops))
+        planned = sorted(order_id for route in routes for _, order_ids in route.stops for order_id in order_ids)
+        self.assertEqual(planned, sorted(pk for pincode, pks in self.orders.items() if pincode != '999999' for pk in pks))
+    
+    def test_routes_without_a_rider_stay_ready(self):
+        routes, _ = plan_routes(ready_orders(), capacity=5)
+        updated, failures = assign_routes(routes, riders=['Asha'], assigned_by='ops@example.com')
+        self.assertEqual(failures, {})
+        self.assertEqual([order.pk for order in updated], self.orders['110001'])
+        tracking = OrderTracking.objects.get(order_id=self.orders['110001'][0], status='out_for_delivery')
+        self.assertEqual(
+            (tracking.description, tracking.location),
+            ('Out for delivery with Asha, stop 1 of 1 (assigned by ops@example.com)', '110001'),
+        )
+        self.assertEqual(Order.objects.filter(status='ready').count(), 5)
+    
+    def test_admin_action_dispatches_ready_orders(self):
+        staff = make_user('staff', is_staff=True, is_superuser=True)
+        client = Client()
+        client.force_login(staff)
+        response = client.post('/admin/orders/order/', {
+            'action': 'dispatch_ready_orders', '_selected_action': list(Order.objects.values_list('pk', flat=True)),
+        }, follow=True)
+        notes = [str(message) for message in response.context['messages']]
+        self.assertEqual(notes, [
+            "5 order(s) sent out for delivery on 2 route(s); each order's tracking names its route and stop.",
+            '1 order(s) not dispatched: 1 with a pincode missing from the geocode table, 0 no longer ready.',
+        ])
+        self.assertEqual(
+            list(Order.objects.filter(status='ready').values_list('pk', flat=True)), self.orders['999999']
+        )
+
+
+class OrderQueryPlanTests(OrderTestCase):
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+    
+    def test_listing_is_a_summary_with_annotated_counts(self):
+        order = self.place(quantity=3)
+        row = self.client.get('/api/orders/orders/').json()['results'][0]
+        self.assertEqual((row['id'], row['item_count'], row['total_quantity']), (order.pk, 2, 4))
+        self.assertNotIn('items', row)
+    
+    def test_listing_queries_do_not_grow_with_the_orders(self):
+        self.place()
+        few = self.count_queries('/api/orders/orders/')
+        for _ in range(5):
+            self.place()
+        self.assertEqual(self.count_queries('/api/orders/orders/'), few)
+    
+    def test_details_queries_do_not_grow_with_the_items(self):
+        small = self.place()
+        large = self.place()
+        for n in range(6):
+            service = Service.objects.create(
+                category=self.shirt.category, name=f'Towel {n}', price=10, estimated_time=timedelta(hours=2)
+            )
+            ServiceOption.objects.create(service=service, name='Fold', price=12)
+            large.items.create(service=service, quantity=1, unit_price=10)
+        Payment.objects.create(order=large, payment_method='razorpay', amount=large.total_amount)
+        self.client.get(f'/api/orders/orders/{small.pk}/')  # fills the ETA load table cache
+        self.assertEqual(
+            self.count_queries(f'/api/orders/orders/{large.pk}/'), self.count_queries(f'/api/orders/orders/{small.pk}/')
+        )
+
+
+class OrderPaginationTests(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.orders = [self.place(quantity=1 + i % 3) for i in range(7)]
+    
+    def walk(self, **params):
+        response = self.client.get('/api/orders/orders/', dict(params, page_size=3))
+        pages = [response.json()]
+        while pages[-1]['next']:
+            pages.append(self.client.get(pages[-1]['next']).json())
+        return pages, [order['id'] for page in pages for order in page['results']]
+    
+    def test_default_ordering_uses_cursors(self):
+        pages, ids = self.walk()
+        self.assertNotIn('count', pages[0])
+        self.assertEqual(ids, [order.pk for order in reversed(self.orders)])
+    
+    def test_other_orderings_use_page_numbers(self):
+        for ordering in ('status', '-total_amount'):
+            pages, ids = self.walk(ordering=ordering)
+            self.assertEqual(pages[0]['count'], 7)
+            self.assertEqual(sorted(ids), sorted(order.pk for order in self.orders), ordering)
+
+
+class StreamTicketTests(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.order = self.place()
+    
+    def connect(self, **params):
+        # Long-polls under the WSGI test client; the order's first event is already there
+        return Client().get('/api/orders/stream/', dict(params, last_event_id=0))
+    
+    def test_ticket_works_once(self):
+        ticket = self.client.post('/api/orders/stream/ticket/').json()['ticket']
+        response = self.connect(ticket=ticket)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['events'][0]['order_id'], self.order.pk)
+        self.assertEqual(self.connect(ticket=ticket).status_code, 401)
+    
+    def test_tickets_need_authentication(self):
+        self.assertEqual(APIClient().post('/api/orders/stream/ticket/').status_code, 401)
+        self.assertEqual(self.connect(ticket='forged').status_code, 401)
+    
+    def test_events_are_read_by_owner(self):
+        other = self.place(user=make_user('other'))
+        transition_orders([self.order.pk, other.pk], 'confirmed')
+        with CaptureQueriesContext(connection) as queries:
+            events = events_since(self.user, 0)
+        self.assertEqual([(event['order_id'], event['status']) for event in events],
+                         [(self.order.pk, 'pending'), (self.order.pk, 'confirmed')])
+        self.assertIn('"order_tracking"."user_id" =', queries[0]['sql'])
+        self.assertEqual(events_since(self.user, events[0]['id']), events[1:])
+        self.assertEqual(latest_event_id(self.user), events[-1]['id'])
+    
+    def test_jwt_is_not_accepted_in_the_query_string(self):
+        token = str(RefreshToken.for_user(self.user).access_token)
+        self.assertEqual(self.connect(token=token).status_code, 401)
+
+
+class ArchiveTests(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = self.place()
+        self.payload = {'id': 'pay_1', 'notes': ['x' * 50] * 50}
+        self.payment = Payment.objects.create(
+            order=self.order, payment_method='razorpay', amount=self.order.total_amount, transaction_id='pay_1',
+            payment_gateway_response=self.payload,
+        )
+        transition_orders([self.order.pk], 'delivered')
+        Order.objects.filter(pk=self.order.pk).update(updated_at=timezone.now() - timedelta(days=365))
+        self.assertEqual(sum(archive_orders()), 1)
+    
+    def test_document_is_slim(self):
+        document = ArchivedOrder.objects.get(pk=self.order.pk).document
+        self.assertNotIn('payments', document)
+        self.assertEqual(
+            {(item['service_name'], item['quantity']) for item in document['items']}, {('Shirt', 1), ('Suit', 1)}
+        )
+        self.assertFalse(any('service' in item for item in document['items']))
+    
+    def test_payments_stay_live(self):
+        self.payment.refresh_from_db()
+        self.assertIsNone(self.payment.order_id)
+        self.assertEqual(self.payment.archived_order_id, self.order.pk)
+        self.assertEqual(str(self.payment), f'Payment pay_1 - {self.order.order_number}')
+        
+        response = self.client.get(f'/api/orders/orders/{self.order.pk}/')
+        self.assertEqual(response.json()['payments'][0]['transaction_id'], 'pay_1')
+        
+        outcomes = reconcile_chunk([(2, 'pay_1', str(self.order.total_amount), 'refunded')], csv.writer(StringIO()))
+        self.assertEqual(outcomes['updated'], 1)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'refunded')
+    
+    def test_payload_blobs_stay_referenced(self):
+        self.payment.refresh_from_db()
+        self.assertIsNotNone(self.payment.gateway_payload_id)
+        self.assertFalse(unreferenced_blobs().exists())
+        self.assertEqual(raw_payload(self.payment), self.payload)
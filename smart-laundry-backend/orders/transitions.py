@@ -0,0 +1,72 @@
+"""
+Order status transitions.
+
+Every status change goes through ``transition_orders`` so it is validated
+against ``Order.STATUS_TRANSITIONS``, written with one UPDATE and one
+``bulk_create`` of tracking rows, and announced via ``order_status_changed``.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, OrderTracking
+from .signals import order_status_changed
+
+
+STATUS_LABELS = dict(Order.STATUS_CHOICES)
+
+
+def transition_orders(order_ids, new_status, description='', location='', queryset=None, tracking=None):
+    """Move the given orders to ``new_status``.
+    
+    ``queryset`` limits which orders may be touched (e.g. a customer's own).
+    ``tracking`` maps order ids to the ``(description, location)`` of their
+    tracking rows where these differ per order.
+    Returns ``(updated_orders, failures)`` where ``failures`` maps each order
+    id that was not moved to the reason.
+    """
+    if new_status not in STATUS_LABELS:
+        raise ValueError(f'Invalid status: {new_status}')
+    
+    if queryset is None:
+        queryset = Order.objects.all()
+    description = description or f'Status updated to {new_status}'
+    order_ids = list(dict.fromkeys(order_ids))
+    
+    with transaction.atomic():
+        orders = queryset.select_for_update().filter(id__in=order_ids).in_bulk()
+        
+        failures = {}
+        eligible = []
+        for order_id in order_ids:
+            order = orders.get(order_id)
+            if order is None:
+                failures[order_id] = 'Order not found'
+            elif not order.can_transition_to(new_status):
+                failures[order_id] = f'Cannot change status from {order.status} to {new_status}'
+            else:
+                eligible.append(order)
+        
+        if not eligible:
+            return [], failures
+        
+        now = timezone.now()
+        Order.objects.filter(id__in=[order.id for order in eligible]).update(status=new_status, updated_at=now)
+        
+        changes = []
+        for order in eligible:
+            changes.append((order, order.status))
+            order.status = new_status
+            order.updated_at = now
+        
+        rows = []
+        for order in eligible:
+            row_description, row_location = (tracking or {}).get(order.id, (description, location))
+            rows.append(OrderTracking(
+                order=order, user_id=order.user_id, status=new_status,
+                description=row_description, location=row_location,
+            ))
+        tracking = OrderTracking.objects.bulk_create(rows)
+        
+        order_status_changed.send(sender=Order, changes=changes, tracking=tracking)
+    
+    return eligible, failures
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import streams, views
 
 router = DefaultRouter()
 router.register(r'orders', views.OrderViewSet)
@@ -10,5 +10,12 @@ router.register(r'tracking', views.OrderTrackingViewSet)
 router.register(r'payments', views.PaymentViewSet)
 
 urlpatterns = [
+    path('stream/', streams.order_event_stream, name='order-event-stream'),
+    path('stream/ticket/', streams.stream_ticket, name='order-stream-ticket'),
+    path('analytics/revenue/', views.revenue_analytics, name='revenue-analytics'),
+    path('export/<str:dataset>/', views.export_dataset, name='export-dataset'),
+    path('quote/batch/', views.quote_batch, name='quote-batch'),
+    path('pickup-slots/', views.pickup_slots, name='pickup-slots'),
+    path('webhooks/<str:gateway>/', views.payment_webhook, name='payment-webhook'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
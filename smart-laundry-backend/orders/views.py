@@ -1,55 +1,98 @@
 from rest_framework import viewsets, status, permissions, filters
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, authentication_classes, permission_classes
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Sum, Count
+from django.db.models import QuerySet, Sum, Count, Value
+from django.db.models.functions import Coalesce
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
 from decimal import Decimal
-from .models import Order, OrderItem, Cart, OrderTracking, Payment
+from .blobs import raw_payload
+from .cart_store import get_cart_store
+from .eta import estimate_delivery
+from .exports import DATASETS, OUTPUT_FORMATS, export_chunks, export_filename
+from .models import Order, OrderItem, Cart, OrderTracking, Payment, ArchivedOrder, DailyRevenueRollup
 from .serializers import (
-    OrderSerializer, OrderItemSerializer, CartSerializer, 
-    OrderTrackingSerializer, PaymentSerializer, CartSummarySerializer
+    OrderSerializer, OrderListSerializer, OrderItemSerializer, CartSerializer, 
+    OrderTrackingSerializer, PaymentSerializer, CartSummarySerializer, CheckoutSerializer,
+    BulkStatusUpdateSerializer, RevenueAnalyticsQuerySerializer, ExportQuerySerializer,
+    BatchQuoteSerializer, SlotAvailabilityQuerySerializer, with_order_detail_plan
 )
+from .pricing import get_pricing_engine
+from .quotes import quote_baskets
+from .slots import availability
+from .webhooks import GATEWAYS, WebhookError, receive_event
+from .transitions import transition_orders
 from services.models import Service, ServiceOption
+from core.idempotency import idempotent
+from core.pagination import CreatedAtCursorPagination
 
 
 class CartViewSet(viewsets.ModelViewSet):
-    """ViewSet for cart operations"""
+    """ViewSet for cart operations, backed by the configured cart store"""
     queryset = Cart.objects.all()
     serializer_class = CartSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     ordering_fields = ['created_at']
-    ordering = ['-created_at']
+    ordering = ['-created_at', '-id']
+    
+    @property
+    def store(self):
+        return get_cart_store()
     
     def get_queryset(self):
-        return Cart.objects.filter(user=self.request.user)
+        return self.store.lines(self.request.user)
     
-    def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+    def get_object(self):
+        try:
+            return self.store.get_line(self.request.user, self.kwargs['pk'])
+        except (Cart.DoesNotExist, ValueError):
+            raise Http404
+    
+    def list(self, request, *args, **kwargs):
+        lines = self.get_queryset()
+        if isinstance(lines, QuerySet):
+            return super().list(request, *args, **kwargs)
+        # Carts held outside the database come back in a single page
+        serializer = self.get_serializer(lines, many=True)
+        return Response({'next': None, 'previous': None, 'results': serializer.data})
+    
+    def perform_destroy(self, instance):
+        self.store.remove_line(self.request.user, instance.id)
     
     @action(detail=False, methods=['get'])
     def summary(self, request):
         """Get cart summary with totals"""
-        cart_items = self.get_queryset()
+        price_lines, lines = self.store.summary(request.user)
+        pincode = request.query_params.get('pincode') or request.user.pincode
+        quote = get_pricing_engine().quote(price_lines, pincode=pincode)
         
-        total_items = sum(item.quantity for item in cart_items)
-        subtotal = sum(item.total_price for item in cart_items)
-        tax_amount = subtotal * Decimal('0.18')  # 18% GST
-        delivery_charge = Decimal('50.00')  # Fixed delivery charge
-        total_amount = subtotal + tax_amount + delivery_charge
+        eta_lines = [(cart.service.category_id, cart.service.estimated_time) for cart in lines]
         
         summary_data = {
-            'total_items': total_items,
-            'subtotal': subtotal,
-            'tax_amount': tax_amount,
-            'delivery_charge': delivery_charge,
-            'total_amount': total_amount,
-            'items': CartSerializer(cart_items, many=True, context={'request': request}).data
+            'total_items': sum(quantity for _, _, quantity in price_lines),
+            **quote._asdict(),
+            'estimated_delivery': estimate_delivery(eta_lines) if eta_lines else None,
+            'items': lines,
         }
         
         serializer = CartSummarySerializer(summary_data)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['post'])
+    @idempotent
+    def checkout(self, request):
+        """Place an order for everything in the cart and empty the cart"""
+        serializer = CheckoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        order = serializer.save(user=request.user)
+        
+        order = with_order_detail_plan(Order.objects.filter(pk=order.pk)).get()
+        data = OrderSerializer(order, context=self.get_serializer_context()).data
+        return Response(data, status=status.HTTP_201_CREATED)
+    
     @action(detail=True, methods=['post'])
     def update_quantity(self, request, pk=None):
         """Update quantity of a cart item"""
@@ -57,11 +100,10 @@ class CartViewSet(viewsets.ModelViewSet):
         quantity = request.data.get('quantity', 1)
         
         if quantity <= 0:
-            cart_item.delete()
+            self.store.remove_line(request.user, cart_item.id)
             return Response({'message': 'Item removed from cart'}, status=status.HTTP_200_OK)
         
-        cart_item.quantity = quantity
-        cart_item.save()
+        cart_item = self.store.set_quantity(request.user, cart_item.id, quantity)
         
         serializer = CartSerializer(cart_item, context={'request': request})
         return Response(serializer.data)
@@ -69,7 +111,7 @@ class CartViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['delete'])
     def clear(self, request):
         """Clear all items from cart"""
-        self.get_queryset().delete()
+        self.store.clear(request.user)
         return Response({'message': 'Cart cleared successfully'}, status=status.HTTP_200_OK)
 
 
@@ -78,20 +120,62 @@ class OrderViewSet(viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['status', 'payment_status', 'payment_method']
     search_fields = ['order_number', 'user__email']
     ordering_fields = ['created_at', 'total_amount', 'status']
-    ordering = ['-created_at']
+    ordering = ['-created_at', '-id']
     
     def get_queryset(self):
         user = self.request.user
         if user.role == 'admin':
-            return Order.objects.all()
-        return Order.objects.filter(user=user)
+            queryset = Order.objects.all()
+        else:
+            queryset = Order.objects.filter(user=user)
+        
+        if self.action == 'list':
+            return queryset.select_related('user').annotate(
+                item_count=Count('items'),
+                total_quantity=Coalesce(Sum('items__quantity'), Value(0)),
+            )
+        if self.action in ('retrieve', 'update', 'partial_update'):
+            return with_order_detail_plan(queryset)
+        return queryset
+    
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return OrderListSerializer
+        return OrderSerializer
+    
+    def get_detail_data(self, order):
+        """Serialize ``order`` freshly loaded with the detail prefetch plan"""
+        order = with_order_detail_plan(Order.objects.filter(pk=order.pk)).get()
+        return OrderSerializer(order, context=self.get_serializer_context()).data
+    
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            # Closed orders move to the archive after ORDER_ARCHIVE_AFTER
+            if not str(kwargs['pk']).isdigit():
+                raise
+            archived = ArchivedOrder.objects.filter(pk=kwargs['pk'])
+            if request.user.role != 'admin':
+                archived = archived.filter(user=request.user)
+            document = archived.values_list('document', flat=True).first()
+            if document is None:
+                raise
+            payments = Payment.objects.filter(archived_order=kwargs['pk']).order_by('created_at', 'id')
+            return Response(dict(document, payments=PaymentSerializer(payments, many=True).data))
+    
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
     
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        order = serializer.save(user=self.request.user)
+        serializer.instance = with_order_detail_plan(Order.objects.filter(pk=order.pk)).get()
     
     @action(detail=True, methods=['get'])
     def tracking(self, request, pk=None):
@@ -121,43 +205,53 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        order.status = new_status
-        order.save()
+        _, failures = transition_orders([order.id], new_status, description, location)
+        if failures:
+            return Response(
+                {'error': failures[order.id]}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(self.get_detail_data(order))
+    
+    @action(detail=False, methods=['post'])
+    def bulk_update_status(self, request):
+        """Move many orders to one status (admin only)"""
+        if request.user.role != 'admin':
+            return Response(
+                {'error': 'Only admins can update order status'}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
         
-        # Create tracking entry
-        OrderTracking.objects.create(
-            order=order,
-            status=new_status,
-            description=description,
-            location=location
+        serializer = BulkStatusUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        updated, failures = transition_orders(
+            data['order_ids'], data['status'], data['description'], data['location']
         )
         
-        serializer = OrderSerializer(order, context={'request': request})
-        return Response(serializer.data)
+        return Response({
+            'status': data['status'],
+            'updated': [order.id for order in updated],
+            'failed': [{'id': order_id, 'error': error} for order_id, error in failures.items()],
+        })
     
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
         """Cancel an order"""
         order = self.get_object()
         
-        if order.status in ['delivered', 'cancelled']:
+        _, failures = transition_orders(
+            [order.id], 'cancelled', 'Order cancelled by customer', queryset=self.get_queryset()
+        )
+        if failures:
             return Response(
                 {'error': 'Cannot cancel this order'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        order.status = 'cancelled'
-        order.save()
-        
-        # Create tracking entry
-        OrderTracking.objects.create(
-            order=order,
-            status='cancelled',
-            description='Order cancelled by customer'
-        )
-        
-        serializer = OrderSerializer(order, context={'request': request})
-        return Response(serializer.data)
+        return Response(self.get_detail_data(order))
 
 
 class OrderItemViewSet(viewsets.ReadOnlyModelViewSet):
@@ -174,7 +268,7 @@ class OrderItemViewSet(viewsets.ReadOnlyModelViewSet):
         user = self.request.user
         if user.role == 'admin':
             return OrderItem.objects.all()
-        return OrderItem.objects.filter(order__user=user)
+        return OrderItem.objects.filter(user=user)
 
 
 class OrderTrackingViewSet(viewsets.ReadOnlyModelViewSet):
@@ -182,16 +276,17 @@ class OrderTrackingViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = OrderTracking.objects.all()
     serializer_class = OrderTrackingSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['order', 'status']
     ordering_fields = ['created_at']
-    ordering = ['-created_at']
+    ordering = ['-created_at', '-id']
     
     def get_queryset(self):
         user = self.request.user
         if user.role == 'admin':
             return OrderTracking.objects.all()
-        return OrderTracking.objects.filter(order__user=user)
+        return OrderTracking.objects.filter(user=user)
 
 
 class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
@@ -199,13 +294,150 @@ class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
-    filterset_fields = ['order', 'payment_method', 'status']
+    filterset_fields = ['order', 'archived_order', 'payment_method', 'status']
     ordering_fields = ['created_at']
-    ordering = ['-created_at']
+    ordering = ['-created_at', '-id']
     
     def get_queryset(self):
         user = self.request.user
         if user.role == 'admin':
             return Payment.objects.all()
-        return Payment.objects.filter(order__user=user)
\ No newline at end of file
+        return Payment.objects.filter(user=user)
+    
+    @action(detail=True, methods=['get'])
+    def payload(self, request, pk=None):
+        """The full gateway payload of a payment, decompressed from blob storage if offloaded"""
+        return Response(raw_payload(self.get_object()))
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def revenue_analytics(request):
+    """Revenue and order volume for a date range, read from the daily rollups (admin only)
+    
+    Grouping by category reports item revenue per category; otherwise
+    revenue is order totals including tax and delivery.
+    """
+    if request.user.role != 'admin':
+        return Response(
+            {'error': 'Only admins can view revenue analytics'}, 
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    serializer = RevenueAnalyticsQuerySerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    query = serializer.validated_data
+    
+    by_category = 'category' in query['group_by']
+    rollups = DailyRevenueRollup.objects.filter(
+        day__range=(query['start'], query['end']),
+        category__isnull=not by_category,
+    )
+    if query['status']:
+        rollups = rollups.filter(status__in=query['status'])
+    if query['payment_method']:
+        rollups = rollups.filter(payment_method__in=query['payment_method'])
+    
+    measures = ['item_count', 'quantity', 'revenue'] if by_category else ['order_count', 'item_count', 'quantity', 'revenue']
+    sums = {field: Coalesce(Sum(field), Value(0)) for field in measures}
+    sums['revenue'] = Coalesce(Sum('revenue'), Value(Decimal('0.00')))
+    
+    group_fields = ['category_id' if field == 'category' else field for field in query['group_by']]
+    if by_category:
+        group_fields.append('category__name')
+    rows = list(rollups.values(*group_fields).annotate(**sums).order_by(*group_fields)) if group_fields else []
+    totals = rollups.aggregate(**sums)
+    
+    for row in rows + [totals]:
+        row['revenue'] = str(Decimal(row['revenue']).quantize(Decimal('0.01')))
+    
+    return Response({
+        'start': query['start'],
+        'end': query['end'],
+        'group_by': query['group_by'],
+        'totals': totals,
+        'rows': rows,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def export_dataset(request, dataset):
+    """Stream orders, order items or payments as CSV or NDJSON (admin only)"""
+    if request.user.role != 'admin':
+        return Response(
+            {'error': 'Only admins can export data'}, 
+            status=status.HTTP_403_FORBIDDEN
+        )
+    if dataset not in DATASETS:
+        return Response(
+            {'error': f"Unknown dataset. Choose from: {', '.join(DATASETS)}"}, 
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    serializer = ExportQuerySerializer(data=request.query_params, context={'dataset': dataset})
+    serializer.is_valid(raise_exception=True)
+    query = serializer.validated_data
+    
+    chunks = export_chunks(
+        dataset, query['output'], query['gzip'],
+        start=query.get('start'), end=query.get('end'), statuses=query['status'],
+    )
+    content_type = 'application/gzip' if query['gzip'] else OUTPUT_FORMATS[query['output']]
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = (
+        f'attachment; filename="{export_filename(dataset, query["output"], query["gzip"])}"'
+    )
+    return response
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def quote_batch(request):
+    """Price many baskets in one call; results come back in request order"""
+    serializer = BatchQuoteSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+    
+    results = quote_baskets(data['baskets'], pincode=data.get('pincode') or request.user.pincode)
+    for result in results:
+        for field, value in result.items():
+            if isinstance(value, Decimal):
+                result[field] = str(value)
+    return Response({'results': results})
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def pickup_slots(request):
+    """Pickup slots open for a pincode, grouped by day, with seats remaining"""
+    serializer = SlotAvailabilityQuerySerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    query = serializer.validated_data
+    
+    pincode = query.get('pincode') or request.user.pincode
+    if not pincode:
+        return Response(
+            {'error': 'A pincode is required'}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    first_day = query.get('date') or timezone.localdate()
+    return Response({'pincode': pincode, 'days': availability(pincode, first_day, query['days'])})
+
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+def payment_webhook(request, gateway):
+    """Accept a signed gateway webhook into the inbox; it is applied asynchronously"""
+    if gateway not in GATEWAYS:
+        return Response({'error': 'Unknown gateway'}, status=status.HTTP_404_NOT_FOUND)
+    
+    try:
+        created = receive_event(gateway, request.body, request.headers)
+    except WebhookError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({'status': 'received' if created else 'duplicate'})
@@ -0,0 +1,368 @@
+"""
+Payment gateway webhooks.
+
+The webhook endpoint only verifies the delivery's signature and appends it
+to the ``WebhookEvent`` inbox, keyed by gateway and event id so redeliveries
+are dropped, then queues ``process_webhook_events`` and returns. The task
+drains the inbox in batches: per batch, payments are looked up by
+transaction id in one query, updated with one ``bulk_update`` and their
+orders' payment status synced, in one transaction. Large payloads go to
+compressed blob storage (see orders.blobs).
+
+A captured payment only moves on to refunded and a refunded one stays
+refunded, so a late failure or cancellation event does not undo a capture.
+An event for a transaction id no payment has yet (the gateway can be
+faster than the checkout saving the payment) stays pending and is retried
+with backoff, ``WEBHOOK_RETRY_SECONDS`` doubling up to
+``WEBHOOK_MAX_ATTEMPTS`` attempts. Events that cannot be applied are kept
+with an ``error``; the admin's reprocess action puts them back in the queue.
+
+If the broker is unreachable the events wait in the inbox; the
+``process_webhooks`` command drains it by hand.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from kombu.exceptions import OperationalError
+
+from .blobs import prepare_payload, save_blobs
+from .models import Payment, WebhookEvent
+from .payments import group_by_value, sync_order_payment_statuses
+
+
+logger = logging.getLogger(__name__)
+
+# Set while a process_webhook_events run is queued, so a burst of
+# deliveries queues one run rather than one per event
+SCHEDULED_KEY = 'webhooks:scheduled'
+SCHEDULED_TIMEOUT = 60
+# Set while a delayed run for events waiting to be retried is queued
+RETRY_SCHEDULED_KEY = 'webhooks:retry-scheduled'
+
+# Payment status -> the only statuses later events may move it to;
+# payments in other statuses take any event
+SETTLED_STATUSES = {
+    'success': {'refunded'},
+    'refunded': set(),
+}
+
+
+class WebhookError(ValueError):
+    """A delivery that is not accepted (bad signature, malformed body)"""
+
+
+class Gateway:
+    """How one gateway signs its webhooks and what its events mean"""
+    
+    name = None
+    secret_setting = None
+    
+    @property
+    def secret(self):
+        return getattr(settings, self.secret_setting, '')
+    
+    def _hmac(self, message):
+        return hmac.new(self.secret.encode(), message, hashlib.sha256).hexdigest()
+    
+    def verify(self, body, headers):
+        """Raise ``WebhookError`` unless ``body`` was signed with the gateway secret"""
+        raise NotImplementedError
+    
+    def sign(self, body):
+        """Headers the gateway would send with ``body`` (used by orders.local_gateway)"""
+        raise NotImplementedError
+    
+    def event_id(self, payload, headers):
+        raise NotImplementedError
+    
+    def event_type(self, payload):
+        raise NotImplementedError
+    
+    def payment_update(self, event_type, payload):
+        """``(transaction_id, payment status, amount or None)`` for an event, or None to ignore it"""
+        raise NotImplementedError
+    
+    def build_event(self, event_id, transaction_id, status, amount):
+        """A webhook payload moving ``transaction_id`` to ``status`` (used by orders.local_gateway)"""
+        raise NotImplementedError
+
+
+class RazorpayGateway(Gateway):
+    """``X-Razorpay-Signature`` is the hex HMAC-SHA256 of the body; amounts are in paise"""
+    
+    name = 'razorpay'
+    secret_setting = 'RAZORPAY_WEBHOOK_SECRET'
+    
+    def verify(self, body, headers):
+        if not self.secret:
+            raise WebhookError('Razorpay webhooks are not configured')
+        if not hmac.compare_digest(self._hmac(body), headers.get('X-Razorpay-Signature', '')):
+            raise WebhookError('Invalid signature')
+    
+    def sign(self, body):
+        return {'X-Razorpay-Signature': self._hmac(body)}
+    
+    def event_id(self, payload, headers):
+        return headers.get('X-Razorpay-Event-Id') or payload.get('id', '')
+    
+    def event_type(self, payload):
+        return payload.get('event', '')
+    
+    def payment_update(self, event_type, payload):
+        if event_type == 'payment.captured':
+            payment = payload['payload']['payment']['entity']
+            return payment['id'], 'success', Decimal(payment['amount']) / 100
+        if event_type == 'payment.failed':
+            return payload['payload']['payment']['entity']['id'], 'failed', None
+        if event_type == 'refund.processed':
+            return payload['payload']['refund']['entity']['payment_id'], 'refunded', None
+        return None
+    
+    def build_event(self, event_id, transaction_id, status, amount):
+        paise = int(amount * 100)
+        if status == 'refunded':
+            entity = {'refund': {'entity': {'id': f'rfnd_{event_id}', 'payment_id': transaction_id, 'amount': paise}}}
+            return {'id': event_id, 'event': 'refund.processed', 'payload': entity}
+        entity = {'payment': {'entity': {'id': transaction_id, 'amount': paise, 'currency': 'INR', 'status': status}}}
+        event = 'payment.captured' if status == 'success' else 'payment.failed'
+        return {'id': event_id, 'event': event, 'payload': entity}
+
+
+class StripeGateway(Gateway):
+    """``Stripe-Signature: t=<timestamp>,v1=<hmac>`` over ``<timestamp>.<body>``; amounts in the minor unit"""
+    
+    name = 'stripe'
+    secret_setting = 'STRIPE_WEBHOOK_SECRET'
+    tolerance = 300  # seconds
+    
+    EVENT_STATUSES = {
+        'payment_intent.succeeded': 'success',
+        'payment_intent.payment_failed': 'failed',
+        'payment_intent.canceled': 'cancelled',
+    }
+    
+    def verify(self, body, headers):
+        if not self.secret:
+            raise WebhookError('Stripe webhooks are not configured')
+        parts = defaultdict(list)
+        for item in headers.get('Stripe-Signature', '').split(','):
+            key, _, value = item.partition('=')
+            parts[key.strip()].append(value.strip())
+        try:
+            timestamp = int(parts['t'][0])
+        except (IndexError, ValueError):
+            raise WebhookError('Invalid signature')
+        if abs(time.time() - timestamp) > self.tolerance:
+            raise WebhookError('Signature timestamp outside the tolerance')
+        expected = self._hmac(f'{timestamp}.'.encode() + body)
+        if not any(hmac.compare_digest(expected, signature) for signature in parts['v1']):
+            raise WebhookError('Invalid signature')
+    
+    def sign(self, body):
+        timestamp = int(time.time())
+        return {'Stripe-Signature': f't={timestamp},v1={self._hmac(f"{timestamp}.".encode() + body)}'}
+    
+    def event_id(self, payload, headers):
+        return payload.get('id', '')
+    
+    def event_type(self, payload):
+        return payload.get('type', '')
+    
+    def payment_update(self, event_type, payload):
+        intent = payload['data']['object']
+        if event_type == 'payment_intent.succeeded':
+            return intent['id'], 'success', Decimal(intent['amount_received']) / 100
+        if event_type in self.EVENT_STATUSES:
+            return intent['id'], self.EVENT_STATUSES[event_type], None
+        if event_type == 'charge.refunded':
+            return intent['payment_intent'], 'refunded', None
+        return None
+    
+    def build_event(self, event_id, transaction_id, status, amount):
+        cents = int(amount * 100)
+        if status == 'refunded':
+            charge = {'id': f'ch_{event_id}', 'object': 'charge', 'payment_intent': transaction_id, 'amount_refunded': cents}
+            return {'id': event_id, 'type': 'charge.refunded', 'data': {'object': charge}}
+        event_type = {value: key for key, value in self.EVENT_STATUSES.items()}[status]
+        intent = {'id': transaction_id, 'object': 'payment_intent', 'amount': cents,
+                  'amount_received': cents if status == 'success' else 0, 'currency': 'inr'}
+        return {'id': event_id, 'type': event_type, 'data': {'object': intent}}
+
+
+GATEWAYS = {gateway.name: gateway for gateway in (RazorpayGateway(), StripeGateway())}
+
+
+def receive_event(gateway_name, body, headers):
+    """Verify and store one delivery; returns False if the event was already received"""
+    gateway = GATEWAYS[gateway_name]
+    gateway.verify(body, headers)
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise WebhookError('Malformed JSON body')
+    if not isinstance(payload, dict):
+        raise WebhookError('Malformed JSON body')
+    
+    event_id = gateway.event_id(payload, headers) or hashlib.sha256(body).hexdigest()
+    try:
+        with transaction.atomic():
+            WebhookEvent.objects.create(
+                gateway=gateway_name, event_id=event_id, event_type=gateway.event_type(payload), payload=payload,
+            )
+    except IntegrityError:
+        return False
+    transaction.on_commit(schedule_processing)
+    return True
+
+
+def schedule_processing():
+    """Queue process_webhook_events unless a run is already queued"""
+    if not cache.add(SCHEDULED_KEY, 1, SCHEDULED_TIMEOUT):
+        return
+    from .tasks import process_webhook_events
+    try:
+        process_webhook_events.apply_async(retry=False)
+    except OperationalError:
+        # The key stays set, so the rest of a burst does not wait on the broker too
+        logger.exception('Could not queue webhook processing; run process_webhooks to apply pending events')
+
+
+def schedule_retry(retry_at):
+    """Queue a process_webhook_events run for ``retry_at`` unless a delayed run is already queued"""
+    delay = max(int((retry_at - timezone.now()).total_seconds()) + 1, 1)
+    if not cache.add(RETRY_SCHEDULED_KEY, 1, delay):
+        return
+    from .tasks import process_webhook_events
+    try:
+        process_webhook_events.apply_async(countdown=delay, retry=False)
+    except OperationalError:
+        logger.exception('Could not queue a webhook retry; run process_webhooks to apply pending events')
+
+
+def retry_delay(attempts):
+    """How long an event waits after its ``attempts``-th failed attempt"""
+    return timedelta(seconds=getattr(settings, 'WEBHOOK_RETRY_SECONDS', 60) * 2 ** (attempts - 1))
+
+
+def reprocess_events(queryset):
+    """Put processed or waiting events back in the queue; returns how many"""
+    count = queryset.update(processed_at=None, retry_at=None, attempts=0, error='')
+    if count:
+        transaction.on_commit(schedule_processing)
+    return count
+
+
+def apply_events(events):
+    """Apply inbox ``events`` (in id order) to payments and orders; call inside a transaction"""
+    outcomes = Counter()
+    errors = {}
+    # Events to try again later (unknown transaction), with their error
+    retries = {}
+    updates = []
+    for event in events:
+        try:
+            update = GATEWAYS[event.gateway].payment_update(event.event_type, event.payload)
+        except (KeyError, TypeError, ValueError, ArithmeticError) as exc:
+            errors[event.pk] = f'Malformed payload: {exc!r}'
+            continue
+        if update is None:
+            outcomes['ignored'] += 1
+        else:
+            updates.append((event, *update))
+    
+    payments = defaultdict(list)
+    for payment in Payment.objects.filter(
+        transaction_id__in={transaction_id for _, transaction_id, _, _ in updates}
+    ).order_by().only('id', 'order_id', 'transaction_id', 'amount', 'status'):
+        payments[payment.transaction_id].append(payment)
+    
+    now = timezone.now()
+    changed = {}
+    blobs = {}
+    order_statuses = {}
+    for event, transaction_id, status, amount in updates:
+        matches = payments.get(transaction_id, [])
+        if not matches:
+            retries[event] = f'Unknown transaction {transaction_id}'
+            continue
+        if len(matches) != 1:
+            errors[event.pk] = f'Ambiguous transaction {transaction_id}'
+            continue
+        payment = matches[0]
+        if amount is not None and amount != payment.amount:
+            errors[event.pk] = f'Amount {amount} does not match payment amount {payment.amount}'
+            continue
+        allowed = SETTLED_STATUSES.get(payment.status)
+        if allowed is not None and status != payment.status and status not in allowed:
+            outcomes['stale'] += 1
+            continue
+        payment.status = status
+        payment.payment_gateway_response, blob = prepare_payload(event.payload)
+        payment.gateway_payload_id = blob.pk if blob is not None else None
+        if blob is not None:
+            blobs[blob.pk] = blob
+        payment.updated_at = now
+        changed[payment.pk] = payment
+        order_statuses[payment.order_id] = status
+        outcomes['applied'] += 1
+    
+    if changed:
+        save_blobs(list(blobs.values()))
+        Payment.objects.bulk_update(
+            changed.values(), ['status', 'payment_gateway_response', 'gateway_payload', 'updated_at']
+        )
+        sync_order_payment_statuses(order_statuses)
+    
+    max_attempts = getattr(settings, 'WEBHOOK_MAX_ATTEMPTS', 8)
+    waiting = {}
+    for event, error in retries.items():
+        event.attempts += 1
+        event.error = error
+        if event.attempts >= max_attempts:
+            errors[event.pk] = error
+        else:
+            event.retry_at = now + retry_delay(event.attempts)
+            waiting[event.pk] = event
+    if retries:
+        WebhookEvent.objects.bulk_update(retries, ['attempts', 'error', 'retry_at'])
+    if waiting:
+        retry_at = min(event.retry_at for event in waiting.values())
+        transaction.on_commit(lambda: schedule_retry(retry_at))
+        outcomes['retrying'] += len(waiting)
+    
+    WebhookEvent.objects.filter(
+        pk__in=[event.pk for event in events if event.pk not in errors and event.pk not in waiting]
+    ).update(processed_at=now, retry_at=None, error='')
+    for error, ids in group_by_value(errors).items():
+        WebhookEvent.objects.filter(pk__in=ids).update(processed_at=now, retry_at=None, error=error)
+    outcomes['failed'] += len(errors)
+    return outcomes
+
+
+def process_pending_events(batch_size=None):
+    """Apply pending inbox events batch by batch; returns a Counter of outcomes"""
+    cache.delete(SCHEDULED_KEY)
+    batch_size = batch_size or getattr(settings, 'WEBHOOK_BATCH_SIZE', 500)
+    totals = Counter()
+    while True:
+        with transaction.atomic():
+            events = list(
+                WebhookEvent.objects.select_for_update(skip_locked=True)
+                .filter(Q(retry_at__isnull=True) | Q(retry_at__lte=timezone.now()), processed_at__isnull=True)
+                .order_by('id')[:batch_size]
+            )
+            if not events:
+                break
+            totals.update(apply_events(events))
+    return totals
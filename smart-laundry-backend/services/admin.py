@@ -26,6 +26,8 @@ class ServiceAdmin(admin.ModelAdmin):
     list_filter = ('category', 'is_active', 'created_at')
     search_fields = ('name', 'description', 'category__name')
     ordering = ('category', 'name')
+    readonly_fields = ('rating_count', 'rating_sum', 'rating_1_count', 'rating_2_count',
+                       'rating_3_count', 'rating_4_count', 'rating_5_count')
     inlines = [ServiceOptionInline, ServiceImageInline]
 
 
@@ -50,4 +52,22 @@ class ServiceReviewAdmin(admin.ModelAdmin):
     list_display = ('user', 'service', 'rating', 'is_approved', 'created_at')
     list_filter = ('rating', 'is_approved', 'created_at')
     search_fields = ('user__email', 'service__name', 'comment')
-    ordering = ('-created_at',)
\ No newline at end of file
+    ordering = ('-created_at',)
+    actions = ['approve_reviews', 'unapprove_reviews']
+    
+    def _set_approval(self, request, queryset, approved):
+        # Save row by row so the rating aggregate signals fire
+        changed = 0
+        for review in queryset.exclude(is_approved=approved):
+            review.is_approved = approved
+            review.save(update_fields=['is_approved', 'updated_at'])
+            changed += 1
+        self.message_user(request, f'{changed} review(s) updated.')
+    
+    @admin.action(description='Approve selected reviews')
+    def approve_reviews(self, request, queryset):
+        self._set_approval(request, queryset, True)
+    
+    @admin.action(description='Unapprove selected reviews')
+    def unapprove_reviews(self, request, queryset):
+        self._set_approval(request, queryset, False)
\ No newline at end of file
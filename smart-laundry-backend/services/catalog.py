@@ -0,0 +1,107 @@
+"""
+Materialized catalog documents for the public services endpoints.
+
+The full category -> service -> option/image tree (``/catalog/``) and the
+unfiltered category and service listings are rendered to JSON once per
+catalog version and kept in the cache together with their ETags, so
+steady-state requests touch neither the serializers nor, apart from the
+version check, the database.
+
+The catalog version is a fingerprint of the catalog tables (row counts,
+latest ids and modification times) read from the database. Each worker
+keeps it for ``CATALOG_VERSION_CHECK_SECONDS``, so an admin edit reaches
+every worker within that time even when the cache is per process; edits
+made through this process also drop the version at once (see
+services.signals). Documents expire after ``CATALOG_CACHE_SECONDS`` as well,
+which picks up changes the fingerprint cannot see, such as a reviewer
+renaming their account.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max, Prefetch, Q, Sum
+
+from .models import ServiceCategory, Service, ServiceOption, ServiceImage, ServiceReview
+
+
+CATALOG_VERSION_KEY = 'services:catalog:version'
+CATALOG_DOCUMENT_KEY = 'services:catalog:document:{name}:{version}'
+
+# Aggregates whose change means the published catalog changed
+FINGERPRINTS = (
+    (ServiceCategory, {'latest': Max('updated_at')}),
+    (Service, {'latest': Max('updated_at'), 'ratings': Sum('rating_count'), 'rating_sum': Sum('rating_sum')}),
+    (ServiceOption, {'latest': Max('updated_at')}),
+    (ServiceImage, {'latest': Max('created_at')}),
+    (ServiceReview, {'latest': Max('updated_at')}),
+)
+
+
+def version_check_seconds():
+    return getattr(settings, 'CATALOG_VERSION_CHECK_SECONDS', 5)
+
+
+def document_timeout():
+    return getattr(settings, 'CATALOG_CACHE_SECONDS', 600)
+
+
+def compute_catalog_version():
+    """Fingerprint of the catalog tables as they are in the database"""
+    state = [
+        model.objects.order_by().aggregate(count=Count('pk'), last_id=Max('pk'), **aggregates)
+        for model, aggregates in FINGERPRINTS
+    ]
+    return hashlib.sha1(json.dumps(state, cls=DjangoJSONEncoder).encode()).hexdigest()[:16]
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        version = compute_catalog_version()
+        cache.set(CATALOG_VERSION_KEY, version, timeout=version_check_seconds())
+    return version
+
+
+def bump_catalog_version():
+    """Make the next request re-read the catalog version"""
+    cache.delete(CATALOG_VERSION_KEY)
+
+
+def build_catalog_document(version):
+    """Render the active catalog to JSON bytes"""
+    from .serializers import ServiceCategorySerializer
+    
+    services = Service.objects.filter(is_active=True).prefetch_related('options', 'images', 'reviews__user')
+    categories = (
+        ServiceCategory.objects.filter(is_active=True)
+        .annotate(active_service_count=Count('services', filter=Q(services__is_active=True)))
+        .prefetch_related(Prefetch('services', queryset=services))
+    )
+    document = {
+        'version': version,
+        'categories': ServiceCategorySerializer(categories, many=True).data,
+    }
+    return json.dumps(document, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8')
+
+
+def get_snapshot(name, render):
+    """Return ``(etag, body)`` of document ``name`` for the current catalog version
+    
+    ``render(version)`` builds the body (JSON bytes) on a miss.
+    """
+    version = get_catalog_version()
+    key = CATALOG_DOCUMENT_KEY.format(name=name, version=version)
+    cached = cache.get(key)
+    if cached is None:
+        body = render(version)
+        cached = (f'"{version}-{hashlib.sha1(body).hexdigest()[:16]}"', body)
+        cache.set(key, cached, timeout=document_timeout())
+    return cached
+
+
+def get_catalog():
+    """Return ``(etag, body)`` for the full catalog document"""
+    return get_snapshot('catalog', build_catalog_document)
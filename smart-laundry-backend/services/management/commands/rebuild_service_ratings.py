@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from services.catalog import bump_catalog_version
+from services.models import Service, ServiceReview
+
+
+RATING_FIELDS = ['rating_count', 'rating_sum'] + [f'rating_{stars}_count' for stars in range(1, 6)]
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized review aggregates stored on each service'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of services written per UPDATE batch')
+
+    def handle(self, *args, **options):
+        aggregates = {
+            'rating_count': Count('id'),
+            'rating_sum': Sum('rating'),
+        }
+        for stars in range(1, 6):
+            aggregates[f'rating_{stars}_count'] = Count('id', filter=Q(rating=stars))
+        
+        rows = (
+            ServiceReview.objects.filter(is_approved=True)
+            .order_by()
+            .values('service_id')
+            .annotate(**aggregates)
+        )
+        totals = {row.pop('service_id'): row for row in rows}
+        
+        services = list(Service.objects.only('id', *RATING_FIELDS))
+        for service in services:
+            row = totals.get(service.id, {})
+            for field in RATING_FIELDS:
+                setattr(service, field, row.get(field) or 0)
+        
+        with transaction.atomic():
+            Service.objects.bulk_update(services, RATING_FIELDS, batch_size=options['batch_size'])
+            transaction.on_commit(bump_catalog_version)
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt rating aggregates for {len(services)} services '
+            f'({sum(row["rating_count"] for row in totals.values())} approved reviews)'
+        ))
@@ -0,0 +1,59 @@
+from django.db import migrations
+
+
+# Full-text tables of the services search indexes (services/search_indexes.py)
+# as they were when this migration was written: table -> (model, fields)
+SEARCH_TABLES = {
+    'search_services_service': ('Service', ['name', 'description', 'category__name']),
+    'search_services_serviceoption': ('ServiceOption', ['name', 'service__name']),
+    'search_services_servicereview': ('ServiceReview', ['comment', 'service__name', 'user__email']),
+}
+CHUNK_SIZE = 2000
+
+
+def create_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table, (model_name, fields) in SEARCH_TABLES.items():
+            columns = [field.replace('__', '_') for field in fields]
+            column_list = ', '.join(f'"{column}"' for column in columns)
+            # Replaces tables created on first use before this migration existed
+            cursor.execute(f'DROP TABLE IF EXISTS "{table}"')
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE "{table}" '
+                f'USING fts5({column_list}, tokenize="unicode61 remove_diacritics 2")'
+            )
+            insert = (
+                f'INSERT INTO "{table}" (rowid, {column_list}) '
+                f'VALUES ({", ".join(["%s"] * (len(columns) + 1))})'
+            )
+            model = apps.get_model('services', model_name)
+            rows = model.objects.order_by().values_list('pk', *fields).iterator(chunk_size=CHUNK_SIZE)
+            chunk = []
+            for pk, *values in rows:
+                chunk.append((pk, *('' if value is None else str(value) for value in values)))
+                if len(chunk) >= CHUNK_SIZE:
+                    cursor.executemany(insert, chunk)
+                    chunk = []
+            if chunk:
+                cursor.executemany(insert, chunk)
+
+
+def drop_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table in SEARCH_TABLES:
+            cursor.execute(f'DROP TABLE IF EXISTS "{table}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0002_service_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_tables, drop_search_tables),
+    ]
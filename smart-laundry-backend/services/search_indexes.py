@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.apps import apps
+
+from core import search
+from .models import ServiceCategory, Service, ServiceOption, ServiceReview
+
+
+search.register(
+    Service,
+    fields=['name', 'description', 'category__name'],
+    weights={'name': 10, 'category__name': 4},
+    related={ServiceCategory: 'category'},
+)
+
+search.register(
+    ServiceOption,
+    fields=['name', 'service__name'],
+    weights={'name': 4},
+    related={Service: 'service'},
+)
+
+search.register(
+    ServiceReview,
+    fields=['comment', 'service__name', 'user__email'],
+    related={Service: 'service', apps.get_model(settings.AUTH_USER_MODEL): 'user'},
+)
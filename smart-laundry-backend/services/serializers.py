@@ -32,24 +32,17 @@ class ServiceSerializer(serializers.ModelSerializer):
     options = ServiceOptionSerializer(many=True, read_only=True)
     images = ServiceImageSerializer(many=True, read_only=True)
     reviews = ServiceReviewSerializer(many=True, read_only=True)
-    average_rating = serializers.SerializerMethodField()
-    review_count = serializers.SerializerMethodField()
+    average_rating = serializers.ReadOnlyField()
+    review_count = serializers.IntegerField(source='rating_count', read_only=True)
+    rating_histogram = serializers.ReadOnlyField()
     
     class Meta:
         model = Service
         fields = ('id', 'name', 'emoji', 'description', 'price', 'estimated_time', 
                  'is_active', 'options', 'images', 'reviews', 'average_rating', 
-                 'review_count', 'created_at')
+                 'review_count', 'rating_histogram', 'created_at')
         read_only_fields = ('id', 'created_at')
-    
-    def get_average_rating(self, obj):
-        reviews = obj.reviews.filter(is_approved=True)
-        if reviews.exists():
-            return round(sum(review.rating for review in reviews) / reviews.count(), 1)
-        return 0
-    
-    def get_review_count(self, obj):
-        return obj.reviews.filter(is_approved=True).count()
+
 
 
 class ServiceCategorySerializer(serializers.ModelSerializer):
@@ -63,6 +56,9 @@ class ServiceCategorySerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created_at')
     
     def get_service_count(self, obj):
+        # Annotated by ServiceCategoryViewSet; nested categories fall back to a query
+        if hasattr(obj, 'active_service_count'):
+            return obj.active_service_count
         return obj.services.filter(is_active=True).count()
 
 
@@ -71,21 +67,13 @@ class ServiceDetailSerializer(serializers.ModelSerializer):
     options = ServiceOptionSerializer(many=True, read_only=True)
     images = ServiceImageSerializer(many=True, read_only=True)
     reviews = ServiceReviewSerializer(many=True, read_only=True)
-    average_rating = serializers.SerializerMethodField()
-    review_count = serializers.SerializerMethodField()
+    average_rating = serializers.ReadOnlyField()
+    review_count = serializers.IntegerField(source='rating_count', read_only=True)
+    rating_histogram = serializers.ReadOnlyField()
     
     class Meta:
         model = Service
         fields = ('id', 'category', 'name', 'emoji', 'description', 'price', 
                  'estimated_time', 'is_active', 'options', 'images', 'reviews', 
-                 'average_rating', 'review_count', 'created_at')
+                 'average_rating', 'review_count', 'rating_histogram', 'created_at')
         read_only_fields = ('id', 'created_at')
-    
-    def get_average_rating(self, obj):
-        reviews = obj.reviews.filter(is_approved=True)
-        if reviews.exists():
-            return round(sum(review.rating for review in reviews) / reviews.count(), 1)
-        return 0
-    
-    def get_review_count(self, obj):
-        return obj.reviews.filter(is_approved=True).count()
\ No newline at end of file
@@ -0,0 +1,76 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_init, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from .catalog import bump_catalog_version
+from .models import ServiceCategory, Service, ServiceOption, ServiceImage, ServiceReview
+
+
+REVIEW_FIELDS = ('service_id', 'rating', 'is_approved')
+
+# State of a review loaded with those fields deferred; reading them in
+# post_init would load another instance, and so on
+UNTRACKED = object()
+
+
+def _review_state(review):
+    """Aggregate-relevant fields of a review, or None if it does not count"""
+    if review.pk is None:
+        return None
+    if review.get_deferred_fields() & set(REVIEW_FIELDS):
+        return UNTRACKED
+    if not review.is_approved:
+        return None
+    return (review.service_id, review.rating)
+
+
+def apply_rating_delta(service_id, rating, sign):
+    """Add (sign=1) or remove (sign=-1) one rating from a service's aggregates"""
+    Service.objects.filter(pk=service_id).update(**{
+        'rating_count': F('rating_count') + sign,
+        'rating_sum': F('rating_sum') + sign * rating,
+        f'rating_{rating}_count': F(f'rating_{rating}_count') + sign,
+    })
+    # Ratings are part of the published catalog document
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver([post_save, post_delete], sender=ServiceCategory)
+@receiver([post_save, post_delete], sender=Service)
+@receiver([post_save, post_delete], sender=ServiceOption)
+@receiver([post_save, post_delete], sender=ServiceImage)
+def invalidate_catalog(sender, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_init, sender=ServiceReview)
+def remember_review_state(sender, instance, **kwargs):
+    instance._rating_state = _review_state(instance)
+
+
+@receiver(post_save, sender=ServiceReview)
+def update_rating_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old_state = instance._rating_state
+    new_state = _review_state(instance)
+    if UNTRACKED not in (old_state, new_state) and old_state != new_state:
+        if old_state:
+            apply_rating_delta(*old_state, sign=-1)
+        if new_state:
+            apply_rating_delta(*new_state, sign=1)
+    instance._rating_state = new_state
+
+
+@receiver(pre_delete, sender=ServiceReview)
+def load_deleted_review_state(sender, instance, **kwargs):
+    if instance._rating_state is UNTRACKED:
+        instance.refresh_from_db(fields=REVIEW_FIELDS)
+        instance._rating_state = _review_state(instance)
+
+
+@receiver(post_delete, sender=ServiceReview)
+def update_rating_on_delete(sender, instance, **kwargs):
+    if instance._rating_state:
+        apply_rating_delta(*instance._rating_state, sign=-1)
+        instance._rating_state = None
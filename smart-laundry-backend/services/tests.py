@@ -1,3 +1,152 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .catalog import CATALOG_VERSION_KEY
+from .models import ServiceCategory, Service, ServiceReview
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username='reviewer', email='reviewer@example.com', phone='+919999900001', password='x'
+        )
+        category = ServiceCategory.objects.create(name='Dry Cleaning')
+        self.service = Service.objects.create(
+            category=category, name='Suit', price=10, estimated_time=timedelta(hours=2)
+        )
+        ServiceReview.objects.create(service=self.service, user=self.user, rating=5, comment='Spotless', is_approved=True)
+    
+    def search(self, url, query):
+        return [row['id'] for row in self.client.get(url, {'search': query}).json()['results']]
+    
+    def test_search_uses_the_migrated_tables(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.search('/api/services/services/', 'dry clean'), [self.service.pk])
+        self.assertFalse(any('CREATE' in query['sql'] for query in queries))
+    
+    def test_related_rename_reindexes_dependents(self):
+        self.service.category.name = 'Wet Wash'
+        self.service.category.save()
+        self.assertEqual(self.search('/api/services/services/', 'wet'), [self.service.pk])
+        self.assertEqual(self.search('/api/services/services/', 'dry'), [])
+    
+    def test_login_does_not_reindex_reviews(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.user.last_login = timezone.now()
+            self.user.save(update_fields=['last_login'])
+        self.assertEqual(len(queries), 1)
+        
+        self.user.email = 'critic@example.com'
+        self.user.save()
+        self.assertEqual(len(self.search('/api/services/reviews/', 'critic')), 1)
+
+
+class CatalogSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        category = ServiceCategory.objects.create(name='Dry Cleaning')
+        self.service = Service.objects.create(
+            category=category, name='Suit', price=10, estimated_time=timedelta(hours=2)
+        )
+    
+    def test_unfiltered_listings_are_served_from_the_snapshot(self):
+        for url in ('/api/services/catalog/', '/api/services/categories/', '/api/services/services/'):
+            etag = self.client.get(url)['ETag']
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            self.assertEqual(len(queries), 0, url)
+    
+    def test_filtered_listing_is_not_cached(self):
+        response = self.client.get('/api/services/services/', {'category': self.service.category_id})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+    
+    def test_edit_is_published_on_commit(self):
+        etag = self.client.get('/api/services/services/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.price = 12
+            self.service.save()
+        response = self.client.get('/api/services/services/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['price'], '12.00')
+    
+    def test_edit_by_another_worker_is_seen_after_the_version_check(self):
+        self.client.get('/api/services/catalog/')
+        # No signal runs here, as for an edit saved by another process
+        Service.objects.filter(pk=self.service.pk).update(
+            price=13, updated_at=self.service.updated_at + timedelta(seconds=1)
+        )
+        cache.delete(CATALOG_VERSION_KEY)  # what CATALOG_VERSION_CHECK_SECONDS does
+        catalog = self.client.get('/api/services/catalog/').json()
+        self.assertEqual(catalog['categories'][0]['services'][0]['price'], '13.00')
+
 
-# Create your tests here.
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        category = ServiceCategory.objects.create(name='Wash')
+        self.shirt = Service.objects.create(category=category, name='Shirt', price=20, estimated_time=timedelta(hours=4))
+        self.suit = Service.objects.create(category=category, name='Suit', price=150, estimated_time=timedelta(hours=24))
+        self.users = [
+            get_user_model().objects.create_user(
+                username=f'reviewer{n}', email=f'reviewer{n}@example.com', phone=f'+91999990010{n}', password='x'
+            )
+            for n in range(3)
+        ]
+    
+    def aggregates(self, service):
+        service.refresh_from_db()
+        return service.rating_count, service.rating_sum, service.rating_histogram
+    
+    def assertMatchesReviews(self, service):
+        reviews = ServiceReview.objects.filter(service=service, is_approved=True)
+        histogram = {stars: reviews.filter(rating=stars).count() for stars in range(1, 6)}
+        expected = (reviews.count(), sum(review.rating for review in reviews), histogram)
+        self.assertEqual(self.aggregates(service), expected)
+    
+    def test_only_approved_reviews_count(self):
+        review = ServiceReview.objects.create(service=self.shirt, user=self.users[0], rating=4)
+        self.assertEqual(self.aggregates(self.shirt)[:2], (0, 0))
+        review.is_approved = True
+        review.save()
+        self.assertEqual(self.aggregates(self.shirt)[:2], (1, 4))
+        self.assertEqual(self.shirt.average_rating, 4)
+    
+    def test_edits_moves_and_deletes_keep_the_aggregates(self):
+        reviews = [
+            ServiceReview.objects.create(service=self.shirt, user=user, rating=rating, is_approved=True)
+            for user, rating in zip(self.users, (5, 3, 1))
+        ]
+        reviews[0].rating = 2
+        reviews[0].save()
+        
+        moved = ServiceReview.objects.get(pk=reviews[1].pk)
+        moved.service = self.suit
+        moved.save()
+        
+        reviews[2].is_approved = False
+        reviews[2].save()
+        ServiceReview.objects.get(pk=reviews[0].pk).delete()
+        
+        self.assertMatchesReviews(self.shirt)
+        self.assertMatchesReviews(self.suit)
+        self.assertEqual(self.aggregates(self.suit)[:2], (1, 3))
+    
+    def test_partially_loaded_reviews(self):
+        ServiceReview.objects.create(service=self.shirt, user=self.users[0], rating=5, is_approved=True)
+        review = ServiceReview.objects.only('comment').get()
+        review.comment = 'Crisp'
+        review.save(update_fields=['comment'])
+        self.assertMatchesReviews(self.shirt)
+        
+        ServiceReview.objects.only('comment').get().delete()
+        self.assertEqual(self.aggregates(self.shirt)[:2], (0, 0))
@@ -9,5 +9,6 @@ router.register(r'options', views.ServiceOptionViewSet)
 router.register(r'reviews', views.ServiceReviewViewSet)
 
 urlpatterns = [
+    path('catalog/', views.CatalogView.as_view(), name='service-catalog'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
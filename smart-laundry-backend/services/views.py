@@ -1,7 +1,14 @@
 from rest_framework import viewsets, status, permissions, filters
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.http import HttpResponse
+from django.utils.http import parse_etags
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db.models import Count, Q
+from core.search import FullTextSearchFilter
+from .catalog import get_catalog, get_snapshot
 from .models import ServiceCategory, Service, ServiceOption, ServiceImage, ServiceReview
 from .serializers import (
     ServiceCategorySerializer, ServiceSerializer, ServiceDetailSerializer,
@@ -9,9 +16,54 @@ from .serializers import (
 )
 
 
-class ServiceCategoryViewSet(viewsets.ReadOnlyModelViewSet):
+# Nested relations rendered by ServiceSerializer, prefetched so listings cost a
+# fixed number of queries regardless of how many services or reviews exist.
+SERVICE_PREFETCHES = ('options', 'images', 'reviews__user')
+
+
+def snapshot_response(request, etag, body):
+    """``body`` with its ETag, or 304 when the client already has it"""
+    client_etags = [tag.removeprefix('W/') for tag in parse_etags(request.headers.get('If-None-Match', ''))]
+    
+    if etag in client_etags or '*' in client_etags:
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, no-cache'
+    return response
+
+
+class SnapshotListMixin:
+    """Serve the unfiltered JSON listing (any ``?page=``) from the catalog snapshot cache
+    
+    Filtered, searched or reordered listings, and the browsable API, go
+    through the normal list path.
+    """
+    snapshot_name = None
+    snapshot_params = {'page'}
+    
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json' or not set(request.query_params) <= self.snapshot_params:
+            return super().list(request, *args, **kwargs)
+        
+        def render(version):
+            response = super(SnapshotListMixin, self).list(request, *args, **kwargs)
+            return JSONRenderer().render(response.data)
+        
+        # Pagination links are absolute, so the host is part of the document
+        name = f'{self.snapshot_name}:{request.get_host()}:{request.query_params.get("page", "1")}'
+        etag, body = get_snapshot(name, render)
+        return snapshot_response(request, etag, body)
+
+
+class ServiceCategoryViewSet(SnapshotListMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for service categories"""
-    queryset = ServiceCategory.objects.filter(is_active=True)
+    snapshot_name = 'categories'
+    queryset = ServiceCategory.objects.filter(is_active=True).annotate(
+        active_service_count=Count('services', filter=Q(services__is_active=True))
+    ).prefetch_related(*(f'services__{name}' for name in SERVICE_PREFETCHES))
     serializer_class = ServiceCategorySerializer
     permission_classes = [permissions.AllowAny]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -23,22 +75,31 @@ class ServiceCategoryViewSet(viewsets.ReadOnlyModelViewSet):
     def services(self, request, pk=None):
         """Get all services for a specific category"""
         category = self.get_object()
-        services = category.services.filter(is_active=True)
+        services = category.services.filter(is_active=True).prefetch_related(*SERVICE_PREFETCHES)
         serializer = ServiceSerializer(services, many=True, context={'request': request})
         return Response(serializer.data)
 
 
-class ServiceViewSet(viewsets.ReadOnlyModelViewSet):
+class ServiceViewSet(SnapshotListMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for services"""
-    queryset = Service.objects.filter(is_active=True)
+    snapshot_name = 'services'
+    queryset = Service.objects.filter(is_active=True).prefetch_related(*SERVICE_PREFETCHES)
     serializer_class = ServiceSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, FullTextSearchFilter]
     filterset_fields = ['category', 'category__name']
     search_fields = ['name', 'description', 'category__name']
     ordering_fields = ['name', 'price', 'created_at']
     ordering = ['category', 'name']
     
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'retrieve':
+            queryset = queryset.select_related('category').prefetch_related(
+                *(f'category__services__{name}' for name in SERVICE_PREFETCHES)
+            )
+        return queryset
+    
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return ServiceDetailSerializer
@@ -48,7 +109,7 @@ class ServiceViewSet(viewsets.ReadOnlyModelViewSet):
     def reviews(self, request, pk=None):
         """Get reviews for a specific service"""
         service = self.get_object()
-        reviews = service.reviews.filter(is_approved=True)
+        reviews = service.reviews.filter(is_approved=True).select_related('user')
         serializer = ServiceReviewSerializer(reviews, many=True)
         return Response(serializer.data)
     
@@ -77,7 +138,7 @@ class ServiceOptionViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = ServiceOption.objects.filter(is_active=True)
     serializer_class = ServiceOptionSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, FullTextSearchFilter]
     filterset_fields = ['service', 'service__category']
     search_fields = ['name', 'service__name']
     ordering_fields = ['name', 'price', 'created_at']
@@ -86,11 +147,21 @@ class ServiceOptionViewSet(viewsets.ReadOnlyModelViewSet):
 
 class ServiceReviewViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for service reviews"""
-    queryset = ServiceReview.objects.filter(is_approved=True)
+    queryset = ServiceReview.objects.filter(is_approved=True).select_related('user')
     serializer_class = ServiceReviewSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, FullTextSearchFilter]
     filterset_fields = ['service', 'rating', 'user']
     search_fields = ['comment', 'service__name', 'user__email']
     ordering_fields = ['rating', 'created_at']
-    ordering = ['-created_at']
\ No newline at end of file
+    ordering = ['-created_at']
+
+
+class CatalogView(APIView):
+    """Full public catalog served from the versioned snapshot"""
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+    
+    def get(self, request):
+        etag, body = get_catalog()
+        return snapshot_response(request, etag, body)
\ No newline at end of file
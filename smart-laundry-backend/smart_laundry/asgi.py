@@ -2,6 +2,8 @@
 ASGI config for smart_laundry project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it (e.g. ``uvicorn smart_laundry.asgi:application``) to stream
+``/api/orders/stream/`` as server-sent events.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -0,0 +1,17 @@
+"""
+Celery application for smart_laundry.
+
+Configured from the ``CELERY_*`` Django settings; tasks are discovered in
+each app's ``tasks`` module. Start a worker with::
+
+    celery -A smart_laundry worker -l info
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smart_laundry.settings')
+
+app = Celery('smart_laundry')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -97,6 +97,26 @@ DATABASES = {
 }
 
 
+# Cache
+# Use a shared backend (e.g. django.core.cache.backends.redis.RedisCache) in
+# production so cached documents and version counters are seen by every worker.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='smart-laundry'),
+    }
+}
+
+# Public catalog snapshots (services.catalog): how often each worker re-reads
+# the catalog version from the database, and how long a document is kept
+CATALOG_VERSION_CHECK_SECONDS = config('CATALOG_VERSION_CHECK_SECONDS', default=5, cast=int)
+CATALOG_CACHE_SECONDS = config('CATALOG_CACHE_SECONDS', default=600, cast=int)
+
+# How often each worker re-reads the pricing rule-set version (orders.pricing)
+PRICING_VERSION_CHECK_SECONDS = config('PRICING_VERSION_CHECK_SECONDS', default=5, cast=int)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -162,6 +182,56 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Order numbers reserved per worker in one round-trip (see orders.numbering)
+ORDER_NUMBER_BLOCK_SIZE = config('ORDER_NUMBER_BLOCK_SIZE', default=50, cast=int)
+
+# Idempotency-Key replay window for order and payment creation
+IDEMPOTENCY_KEY_TTL = timedelta(hours=config('IDEMPOTENCY_KEY_TTL_HOURS', default=24, cast=int))
+# A retry may take over a key whose first request has been running this long
+# (keep it above the worker timeout)
+IDEMPOTENCY_IN_FLIGHT_TIMEOUT = timedelta(seconds=config('IDEMPOTENCY_IN_FLIGHT_SECONDS', default=60, cast=int))
+
+# Delivered/cancelled orders untouched this long are moved to the archive (see orders.archive)
+ORDER_ARCHIVE_AFTER = timedelta(days=config('ORDER_ARCHIVE_AFTER_DAYS', default=90, cast=int))
+
+# Where live carts are kept (see orders.cart_store). CachedCartStore needs a
+# cache shared by all workers and flush_carts run every CART_FLUSH_INTERVAL.
+CART_STORE = config('CART_STORE', default='orders.cart_store.DatabaseCartStore')
+CART_CACHE_TTL = timedelta(days=config('CART_CACHE_TTL_DAYS', default=7, cast=int))
+CART_FLUSH_INTERVAL = timedelta(seconds=config('CART_FLUSH_INTERVAL_SECONDS', default=300, cast=int))
+
+# Payment gateway webhook signing secrets (see orders.webhooks); a gateway
+# without a secret rejects every webhook
+RAZORPAY_WEBHOOK_SECRET = config('RAZORPAY_WEBHOOK_SECRET', default='')
+STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='')
+# Inbox events applied to payments per transaction
+WEBHOOK_BATCH_SIZE = config('WEBHOOK_BATCH_SIZE', default=500, cast=int)
+# Events for a transaction no payment has yet are retried after this many
+# seconds, doubling each time, and given up after WEBHOOK_MAX_ATTEMPTS
+WEBHOOK_RETRY_SECONDS = config('WEBHOOK_RETRY_SECONDS', default=60, cast=int)
+WEBHOOK_MAX_ATTEMPTS = config('WEBHOOK_MAX_ATTEMPTS', default=8, cast=int)
+
+# Gateway payloads larger than this many bytes of JSON are kept compressed
+# in blob storage, with only a summary on the payment (see orders.blobs)
+PAYMENT_PAYLOAD_INLINE_LIMIT = config('PAYMENT_PAYLOAD_INLINE_LIMIT', default=1024, cast=int)
+
+# Lifetime of cached pickup slot availability (bookings also invalidate it)
+PICKUP_SLOT_CACHE_SECONDS = config('PICKUP_SLOT_CACHE_SECONDS', default=60, cast=int)
+# Furthest ahead the pickup slot endpoint looks, in days
+PICKUP_SLOT_MAX_DAYS = 14
+
+# Delivery route planning (orders.dispatch): depot as "latitude,longitude"
+# (blank: the centre of each area), orders per rider route, and the pincode
+# prefix length that groups pincodes into areas
+DISPATCH_DEPOT = config('DISPATCH_DEPOT', default='')
+DISPATCH_ROUTE_CAPACITY = config('DISPATCH_ROUTE_CAPACITY', default=25, cast=int)
+DISPATCH_AREA_PREFIX_LENGTH = config('DISPATCH_AREA_PREFIX_LENGTH', default=3, cast=int)
+
+# Delivery ETAs (orders.eta): time from processed to delivered, and how long
+# the per-category load table stays cached (changes also invalidate it)
+ETA_DELIVERY_BUFFER = timedelta(hours=config('ETA_DELIVERY_BUFFER_HOURS', default=4, cast=int))
+ETA_LOAD_CACHE_SECONDS = 300
+
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
@@ -215,3 +285,6 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# Run tasks in-process instead of sending them to the broker (local development, tests)
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=False, cast=bool)
+CELERY_TASK_EAGER_PROPAGATES = True